@@ -0,0 +1,150 @@
+"""
+Latency benchmark of the wallet endpoints.
+
+Usage: python3 -m benchmarks.endpoints [--requests 500] [--wallets 1000] [--transactions 10000]
+                                       [--miner-latency 0] [--user-latency 0] [--endpoint get ...]
+
+Every endpoint is called sequentially with random wallets like the cryptic framework would call it.
+For each endpoint the latency percentiles, the throughput and the sql statements per request are reported.
+"""
+
+import random
+import time
+import uuid
+from argparse import ArgumentParser
+from typing import List, Callable, Dict, Tuple
+
+from benchmarks import harness
+from app import wrapper
+from models.wallet import Wallet
+from resources import wallet
+from utils.notifications import dispatcher
+
+Request = Tuple[Callable, dict, str]
+
+# counterpart of put and dump, which does not need to be a wallet
+BENCHMARK_UUID: str = str(uuid.UUID(int=0xBE7C4))
+
+
+def percentile(latencies: List[float], p: float) -> float:
+    return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))]
+
+
+def scenarios(wallets: List[Tuple[str, str]]) -> Dict[str, Callable[[random.Random, int], Request]]:
+    """
+    :return: a function per endpoint that builds the i-th request
+    """
+
+    def create(rng: random.Random, i: int) -> Request:
+        return wallet.create, {}, str(uuid.UUID(int=rng.getrandbits(128)))
+
+    def get(rng: random.Random, i: int) -> Request:
+        source_uuid, key = rng.choice(wallets)
+        return wallet.get, {"source_uuid": source_uuid, "key": key}, "user"
+
+    def transactions(rng: random.Random, i: int) -> Request:
+        source_uuid, key = rng.choice(wallets)
+        return wallet.transactions, {"source_uuid": source_uuid, "key": key, "offset": 0, "count": 20}, "user"
+
+    def send(rng: random.Random, i: int) -> Request:
+        (source_uuid, key), (destination_uuid, _) = rng.sample(wallets, 2)
+        data: dict = {
+            "source_uuid": source_uuid,
+            "key": key,
+            "send_amount": 1,
+            "destination_uuid": destination_uuid,
+            "usage": "benchmark",
+        }
+        return wallet.send, data, "user"
+
+    def put(rng: random.Random, i: int) -> Request:
+        data: dict = {
+            "destination_uuid": rng.choice(wallets)[0],
+            "amount": 1,
+            "create_transaction": True,
+            "source_uuid": BENCHMARK_UUID,
+            "usage": "benchmark",
+            "origin": 1,
+        }
+        return wallet.put, data, "service"
+
+    def dump(rng: random.Random, i: int) -> Request:
+        source_uuid, key = rng.choice(wallets)
+        data: dict = {
+            "source_uuid": source_uuid,
+            "key": key,
+            "amount": 1,
+            "create_transaction": True,
+            "destination_uuid": BENCHMARK_UUID,
+            "usage": "benchmark",
+            "origin": 1,
+        }
+        return wallet.dump, data, "service"
+
+    def exists(rng: random.Random, i: int) -> Request:
+        return wallet.exists, {"source_uuid": rng.choice(wallets)[0]}, "service"
+
+    return {
+        "create": create,
+        "get": get,
+        "transactions": transactions,
+        "send": send,
+        "put": put,
+        "dump": dump,
+        "exists": exists,
+    }
+
+
+def run(name: str, scenario: Callable[[random.Random, int], Request], requests: int):
+    rng: random.Random = random.Random(name)
+    latencies: List[float] = []
+    errors: int = 0
+
+    statements: int = harness.statement_count
+    start: float = time.perf_counter()
+    for i in range(requests):
+        handler, data, user = scenario(rng, i)
+        request_start: float = time.perf_counter()
+        result: dict = harness.call_endpoint(handler, data, user)
+        latencies.append(time.perf_counter() - request_start)
+        errors += "error" in result
+    duration: float = time.perf_counter() - start
+    statements = harness.statement_count - statements
+
+    latencies.sort()
+    print(
+        f"{name:>12} {percentile(latencies, 50) * 1000:>8.2f} {percentile(latencies, 95) * 1000:>8.2f} "
+        f"{percentile(latencies, 99) * 1000:>8.2f} {requests / duration:>8.0f} {statements / requests:>6.1f} "
+        f"{errors:>6}"
+    )
+
+
+def main():
+    parser: ArgumentParser = ArgumentParser(description="Latency benchmark of the wallet endpoints.")
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint")
+    parser.add_argument("--wallets", type=int, default=1000)
+    parser.add_argument("--transactions", type=int, default=10000)
+    parser.add_argument("--balance", type=int, default=1000000)
+    parser.add_argument("--miner-latency", type=float, default=0, help="seconds per miner request")
+    parser.add_argument("--user-latency", type=float, default=0, help="seconds per user notification")
+    parser.add_argument("--endpoint", action="append", help="only run the given endpoints")
+    args = parser.parse_args()
+
+    harness.stub_microservice(args.miner_latency)
+    harness.stub_user(args.user_latency)
+    harness.reset_database()
+    harness.seed_transactions(harness.seed_wallets(args.wallets, args.balance), args.transactions)
+    wallets: List[Tuple[str, str]] = [tuple(row) for row in wrapper.session.query(Wallet.source_uuid, Wallet.key)]
+    wrapper.session.remove()
+
+    print(f"{'endpoint':>12} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'sql':>6} {'errors':>6}")
+    for name, scenario in scenarios(wallets).items():
+        if args.endpoint is None or name in args.endpoint:
+            run(name, scenario, args.requests)
+            wrapper.session.remove()
+
+    dispatcher.flush()
+
+
+if __name__ == "__main__":
+    main()
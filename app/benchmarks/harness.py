@@ -0,0 +1,146 @@
+"""
+Runs the real models against a local database instead of the cryptic framework.
+This module has to be imported before any module of the microservice.
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from typing import List, Callable
+
+from sqlalchemy import BigInteger, create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from mock.mock_loader import mock
+
+DATABASE_URL: str = os.environ.get(
+    "BENCHMARK_DATABASE_URL", "sqlite:///" + os.path.join(tempfile.gettempdir(), "cryptic-currency-benchmark.db")
+)
+
+
+@compiles(BigInteger, "sqlite")
+def _compile_big_integer(type_, compiler, **kwargs) -> str:
+    # sqlite only generates ids for INTEGER PRIMARY KEY columns
+    return "INTEGER"
+
+
+engine: Engine = (
+    create_engine(DATABASE_URL, connect_args={"timeout": 30})
+    if DATABASE_URL.startswith("sqlite")
+    else create_engine(DATABASE_URL, pool_size=32)
+)
+
+if engine.dialect.name == "sqlite":
+    # sqlite ignores SELECT ... FOR UPDATE, so every transaction takes the write lock up front
+
+    @event.listens_for(engine, "connect")
+    def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _begin_immediate(connection):
+        connection.execute("BEGIN IMMEDIATE")
+
+
+# number of sql statements sent to the database, including BEGIN
+statement_count: int = 0
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _count_statement(connection, cursor, statement, parameters, context, executemany):
+    global statement_count
+    statement_count += 1
+
+
+sys.modules["cryptic"] = mock
+mock.wrapper.Base = declarative_base()
+mock.wrapper.engine = engine
+mock.wrapper.Session = scoped_session(sessionmaker(bind=engine))
+mock.wrapper.session = mock.wrapper.Session
+
+
+def stub_microservice(latency: float = 0):
+    """
+    Answers the miner requests of the currency microservice without mining any coins.
+    """
+
+    def contact_microservice(name: str, endpoint: List[str], data: dict) -> dict:
+        time.sleep(latency)
+        if endpoint == ["miner", "collect_many"]:
+            return {"coins": {}}
+        return {"coins": 0}
+
+    mock.m.contact_microservice.side_effect = contact_microservice
+
+
+def stub_user(latency: float = 0):
+    mock.m.contact_user.side_effect = lambda user, data: time.sleep(latency)
+
+
+def call_endpoint(handler: Callable, data: dict, user: str) -> dict:
+    """
+    Calls an endpoint like the cryptic framework. The error checks run inside the endpoint.
+    """
+
+    return handler(data, user)
+
+
+def reset_database():
+    import models.ledger  # noqa: F401
+    import models.transaction  # noqa: F401
+    import models.wallet  # noqa: F401
+
+    mock.wrapper.session.remove()
+    mock.wrapper.Base.metadata.drop_all(bind=engine)
+    mock.wrapper.Base.metadata.create_all(bind=engine)
+
+
+def seed_wallets(count: int, amount: int) -> List[str]:
+    """
+    Creates wallets with the given balance.
+    :return: the source_uuids of the wallets
+    """
+
+    from models.wallet import Wallet
+
+    source_uuids: List[str] = []
+    for i in range(count):
+        wallet: Wallet = Wallet.create(str(uuid.UUID(int=i)))
+        wallet.amount = amount
+        source_uuids.append(wallet.source_uuid)
+    mock.wrapper.session.commit()
+    mock.wrapper.session.remove()
+
+    return source_uuids
+
+
+def seed_transactions(source_uuids: List[str], count: int):
+    """
+    Creates transactions between random pairs of the given wallets.
+    """
+
+    from models.transaction import Transaction
+
+    rng: random.Random = random.Random(0)
+    for start in range(0, count, 1000):
+        transactions: List[dict] = []
+        for _ in range(start, min(start + 1000, count)):
+            source_uuid, destination_uuid = rng.sample(source_uuids, 2)
+            transactions.append(
+                {
+                    "source_uuid": source_uuid,
+                    "send_amount": 1,
+                    "destination_uuid": destination_uuid,
+                    "usage": "benchmark",
+                    "origin": 0,
+                }
+            )
+        Transaction.create_many(transactions)
+        mock.wrapper.session.commit()
+    mock.wrapper.session.remove()
@@ -0,0 +1,102 @@
+"""
+Microbenchmark of the transaction history serialization.
+
+Usage: python3 -m benchmarks.serialize [--repeat 50]
+
+Compares loading full Transaction instances and copying their __dict__ with selecting only
+the serialized columns as tuples, for pages of 10, 100 and 1000 transactions.
+"""
+
+import time
+from argparse import ArgumentParser
+from typing import List, Callable
+
+from benchmarks import harness
+from app import wrapper
+from models.transaction import Transaction
+from sqlalchemy import desc, union
+from sqlalchemy.orm import aliased
+
+PAGE_SIZES: List[int] = [10, 100, 1000]
+
+
+def instance_page(source_uuid: str, count: int) -> List[dict]:
+    """
+    The same history query as Transaction.slice_transactions, but serialized from one ORM instance per row.
+    """
+
+    branches = [
+        wrapper.session.query(Transaction)
+        .filter(column == source_uuid)
+        .order_by(desc(Transaction.time_stamp), desc(Transaction.id))
+        .limit(count)
+        .subquery()
+        .select()
+        for column in (Transaction.source_uuid, Transaction.destination_uuid)
+    ]
+    transaction = aliased(Transaction, union(*branches).alias())
+    transactions = (
+        wrapper.session.query(transaction).order_by(desc(transaction.time_stamp), desc(transaction.id)).slice(0, count)
+    )
+
+    result: List[dict] = []
+    for instance in transactions:
+        _: int = instance.id
+        d = instance.__dict__.copy()
+        del d["_sa_instance_state"]
+        d["time_stamp"] = str(d["time_stamp"])
+        result.append(d)
+
+    return result
+
+
+def column_page(source_uuid: str, count: int) -> List[dict]:
+    return Transaction.slice_transactions(source_uuid, 0, count)
+
+
+def measure(page: Callable[[str, int], List[dict]], source_uuid: str, count: int, repeat: int) -> float:
+    """
+    :return: average milliseconds per page
+    """
+
+    start: float = time.perf_counter()
+    for _ in range(repeat):
+        page(source_uuid, count)
+        wrapper.session.remove()
+
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser: ArgumentParser = ArgumentParser(description="Microbenchmark of the transaction history serialization.")
+    parser.add_argument("--repeat", type=int, default=50, help="pages per measurement")
+    args = parser.parse_args()
+
+    harness.reset_database()
+    source_uuid, destination_uuid = harness.seed_wallets(2, 0)
+    Transaction.create_many(
+        [
+            {
+                "source_uuid": (source_uuid, destination_uuid)[i % 2],
+                "send_amount": i,
+                "destination_uuid": (destination_uuid, source_uuid)[i % 2],
+                "usage": "benchmark",
+                "origin": 0,
+            }
+            for i in range(max(PAGE_SIZES))
+        ]
+    )
+    wrapper.session.commit()
+    wrapper.session.remove()
+
+    assert len(column_page(source_uuid, max(PAGE_SIZES))) == len(instance_page(source_uuid, max(PAGE_SIZES)))
+
+    print(f"{'rows':>6} {'instances':>12} {'columns':>12} {'speedup':>8}")
+    for count in PAGE_SIZES:
+        instances: float = measure(instance_page, source_uuid, count, args.repeat)
+        columns: float = measure(column_page, source_uuid, count, args.repeat)
+        print(f"{count:>6} {instances:>10.2f}ms {columns:>10.2f}ms {instances / columns:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Concurrency benchmark of the transfer engine.
+
+Usage: python3 -m benchmarks.transfer [--threads 8] [--transfers 200] [--wallets 100] [--balance 500]
+
+The random scenario moves coins between random wallets and reports the throughput.
+The double spend scenario lets all threads spend from one wallet and checks that no coin is spent twice.
+Set BENCHMARK_DATABASE_URL to a mysql database to measure row level locking.
+"""
+
+import random
+import threading
+import time
+from argparse import ArgumentParser
+from collections import Counter
+from typing import List, Callable, Tuple
+
+from benchmarks import harness
+from app import wrapper
+from models.transaction import Transaction
+from models.wallet import Wallet
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+from utils.transfer import transfer
+
+
+def run_threads(
+    threads: int, pairs: Callable[[random.Random], Tuple[str, str]], transfers: int
+) -> Tuple[Counter, float]:
+    results: Counter = Counter()
+    results_lock: threading.Lock = threading.Lock()
+
+    def worker(seed: int):
+        rng: random.Random = random.Random(seed)
+        local: Counter = Counter()
+        for _ in range(transfers):
+            source_uuid, destination_uuid = pairs(rng)
+            try:
+                source_wallet: Wallet = wrapper.session.query(Wallet).get(source_uuid)
+                error = transfer(source_wallet, destination_uuid, 1, "benchmark")
+                local[error["error"] if error else "ok"] += 1
+            except SQLAlchemyError:
+                wrapper.session.rollback()
+                local["database_error"] += 1
+        wrapper.session.remove()
+        with results_lock:
+            results.update(local)
+
+    workers: List[threading.Thread] = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start: float = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    return results, time.perf_counter() - start
+
+
+def totals() -> Tuple[int, int, int]:
+    supply, minimum = wrapper.session.query(func.sum(Wallet.amount), func.min(Wallet.amount)).one()
+    transactions: int = wrapper.session.query(func.count(Transaction.id)).scalar()
+    wrapper.session.remove()
+    return int(supply), int(minimum), transactions
+
+
+def report(name: str, results: Counter, duration: float):
+    attempts: int = sum(results.values())
+    print(f"{name}: {attempts} transfers in {duration:.2f}s ({attempts / duration:.0f}/s)")
+    for result, count in sorted(results.items()):
+        print(f"  {result}: {count}")
+
+
+def random_scenario(threads: int, transfers: int, wallets: int, balance: int):
+    harness.reset_database()
+    source_uuids: List[str] = harness.seed_wallets(wallets, balance)
+
+    results, duration = run_threads(threads, lambda rng: tuple(rng.sample(source_uuids, 2)), transfers)
+    report("random", results, duration)
+
+    supply, minimum, transactions = totals()
+    print(f"  supply conserved: {supply == wallets * balance}, lowest balance: {minimum}")
+    print(f"  transaction rows match successful transfers: {transactions == results['ok']}")
+
+
+def double_spend_scenario(threads: int, transfers: int, balance: int):
+    harness.reset_database()
+    source_uuid, *destination_uuids = harness.seed_wallets(threads + 1, 0)
+    wrapper.session.query(Wallet).filter_by(source_uuid=source_uuid).update({Wallet.amount: balance})
+    wrapper.session.commit()
+    wrapper.session.remove()
+
+    results, duration = run_threads(threads, lambda rng: (source_uuid, rng.choice(destination_uuids)), transfers)
+    report("double spend", results, duration)
+
+    supply, minimum, transactions = totals()
+    spent: int = balance - wrapper.session.query(Wallet).get(source_uuid).amount
+    wrapper.session.remove()
+    print(f"  coins spent: {spent}, successful transfers: {results['ok']}, transaction rows: {transactions}")
+    print(f"  no double spend: {spent == results['ok'] == transactions and minimum >= 0 and supply == balance}")
+
+
+def main():
+    parser: ArgumentParser = ArgumentParser(description="Concurrency benchmark of the transfer engine.")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--transfers", type=int, default=200, help="transfers per thread")
+    parser.add_argument("--wallets", type=int, default=100)
+    parser.add_argument("--balance", type=int, default=500)
+    args = parser.parse_args()
+
+    harness.stub_microservice()
+    random_scenario(args.threads, args.transfers, args.wallets, args.balance)
+    double_spend_scenario(args.threads, args.transfers, args.balance)
+
+
+if __name__ == "__main__":
+    main()
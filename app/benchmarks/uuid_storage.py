@@ -0,0 +1,110 @@
+"""
+Benchmark of the uuid storage types.
+
+Usage: python3 -m benchmarks.uuid_storage [--rows 1000000] [--wallets 100000] [--lookups 10000]
+
+Seeds the same transactions into a table with text uuids and a table with binary uuids and compares
+the size of the (source_uuid, time_stamp) index and the time of an indexed lookup of one wallet.
+"""
+
+import datetime
+import random
+import time
+import uuid
+from argparse import ArgumentParser
+from typing import Dict, List, Optional
+
+from sqlalchemy import MetaData, Table, Column, BigInteger, DateTime, Index, select, desc
+from sqlalchemy.exc import DatabaseError
+
+from benchmarks import harness
+from models.types import UUIDType
+
+metadata: MetaData = MetaData()
+tables: Dict[str, Table] = {
+    storage: Table(
+        f"benchmark_uuid_{storage}",
+        metadata,
+        Column("id", BigInteger, primary_key=True, autoincrement=True),
+        Column("source_uuid", UUIDType(binary=storage == "binary"), nullable=False),
+        Column("time_stamp", DateTime, nullable=False),
+        Index(f"benchmark_uuid_{storage}_source_time", "source_uuid", "time_stamp"),
+    )
+    for storage in ("text", "binary")
+}
+
+
+def seed(source_uuids: List[str], rows: int):
+    rng: random.Random = random.Random(0)
+    start: datetime.datetime = datetime.datetime(2020, 1, 1)
+    with harness.engine.begin() as connection:
+        for offset in range(0, rows, 10000):
+            batch: List[dict] = [
+                {"source_uuid": rng.choice(source_uuids), "time_stamp": start + datetime.timedelta(seconds=i)}
+                for i in range(offset, min(offset + 10000, rows))
+            ]
+            for table in tables.values():
+                connection.execute(table.insert(), batch)
+
+
+def index_size(table: Table) -> Optional[int]:
+    """
+    :return: the size of the (source_uuid, time_stamp) index in bytes or None if the database does not report it
+    """
+
+    index: str = f"{table.name}_source_time"
+    try:
+        if harness.engine.dialect.name == "sqlite":
+            return harness.engine.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = ?", index).scalar()
+        if harness.engine.dialect.name == "mysql":
+            harness.engine.execute(f"ANALYZE TABLE {table.name}")
+            return harness.engine.execute(
+                "SELECT stat_value * @@innodb_page_size FROM mysql.innodb_index_stats "
+                "WHERE table_name = %s AND index_name = %s AND stat_name = 'size'",
+                table.name,
+                index,
+            ).scalar()
+    except DatabaseError:
+        pass
+    return None
+
+
+def measure(table: Table, source_uuids: List[str]) -> float:
+    """
+    :return: average microseconds per lookup of the newest 20 rows of a wallet
+    """
+
+    query = select([table.c.id]).order_by(desc(table.c.time_stamp)).limit(20)
+    start: float = time.perf_counter()
+    with harness.engine.connect() as connection:
+        for source_uuid in source_uuids:
+            connection.execute(query.where(table.c.source_uuid == source_uuid)).fetchall()
+
+    return (time.perf_counter() - start) / len(source_uuids) * 1_000_000
+
+
+def main():
+    parser: ArgumentParser = ArgumentParser(description="Benchmark of the uuid storage types.")
+    parser.add_argument("--rows", type=int, default=1000000, help="rows in each table")
+    parser.add_argument("--wallets", type=int, default=100000, help="distinct source_uuids")
+    parser.add_argument("--lookups", type=int, default=10000, help="lookups per measurement")
+    args = parser.parse_args()
+
+    metadata.drop_all(bind=harness.engine)
+    metadata.create_all(bind=harness.engine)
+
+    source_uuids: List[str] = [str(uuid.uuid4()) for _ in range(args.wallets)]
+    seed(source_uuids, args.rows)
+    lookups: List[str] = random.Random(1).choices(source_uuids, k=args.lookups)
+
+    print(f"{'storage':>8} {'index size':>12} {'lookup':>10}")
+    for storage, table in tables.items():
+        size: Optional[int] = index_size(table)
+        lookup: float = measure(table, lookups)
+        print(f"{storage:>8} {size / 2 ** 20 if size is not None else float('nan'):>10.1f}MB {lookup:>8.1f}us")
+
+    metadata.drop_all(bind=harness.engine)
+
+
+if __name__ == "__main__":
+    main()
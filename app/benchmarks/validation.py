@@ -0,0 +1,86 @@
+"""
+Microbenchmark of the request validation.
+
+Usage: python3 -m benchmarks.validation [--repeat 100000]
+
+Compares the scheme structures the cryptic framework builds for user endpoints with the validators
+compiled from schemes.py, for valid and invalid requests of the most frequent endpoints.
+"""
+
+import functools
+import time
+from argparse import ArgumentParser
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks import harness  # noqa: F401
+import scheme
+from schemes import scheme_default, scheme_send, scheme_transactions
+from utils.validation import Validator
+
+SOURCE_UUID: str = "1b4e28ba-2fa1-11d2-883f-0016d3cca427"
+
+REQUESTS: List[Tuple[str, Dict[str, scheme.Field], dict]] = [
+    ("default", scheme_default, {"source_uuid": SOURCE_UUID, "key": "0123456789"}),
+    ("default invalid", scheme_default, {"source_uuid": SOURCE_UUID, "key": "not a key!"}),
+    (
+        "send",
+        scheme_send,
+        {
+            "source_uuid": SOURCE_UUID,
+            "key": "0123456789",
+            "send_amount": 42,
+            "destination_uuid": SOURCE_UUID,
+            "usage": "benchmark",
+        },
+    ),
+    ("transactions", scheme_transactions, {"source_uuid": SOURCE_UUID, "key": "0123456789", "offset": 0, "count": 20}),
+]
+
+
+def structure(fields: Dict[str, scheme.Field]) -> scheme.Structure:
+    """
+    Builds the scheme structure the framework builds for the requirements of a user endpoint.
+    """
+
+    return scheme.Structure({name: field.clone(required=True) for name, field in fields.items()})
+
+
+def framework_valid(structure: scheme.Structure, data: dict) -> bool:
+    # the framework answers every exception of serialize with invalid_input_data
+    try:
+        structure.serialize(data, "json")
+    except Exception:
+        return False
+    return True
+
+
+def measure(valid: Callable[[dict], bool], data: dict, repeat: int) -> float:
+    """
+    :return: average microseconds per request
+    """
+
+    start: float = time.perf_counter()
+    for _ in range(repeat):
+        valid(data)
+
+    return (time.perf_counter() - start) / repeat * 1_000_000
+
+
+def main():
+    parser: ArgumentParser = ArgumentParser(description="Microbenchmark of the request validation.")
+    parser.add_argument("--repeat", type=int, default=100000, help="validations per measurement")
+    args = parser.parse_args()
+
+    print(f"{'request':>16} {'scheme':>10} {'compiled':>10} {'speedup':>8}")
+    for name, fields, data in REQUESTS:
+        before: Callable[[dict], bool] = functools.partial(framework_valid, structure(fields))
+        after: Callable[[dict], bool] = Validator(fields).valid
+        assert before(data) == after(data), f"{name}: the validators disagree"
+
+        scheme_time: float = measure(before, data, args.repeat)
+        compiled_time: float = measure(after, data, args.repeat)
+        print(f"{name:>16} {scheme_time:>8.2f}us {compiled_time:>8.2f}us {scheme_time / compiled_time:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
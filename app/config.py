@@ -0,0 +1,67 @@
+from os import environ
+
+
+def _float(name: str, default: float) -> float:
+    return float(environ.get(name, default))
+
+
+def _int(name: str, default: int) -> int:
+    return int(environ.get(name, default))
+
+
+def _bool(name: str, default: bool) -> bool:
+    return environ.get(name, str(default)).lower() in ("1", "true", "yes")
+
+
+# seconds in which a wallet is not collected again from the miner
+MINER_COLLECT_WINDOW: float = _float("MINER_COLLECT_WINDOW", 5)
+# maximum number of wallets collected by one miner rpc
+MINER_COLLECT_BATCH_SIZE: int = _int("MINER_COLLECT_BATCH_SIZE", 32)
+# collect the wallets skipped inside the window in bulk, requires miner/collect_many of the service microservice
+MINER_COLLECT_MANY: bool = _bool("MINER_COLLECT_MANY", False)
+# record every balance change in the append-only ledger
+LEDGER_ENABLED: bool = _bool("LEDGER_ENABLED", False)
+# number of wallets whose owner and key are cached
+WALLET_CACHE_SIZE: int = _int("WALLET_CACHE_SIZE", 10000)
+# seconds after which a cached wallet is loaded from the database again
+WALLET_CACHE_TTL: float = _float("WALLET_CACHE_TTL", 300)
+# number of unknown source_uuids that are answered without a database query
+UNKNOWN_WALLET_CACHE_SIZE: int = _int("UNKNOWN_WALLET_CACHE_SIZE", 10000)
+# seconds in which an unknown source_uuid is not looked up in the database again
+UNKNOWN_WALLET_CACHE_TTL: float = _float("UNKNOWN_WALLET_CACHE_TTL", 5)
+# seconds a user notification waits for newer balance updates of the same wallet
+NOTIFICATION_WINDOW: float = _float("NOTIFICATION_WINDOW", 0.5)
+# maximum number of queued user notifications, further notifications are dropped
+NOTIFICATION_QUEUE_SIZE: int = _int("NOTIFICATION_QUEUE_SIZE", 10000)
+# seconds after which a request is logged with its sql statements
+SLOW_REQUEST_THRESHOLD: float = _float("SLOW_REQUEST_THRESHOLD", 1)
+# connections kept open in the database pool
+DATABASE_POOL_SIZE: int = _int("DATABASE_POOL_SIZE", 10)
+# connections opened in addition to the pool when it is exhausted
+DATABASE_MAX_OVERFLOW: int = _int("DATABASE_MAX_OVERFLOW", 20)
+# test connections with a ping before they are taken from the pool
+DATABASE_POOL_PRE_PING: bool = _bool("DATABASE_POOL_PRE_PING", True)
+# seconds after which a pooled connection is replaced
+DATABASE_POOL_RECYCLE: int = _int("DATABASE_POOL_RECYCLE", 3600)
+# endpoints executed at the same time, requests for the same wallet are always executed one after another
+WORKERS: int = _int("WORKERS", 16)
+# number of locks the wallets are distributed over, wallets sharing a lock are serialized together
+WALLET_LOCK_STRIPES: int = _int("WALLET_LOCK_STRIPES", 1024)
+# maintain hourly rollups of the incoming and outgoing coins of every wallet for the stats endpoint
+STATS_ROLLUP_ENABLED: bool = _bool("STATS_ROLLUP_ENABLED", False)
+# seconds in which a repeated idempotency key of send, put and dump returns the original result
+IDEMPOTENCY_KEY_TTL: float = _float("IDEMPOTENCY_KEY_TTL", 3600)
+# compute mined coins from the mining rate pushed by the miner instead of collecting them from the miner
+LAZY_MINER_SETTLEMENT: bool = _bool("LAZY_MINER_SETTLEMENT", False)
+# store uuids and wallet keys as raw bytes, requires the columns to be converted with convert-uuid-storage
+UUID_BINARY_STORAGE: bool = _bool("UUID_BINARY_STORAGE", False)
+# reject user requests of users and wallets that exceed their token bucket
+RATE_LIMIT_ENABLED: bool = _bool("RATE_LIMIT_ENABLED", False)
+# tokens per second added to the bucket of every user and wallet, a request costs at least one token
+RATE_LIMIT_RATE: float = _float("RATE_LIMIT_RATE", 5)
+# maximum number of tokens in a bucket, i.e. the burst of requests admitted at once
+RATE_LIMIT_BURST: float = _float("RATE_LIMIT_BURST", 20)
+# number of users and wallets whose buckets are kept, the least recently used bucket starts full again
+RATE_LIMIT_BUCKETS: int = _int("RATE_LIMIT_BUCKETS", 100000)
+# maximum number of transactions in a page, larger pages are truncated and return a cursor to continue
+TRANSACTIONS_MAX_PAGE_SIZE: int = _int("TRANSACTIONS_MAX_PAGE_SIZE", 1000)
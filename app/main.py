@@ -3,7 +3,9 @@ import app
 
 if __name__ == "__main__":
     from resources.wallet import *
+    from utils.session import configure_session
 
+    configure_session()
     app.wrapper.Base.metadata.create_all(bind=wrapper.engine)
 
     app.m.run()
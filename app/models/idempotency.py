@@ -0,0 +1,74 @@
+import datetime
+import json
+from typing import Union, Optional
+
+from sqlalchemy import Column, String, DateTime, Text
+
+from app import wrapper
+from config import IDEMPOTENCY_KEY_TTL
+from models.types import UUIDType
+
+MAX_KEY_LENGTH: int = 64
+
+
+class IdempotencyKey(wrapper.Base):
+    """
+    The result of a send, put or dump request that was made with an idempotency key.
+    Keys are scoped to the wallet and endpoint and expire after IDEMPOTENCY_KEY_TTL seconds.
+    """
+
+    __tablename__: str = "currency_idempotency_key"
+
+    wallet_uuid: Union[Column, str] = Column(UUIDType(), primary_key=True)
+    endpoint: Union[Column, str] = Column(String(16), primary_key=True)
+    key: Union[Column, str] = Column(String(MAX_KEY_LENGTH), primary_key=True)
+    time_stamp: Union[Column, datetime.datetime] = Column(DateTime, nullable=False)
+    result: Union[Column, str] = Column(Text, nullable=False)
+
+    @staticmethod
+    def valid(key) -> bool:
+        return key is None or isinstance(key, str) and 0 < len(key) <= MAX_KEY_LENGTH
+
+    @staticmethod
+    def lookup(wallet_uuid: str, endpoint: str, key: Optional[str]) -> Optional[dict]:
+        """
+        Returns the stored result of an earlier request with the same key.
+        :return: the result or None if there is no such request or it has expired
+        """
+
+        if key is None:
+            return None
+
+        entry: Optional[IdempotencyKey] = wrapper.session.query(IdempotencyKey).get((wallet_uuid, endpoint, key))
+        if entry is None or entry.time_stamp < IdempotencyKey.expiry():
+            return None
+
+        return json.loads(entry.result)
+
+    @staticmethod
+    def record(wallet_uuid: str, endpoint: str, key: Optional[str], result: dict):
+        """
+        Stores the result of a request and deletes the expired keys of the wallet.
+        The result is committed together with the balance change by the caller,
+        so a request is either applied and stored or neither.
+        """
+
+        if key is None:
+            return
+
+        wrapper.session.query(IdempotencyKey).filter(
+            IdempotencyKey.wallet_uuid == wallet_uuid, IdempotencyKey.time_stamp < IdempotencyKey.expiry()
+        ).delete(synchronize_session=False)
+        wrapper.session.add(
+            IdempotencyKey(
+                wallet_uuid=wallet_uuid,
+                endpoint=endpoint,
+                key=key,
+                time_stamp=datetime.datetime.now(),
+                result=json.dumps(result),
+            )
+        )
+
+    @staticmethod
+    def expiry() -> datetime.datetime:
+        return datetime.datetime.now() - datetime.timedelta(seconds=IDEMPOTENCY_KEY_TTL)
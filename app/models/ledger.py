@@ -0,0 +1,133 @@
+import datetime
+from typing import Union, Optional
+
+from sqlalchemy import Column, String, DateTime, BigInteger, func
+
+from app import wrapper
+from config import LEDGER_ENABLED
+from models.types import UUIDType
+from models.wallet import Wallet
+
+
+class LedgerEntry(wrapper.Base):
+    __tablename__: str = "currency_ledger"
+
+    id: Union[Column, int] = Column(BigInteger, primary_key=True, autoincrement=True, unique=True)
+    time_stamp: Union[Column, datetime.datetime] = Column(DateTime, nullable=False)
+    wallet_uuid: Union[Column, str] = Column(UUIDType(), nullable=False, index=True)
+    delta: Union[Column, int] = Column(BigInteger, nullable=False)
+    origin: Union[Column, str] = Column(String(16), nullable=False)
+
+    @staticmethod
+    def record(wallet_uuid: str, delta: int, origin: str) -> Optional["LedgerEntry"]:
+        """
+        Appends a balance change to the ledger if the ledger is enabled.
+        The entry is committed together with the balance change by the caller.
+        :return: the new entry
+        """
+
+        if not LEDGER_ENABLED or not delta:
+            return None
+
+        entry: LedgerEntry = LedgerEntry(
+            time_stamp=datetime.datetime.now(), wallet_uuid=wallet_uuid, delta=delta, origin=origin
+        )
+        wrapper.session.add(entry)
+
+        return entry
+
+    @staticmethod
+    def balance(wallet_uuid: str) -> int:
+        """
+        Rebuilds the balance of a wallet from its snapshot and the entries that have not been folded into it yet.
+        :return: the balance
+        """
+
+        snapshot: Optional[BalanceSnapshot] = wrapper.session.query(BalanceSnapshot).get(wallet_uuid)
+        amount: int = snapshot.amount if snapshot is not None else 0
+
+        return amount + (
+            wrapper.session.query(func.coalesce(func.sum(LedgerEntry.delta), 0))
+            .filter(LedgerEntry.wallet_uuid == wallet_uuid)
+            .scalar()
+        )
+
+
+class BalanceSnapshot(wrapper.Base):
+    __tablename__: str = "currency_balance_snapshot"
+
+    wallet_uuid: Union[Column, str] = Column(UUIDType(), primary_key=True, unique=True)
+    time_stamp: Union[Column, datetime.datetime] = Column(DateTime, nullable=False)
+    amount: Union[Column, int] = Column(BigInteger, nullable=False, default=0)
+    last_entry_id: Union[Column, int] = Column(BigInteger, nullable=False, default=0)
+
+    @staticmethod
+    def seed() -> int:
+        """
+        Creates a snapshot for every wallet without one.
+        The snapshot holds the part of the balance that is not covered by ledger entries.
+        :return: number of created snapshots
+        """
+
+        recorded = (
+            wrapper.session.query(LedgerEntry.wallet_uuid, func.sum(LedgerEntry.delta).label("total"))
+            .group_by(LedgerEntry.wallet_uuid)
+            .subquery()
+        )
+        wallets = (
+            wrapper.session.query(Wallet.source_uuid, Wallet.amount, func.coalesce(recorded.c.total, 0))
+            .outerjoin(recorded, recorded.c.wallet_uuid == Wallet.source_uuid)
+            .outerjoin(BalanceSnapshot, BalanceSnapshot.wallet_uuid == Wallet.source_uuid)
+            .filter(BalanceSnapshot.wallet_uuid.is_(None))
+        )
+
+        now: datetime.datetime = datetime.datetime.now()
+        snapshots = [
+            BalanceSnapshot(wallet_uuid=source_uuid, time_stamp=now, amount=amount - total, last_entry_id=0)
+            for source_uuid, amount, total in wallets
+        ]
+        wrapper.session.add_all(snapshots)
+
+        return len(snapshots)
+
+    @staticmethod
+    def compact(before: datetime.datetime) -> int:
+        """
+        Folds all ledger entries older than the given time into the snapshots and deletes them
+        in the same database transaction. Entries of deleted wallets are dropped.
+        :return: number of folded entries
+        """
+
+        BalanceSnapshot.seed()
+        wrapper.session.flush()
+
+        boundary: Optional[int] = (
+            wrapper.session.query(func.max(LedgerEntry.id)).filter(LedgerEntry.time_stamp < before).scalar()
+        )
+        if boundary is None:
+            wrapper.session.commit()
+            return 0
+
+        totals = (
+            wrapper.session.query(LedgerEntry.wallet_uuid, func.sum(LedgerEntry.delta))
+            .filter(LedgerEntry.id <= boundary)
+            .group_by(LedgerEntry.wallet_uuid)
+        )
+
+        now: datetime.datetime = datetime.datetime.now()
+        for wallet_uuid, total in totals.all():
+            wrapper.session.query(BalanceSnapshot).filter(BalanceSnapshot.wallet_uuid == wallet_uuid).update(
+                {
+                    BalanceSnapshot.amount: BalanceSnapshot.amount + total,
+                    BalanceSnapshot.last_entry_id: boundary,
+                    BalanceSnapshot.time_stamp: now,
+                },
+                synchronize_session=False,
+            )
+
+        folded: int = (
+            wrapper.session.query(LedgerEntry).filter(LedgerEntry.id <= boundary).delete(synchronize_session=False)
+        )
+        wrapper.session.commit()
+
+        return folded
@@ -0,0 +1,113 @@
+import datetime
+from typing import Union, Dict, List, Tuple
+
+from sqlalchemy import Column, DateTime, BigInteger, Integer, func, literal_column
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.exc import IntegrityError
+
+from app import wrapper
+from config import STATS_ROLLUP_ENABLED
+from models.types import UUIDType
+
+BUCKET_FORMATS: Dict[str, str] = {"hour": "%Y-%m-%d %H:00:00", "day": "%Y-%m-%d 00:00:00"}
+
+
+def time_bucket(column: Column, interval: str):
+    """
+    Truncates a time stamp column to the start of its hour or day.
+    sqlite and mysql both return the bucket as 'YYYY-MM-DD HH:00:00'.
+    The format is rendered as a literal, so that mysql recognizes the same expression in SELECT and GROUP BY.
+    :return: the sql expression
+    """
+
+    bucket_format = literal_column(f"'{BUCKET_FORMATS[interval]}'")
+    if wrapper.engine.dialect.name == "sqlite":
+        return func.strftime(bucket_format, column)
+    return func.date_format(column, bucket_format)
+
+
+class TransactionRollup(wrapper.Base):
+    """
+    Incoming and outgoing coins of a wallet per hour and origin, maintained by Transaction.create
+    while STATS_ROLLUP_ENABLED is set.
+    """
+
+    __tablename__: str = "currency_transaction_rollup"
+
+    wallet_uuid: Union[Column, str] = Column(UUIDType(), primary_key=True)
+    hour: Union[Column, datetime.datetime] = Column(DateTime, primary_key=True)
+    origin: Union[Column, int] = Column(Integer, primary_key=True, autoincrement=False)
+    incoming: Union[Column, int] = Column(BigInteger, nullable=False, default=0)
+    outgoing: Union[Column, int] = Column(BigInteger, nullable=False, default=0)
+
+    @staticmethod
+    def record(transactions: List[dict]):
+        """
+        Adds the transactions to the rollups if they are enabled.
+        The rollups are committed together with the transactions by the caller.
+        """
+
+        if not STATS_ROLLUP_ENABLED:
+            return
+
+        totals: Dict[Tuple[str, datetime.datetime, int], List[int]] = {}
+        for transaction in transactions:
+            hour: datetime.datetime = transaction["time_stamp"].replace(minute=0, second=0, microsecond=0)
+            origin: int = transaction["origin"] or 0
+            amount: int = transaction["send_amount"]
+            if transaction["destination_uuid"] is not None:
+                totals.setdefault((transaction["destination_uuid"], hour, origin), [0, 0])[0] += amount
+            if transaction["source_uuid"] is not None:
+                totals.setdefault((transaction["source_uuid"], hour, origin), [0, 0])[1] += amount
+
+        for (wallet_uuid, hour, origin), (incoming, outgoing) in sorted(totals.items()):
+            TransactionRollup.add(wallet_uuid, hour, origin, incoming, outgoing)
+
+    @staticmethod
+    def add(wallet_uuid: str, hour: datetime.datetime, origin: int, incoming: int, outgoing: int):
+        """
+        Adds coins to a rollup and creates it if it does not exist yet.
+        Requests for different wallets can create the same rollup at the same time (e.g. two puts from the same
+        source), so mysql uses INSERT ... ON DUPLICATE KEY UPDATE. Other databases insert in a savepoint
+        and update the row if a concurrent request has inserted it first.
+        """
+
+        if wrapper.engine.dialect.name == "mysql":
+            table = TransactionRollup.__table__
+            statement = mysql_insert(table).values(
+                wallet_uuid=wallet_uuid, hour=hour, origin=origin, incoming=incoming, outgoing=outgoing
+            )
+            wrapper.session.execute(
+                statement.on_duplicate_key_update(
+                    incoming=table.c.incoming + statement.inserted.incoming,
+                    outgoing=table.c.outgoing + statement.inserted.outgoing,
+                )
+            )
+            return
+
+        def update() -> int:
+            return (
+                wrapper.session.query(TransactionRollup)
+                .filter_by(wallet_uuid=wallet_uuid, hour=hour, origin=origin)
+                .update(
+                    {
+                        TransactionRollup.incoming: TransactionRollup.incoming + incoming,
+                        TransactionRollup.outgoing: TransactionRollup.outgoing + outgoing,
+                    },
+                    synchronize_session=False,
+                )
+            )
+
+        if update():
+            return
+
+        try:
+            with wrapper.session.begin_nested():
+                wrapper.session.add(
+                    TransactionRollup(
+                        wallet_uuid=wallet_uuid, hour=hour, origin=origin, incoming=incoming, outgoing=outgoing
+                    )
+                )
+                wrapper.session.flush()
+        except IntegrityError:
+            update()
@@ -1,10 +1,39 @@
 import datetime
-from typing import Union, List
+from collections import Counter
+from typing import Union, List, Dict, Tuple, Sequence, Optional, Iterator
 
-from sqlalchemy import Column, Integer, String, DateTime, BigInteger, or_, desc
-from sqlalchemy.orm import Query
+from sqlalchemy import Column, Integer, String, DateTime, BigInteger, Index, or_, and_, desc, union, select, func
+from sqlalchemy.orm import Query, aliased
 
 from app import wrapper
+from config import STATS_ROLLUP_ENABLED
+from models.rollup import TransactionRollup, time_bucket
+from models.types import UUIDType
+from models.wallet import Wallet
+
+# rows fetched from the database at once while a transaction page is serialized
+PAGE_FETCH_SIZE: int = 100
+
+
+class TransactionArchive(wrapper.Base):
+    """
+    Transactions older than the archive cutoff, moved out of currency_transaction by Transaction.archive.
+    """
+
+    __tablename__: str = "currency_transaction_archive"
+
+    id: Union[Column, int] = Column(BigInteger, primary_key=True, autoincrement=False, unique=True)
+    time_stamp: Union[Column, datetime.datetime] = Column(DateTime, nullable=False)
+    source_uuid: Union[Column, str] = Column(UUIDType())
+    send_amount: Union[Column, int] = Column(BigInteger, nullable=False, default=0)
+    destination_uuid: Union[Column, str] = Column(UUIDType())
+    usage: Union[Column, str] = Column(String(255), default="")
+    origin: Union[Column, Integer] = Column(Integer)
+
+    __table_args__: tuple = (
+        Index("currency_transaction_archive_source_time", "source_uuid", "time_stamp"),
+        Index("currency_transaction_archive_destination_time", "destination_uuid", "time_stamp"),
+    )
 
 
 class Transaction(wrapper.Base):
@@ -12,24 +41,47 @@ class Transaction(wrapper.Base):
 
     id: Union[Column, int] = Column(BigInteger, primary_key=True, autoincrement=True, unique=True)
     time_stamp: Union[Column, datetime.datetime] = Column(DateTime, nullable=False)
-    source_uuid: Union[Column, str] = Column(String(36))
+    source_uuid: Union[Column, str] = Column(UUIDType())
     send_amount: Union[Column, int] = Column(BigInteger, nullable=False, default=0)
-    destination_uuid: Union[Column, str] = Column(String(36))
+    destination_uuid: Union[Column, str] = Column(UUIDType())
     usage: Union[Column, str] = Column(String(255), default="")
     origin: Union[Column, Integer] = Column(Integer)
 
+    __table_args__: tuple = (
+        Index("currency_transaction_source_time", "source_uuid", "time_stamp"),
+        Index("currency_transaction_destination_time", "destination_uuid", "time_stamp"),
+    )
+
+    serialized_columns: Tuple[str, ...] = (
+        "id",
+        "time_stamp",
+        "source_uuid",
+        "send_amount",
+        "destination_uuid",
+        "usage",
+        "origin",
+    )
+
     @property
     def serialize(self) -> dict:
-        _: int = self.id
-        d = self.__dict__.copy()
+        return Transaction.serialize_row([getattr(self, name) for name in Transaction.serialized_columns])
+
+    @staticmethod
+    def serialize_row(row: Sequence) -> dict:
+        """
+        Serializes the values of the serialized_columns without loading a Transaction instance.
+        :return: the serialized transaction
+        """
 
-        del d["_sa_instance_state"]
+        d = dict(zip(Transaction.serialized_columns, row))
         d["time_stamp"] = str(d["time_stamp"])
 
         return d
 
     @staticmethod
-    def create(source_uuid: str, send_amount: int, destination_uuid: str, usage: str, origin: int) -> "Transaction":
+    def create(
+        source_uuid: str, send_amount: int, destination_uuid: str, usage: str, origin: int, commit: bool = True
+    ) -> "Transaction":
         # create transaction and add it to database
         """
         Returns a transaction of a source_uuid.
@@ -45,27 +97,305 @@ class Transaction(wrapper.Base):
             origin=origin,
         )
 
-        # Add the new transaction to the db
+        # Add the new transaction to the db and count it for both wallets in the same database transaction
         wrapper.session.add(transaction)
-        wrapper.session.commit()
+        Transaction.count_for_wallets(Counter({source_uuid, destination_uuid} - {None}))
+        TransactionRollup.record([{name: getattr(transaction, name) for name in Transaction.serialized_columns}])
+        if commit:
+            wrapper.session.commit()
 
         return transaction
 
     @staticmethod
-    def query(source_uuid: str) -> Query:
-        return wrapper.session.query(Transaction).filter(
-            or_(Transaction.source_uuid == source_uuid, Transaction.destination_uuid == source_uuid)
+    def create_many(transactions: List[dict]):
+        """
+        Inserts many transactions with one bulk statement and counts them for their wallets.
+        The caller is responsible for committing the session.
+        """
+
+        time_stamp: datetime.datetime = datetime.datetime.now()
+        mappings: List[dict] = [{"time_stamp": time_stamp, **transaction} for transaction in transactions]
+        wrapper.session.bulk_insert_mappings(Transaction, mappings)
+
+        counts: Counter = Counter()
+        for transaction in transactions:
+            counts.update({transaction["source_uuid"], transaction["destination_uuid"]} - {None})
+        Transaction.count_for_wallets(counts)
+        TransactionRollup.record(mappings)
+
+    @staticmethod
+    def count_for_wallets(counts: Counter):
+        """
+        Adds the given number of transactions to the transaction counters of the wallets.
+        Wallets with the same increment are updated by the same statement.
+        """
+
+        wallets_by_increment: Dict[int, List[str]] = {}
+        for source_uuid, increment in counts.items():
+            wallets_by_increment.setdefault(increment, []).append(source_uuid)
+
+        for increment, source_uuids in sorted(wallets_by_increment.items()):
+            wrapper.session.query(Wallet).filter(Wallet.source_uuid.in_(sorted(source_uuids))).update(
+                {Wallet.transaction_count: Wallet.transaction_count + increment}, synchronize_session=False
+            )
+
+    @staticmethod
+    def query(source_uuid: str, model: type = None) -> Query:
+        model = model or Transaction
+        return wrapper.session.query(model).filter(
+            or_(model.source_uuid == source_uuid, model.destination_uuid == source_uuid)
         )
 
     @staticmethod
     def count_transactions(source_uuid: str) -> int:
-        return Transaction.query(source_uuid).count()
+        return Transaction.query(source_uuid).count() + Transaction.query(source_uuid, TransactionArchive).count()
+
+    @staticmethod
+    def reconcile_transaction_counts() -> int:
+        """
+        Rebuilds the transaction counters of all wallets from the transaction and archive tables.
+        :return: number of updated wallets
+        """
+
+        def count(model: type):
+            outgoing = select([func.count(model.id)]).where(model.source_uuid == Wallet.source_uuid).as_scalar()
+            incoming = (
+                select([func.count(model.id)])
+                .where(
+                    and_(
+                        model.destination_uuid == Wallet.source_uuid,
+                        or_(model.source_uuid.is_(None), model.source_uuid != Wallet.source_uuid),
+                    )
+                )
+                .as_scalar()
+            )
+            return outgoing + incoming
+
+        updated: int = wrapper.session.query(Wallet).update(
+            {Wallet.transaction_count: count(Transaction) + count(TransactionArchive)}, synchronize_session=False
+        )
+        wrapper.session.commit()
+
+        return updated
+
+    @staticmethod
+    def history(source_uuid: str, limit: int, *criteria, model: type = None) -> Query:
+        """
+        Returns the serialized_columns of the newest transactions of a wallet in the given table, newest first.
+        Outgoing and incoming transactions are each read by an index range scan of at most `limit` rows
+        and merged with a UNION instead of filtering the whole table with OR.
+        """
+
+        model = model or Transaction
+        branches = [
+            wrapper.session.query(model)
+            .filter(column == source_uuid, *criteria)
+            .order_by(desc(model.time_stamp), desc(model.id))
+            .limit(limit)
+            .subquery()
+            .select()
+            for column in (model.source_uuid, model.destination_uuid)
+        ]
+        transaction = aliased(model, union(*branches).alias())
+
+        return wrapper.session.query(*[getattr(transaction, name) for name in Transaction.serialized_columns]).order_by(
+            desc(transaction.time_stamp), desc(transaction.id)
+        )
 
     @staticmethod
     def slice_transactions(source_uuid: str, offset: int, count: int) -> List[dict]:
+        """
+        Returns a page of the transactions of a wallet, newest first.
+        The archive is only read if the page reaches past the transactions in currency_transaction.
+        Rows are fetched in chunks of PAGE_FETCH_SIZE and serialized as they arrive.
+        """
+
+        rows = Transaction.history(source_uuid, offset + count).slice(offset, offset + count)
+        transactions: List[dict] = [Transaction.serialize_row(row) for row in rows.yield_per(PAGE_FETCH_SIZE)]
+        if len(transactions) < count:
+            hot: int = offset + len(transactions) if transactions else Transaction.history(source_uuid, offset).count()
+            rows = Transaction.history(source_uuid, offset + count - hot, model=TransactionArchive).slice(
+                max(offset - hot, 0), offset + count - hot
+            )
+            transactions += [Transaction.serialize_row(row) for row in rows.yield_per(PAGE_FETCH_SIZE)]
+
+        return transactions
+
+    @staticmethod
+    def transactions_before(source_uuid: str, before_time: datetime.datetime, before_id: int, count: int) -> List[dict]:
+        """
+        Returns the transactions of a wallet that are older than the cursor (before_time, before_id).
+        A before_id of 0 starts with the newest transaction.
+        The archive is only read if there are not enough older transactions in currency_transaction.
+        """
+
+        rows: list = []
+        for model in (Transaction, TransactionArchive):
+            criteria: list = []
+            if before_id:
+                criteria.append(
+                    or_(
+                        model.time_stamp < before_time,
+                        and_(model.time_stamp == before_time, model.id < before_id),
+                    )
+                )
+
+            rows += Transaction.history(source_uuid, count - len(rows), *criteria, model=model).limit(count - len(rows))
+            if len(rows) >= count:
+                break
+
+        return [Transaction.serialize_row(row) for row in rows]
+
+    @staticmethod
+    def stats(source_uuid: str, since: datetime.datetime, until: datetime.datetime, interval: str) -> List[dict]:
+        """
+        Sums the incoming and outgoing coins of a wallet per hour or day and origin.
+        The range is extended to full hours. The sums are read from the rollups if they are enabled, otherwise
+        they are grouped from the transaction and archive tables using their (wallet, time_stamp) indexes.
+        A transfer from a wallet to itself counts as incoming and outgoing.
+        :return: the buckets ordered by time and origin
+        """
+
+        since = since.replace(minute=0, second=0, microsecond=0)
+        until = (until - datetime.timedelta(microseconds=1)).replace(minute=0, second=0, microsecond=0)
+        until += datetime.timedelta(hours=1)
+        totals: Dict[Tuple[str, int], List[int]] = {}
+
+        if STATS_ROLLUP_ENABLED:
+            bucket = time_bucket(TransactionRollup.hour, interval)
+            rows = (
+                wrapper.session.query(
+                    bucket,
+                    TransactionRollup.origin,
+                    func.sum(TransactionRollup.incoming),
+                    func.sum(TransactionRollup.outgoing),
+                )
+                .filter(
+                    TransactionRollup.wallet_uuid == source_uuid,
+                    TransactionRollup.hour >= since,
+                    TransactionRollup.hour < until,
+                )
+                .group_by(bucket, TransactionRollup.origin)
+            )
+            for time, origin, incoming, outgoing in rows:
+                totals[(time, origin)] = [int(incoming), int(outgoing)]
+        else:
+            for model in (Transaction, TransactionArchive):
+                bucket = time_bucket(model.time_stamp, interval)
+                origin = func.coalesce(model.origin, 0)
+                for direction, column in enumerate((model.destination_uuid, model.source_uuid)):
+                    rows = (
+                        wrapper.session.query(bucket, origin, func.sum(model.send_amount))
+                        .filter(column == source_uuid, model.time_stamp >= since, model.time_stamp < until)
+                        .group_by(bucket, origin)
+                    )
+                    for time, origin_, amount in rows:
+                        totals.setdefault((time, origin_), [0, 0])[direction] += int(amount)
+
         return [
-            transaction.serialize
-            for transaction in Transaction.query(source_uuid)
-            .order_by(desc(Transaction.time_stamp))
-            .slice(offset, offset + count)
+            {"time": time, "origin": origin, "incoming": incoming, "outgoing": outgoing}
+            for (time, origin), (incoming, outgoing) in sorted(totals.items())
         ]
+
+    @staticmethod
+    def rebuild_rollups() -> int:
+        """
+        Replaces the rollups with the hourly sums of the transaction and archive tables.
+        :return: number of created rollups
+        """
+
+        totals: Dict[Tuple[str, str, int], List[int]] = {}
+        for model in (Transaction, TransactionArchive):
+            bucket = time_bucket(model.time_stamp, "hour")
+            origin = func.coalesce(model.origin, 0)
+            for direction, column in enumerate((model.destination_uuid, model.source_uuid)):
+                rows = (
+                    wrapper.session.query(column, bucket, origin, func.sum(model.send_amount))
+                    .filter(column.isnot(None))
+                    .group_by(column, bucket, origin)
+                )
+                for wallet_uuid, hour, origin_, amount in rows:
+                    totals.setdefault((wallet_uuid, hour, origin_), [0, 0])[direction] += int(amount)
+
+        wrapper.session.query(TransactionRollup).delete(synchronize_session=False)
+        wrapper.session.bulk_insert_mappings(
+            TransactionRollup,
+            [
+                {
+                    "wallet_uuid": wallet_uuid,
+                    "hour": datetime.datetime.fromisoformat(hour),
+                    "origin": origin,
+                    "incoming": incoming,
+                    "outgoing": outgoing,
+                }
+                for (wallet_uuid, hour, origin), (incoming, outgoing) in totals.items()
+            ],
+        )
+        wrapper.session.commit()
+
+        return len(totals)
+
+    @staticmethod
+    def archive(before: datetime.datetime, batch_size: int) -> int:
+        """
+        Moves all transactions older than `before` to the archive table, `batch_size` transactions per commit.
+        :return: number of archived transactions
+        """
+
+        columns: list = [getattr(Transaction, name) for name in Transaction.serialized_columns]
+        archived: int = 0
+        while True:
+            ids: List[int] = [
+                transaction_id
+                for transaction_id, in wrapper.session.query(Transaction.id)
+                .filter(Transaction.time_stamp < before)
+                .order_by(Transaction.id)
+                .limit(batch_size)
+            ]
+            if not ids:
+                return archived
+
+            wrapper.session.execute(
+                TransactionArchive.__table__.insert().from_select(
+                    Transaction.serialized_columns, select(columns).where(Transaction.id.in_(ids))
+                )
+            )
+            wrapper.session.query(Transaction).filter(Transaction.id.in_(ids)).delete(synchronize_session=False)
+            wrapper.session.commit()
+            archived += len(ids)
+
+    @staticmethod
+    def stream(
+        source_uuids: List[str],
+        since: Optional[datetime.datetime],
+        until: Optional[datetime.datetime],
+        after: Optional[Tuple[datetime.datetime, int]],
+        batch_size: int,
+    ) -> Iterator[tuple]:
+        """
+        Yields the serialized_columns of all transactions of the given wallets (or of all wallets if none are given)
+        in the time range, oldest first and starting behind the (time_stamp, id) of `after`.
+        The archive is read before the transaction table. Rows are fetched from a server side cursor in batches
+        of `batch_size`, so the memory usage does not depend on the number of transactions.
+        """
+
+        for model in (TransactionArchive, Transaction):
+            criteria: list = []
+            if source_uuids:
+                criteria.append(or_(model.source_uuid.in_(source_uuids), model.destination_uuid.in_(source_uuids)))
+            if since is not None:
+                criteria.append(model.time_stamp >= since)
+            if until is not None:
+                criteria.append(model.time_stamp < until)
+            if after is not None:
+                criteria.append(
+                    or_(model.time_stamp > after[0], and_(model.time_stamp == after[0], model.id > after[1]))
+                )
+
+            yield from (
+                wrapper.session.query(*[getattr(model, name) for name in Transaction.serialized_columns])
+                .filter(*criteria)
+                .order_by(model.time_stamp, model.id)
+                .execution_options(stream_results=True)
+                .yield_per(batch_size)
+            )
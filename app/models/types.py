@@ -0,0 +1,93 @@
+import uuid
+from typing import Optional
+
+from sqlalchemy import String, BINARY
+from sqlalchemy.types import TypeDecorator
+
+from config import UUID_BINARY_STORAGE
+
+# bound instead of values that are not uuids, it never equals a stored uuid because those are 16 bytes long
+UNKNOWN_UUID: bytes = b""
+
+
+def uuid_bytes(value: object) -> Optional[bytes]:
+    """
+    Converts a uuid in the text form the models use into its 16 raw bytes.
+    :return: the bytes or None if the value is not a uuid in that form
+    """
+
+    if not isinstance(value, str):
+        return None
+
+    try:
+        parsed: uuid.UUID = uuid.UUID(value)
+    except ValueError:
+        return None
+
+    return parsed.bytes if str(parsed) == value else None
+
+
+def storable_uuid(value: object, binary: bool = UUID_BINARY_STORAGE) -> bool:
+    """
+    Checks whether a uuid of a request can be written into a uuid column.
+    :return: True unless binary storage is used and the value is not a uuid
+    """
+
+    return not binary or uuid_bytes(value) is not None
+
+
+class UUIDType(TypeDecorator):
+    """
+    A uuid that is stored as CHAR(36) text or, with binary storage, as its 16 raw bytes.
+    The models always see the text form. With binary storage values that are not uuids match no row,
+    just like they match no row of a text column.
+    """
+
+    impl = String(36)
+    cache_ok = True
+
+    def __init__(self, binary: bool = UUID_BINARY_STORAGE):
+        super().__init__()
+        self.binary: bool = binary
+
+    def load_dialect_impl(self, dialect):
+        return dialect.type_descriptor(BINARY(16) if self.binary else String(36))
+
+    def process_bind_param(self, value: Optional[str], dialect) -> Optional[object]:
+        if value is None or not self.binary:
+            return value
+
+        converted: Optional[bytes] = uuid_bytes(value)
+        return UNKNOWN_UUID if converted is None else converted
+
+    def process_result_value(self, value: Optional[object], dialect) -> Optional[str]:
+        if value is None or not self.binary:
+            return value
+        return str(uuid.UUID(bytes=bytes(value)))
+
+
+class HexKey(TypeDecorator):
+    """
+    A key of hex digits that is stored as text or, with binary storage, as BINARY(`size`).
+    """
+
+    impl = String(16)
+    cache_ok = True
+
+    def __init__(self, size: int, binary: bool = UUID_BINARY_STORAGE):
+        super().__init__()
+        self.size: int = size
+        self.binary: bool = binary
+
+    def load_dialect_impl(self, dialect):
+        return dialect.type_descriptor(BINARY(self.size) if self.binary else String(16))
+
+    def process_bind_param(self, value: Optional[str], dialect) -> Optional[object]:
+        if value is None or not self.binary:
+            return value
+        return bytes.fromhex(value)
+
+    def process_result_value(self, value: Optional[object], dialect) -> Optional[str]:
+        if value is None or not self.binary:
+            return value
+        return bytes(value).hex()
@@ -1,31 +1,46 @@
 import datetime
-from typing import Union
+import hmac
+from typing import Union, Tuple, Optional
 from uuid import uuid4
 
-from sqlalchemy import Column, String, DateTime, BigInteger
+from sqlalchemy import Column, DateTime, BigInteger, Float
 
 from app import wrapper
+from models.types import UUIDType, HexKey
 
 
 class Wallet(wrapper.Base):
     __tablename__: str = "currency_wallet"
 
     time_stamp: Union[Column, datetime.datetime] = Column(DateTime, nullable=False)
-    source_uuid: Union[Column, str] = Column(String(36), primary_key=True, unique=True)
-    key: Union[Column, str] = Column(String(16))
+    source_uuid: Union[Column, str] = Column(UUIDType(), primary_key=True, unique=True)
+    key: Union[Column, str] = Column(HexKey(5))
     amount: Union[Column, int] = Column(BigInteger, nullable=False, default=0)
-    user_uuid: Union[Column, str] = Column(String(36), unique=True)
+    user_uuid: Union[Column, str] = Column(UUIDType(), unique=True)
+    transaction_count: Union[Column, int] = Column(BigInteger, nullable=False, default=0, server_default="0")
+    mining_rate: Union[Column, float] = Column(Float, nullable=False, default=0, server_default="0")
+    mining_settled: Union[Column, Optional[datetime.datetime]] = Column(DateTime)
+
+    serialized_columns: Tuple[str, ...] = ("time_stamp", "source_uuid", "key", "amount", "user_uuid")
 
     @property
     def serialize(self) -> dict:
-        _: str = self.source_uuid
-        d = self.__dict__.copy()
-
-        del d["_sa_instance_state"]
+        d = {name: getattr(self, name) for name in Wallet.serialized_columns}
         d["time_stamp"] = str(d["time_stamp"])
 
         return d
 
+    def pending_coins(self, now: datetime.datetime) -> int:
+        """
+        Returns the coins mined at the mining rate since the wallet was settled the last time.
+        :return: number of coins
+        """
+
+        if not self.mining_rate or self.mining_settled is None or now <= self.mining_settled:
+            return 0
+
+        return int(self.mining_rate * (now - self.mining_settled).total_seconds())
+
     @staticmethod
     def create(user_uuid: str) -> "Wallet":
         """
@@ -39,7 +54,12 @@ class Wallet(wrapper.Base):
 
         # Create a new Wallet instance
         wallet: Wallet = Wallet(
-            time_stamp=datetime.datetime.now(), source_uuid=source_uuid, key=key, amount=0, user_uuid=user_uuid
+            time_stamp=datetime.datetime.now(),
+            source_uuid=source_uuid,
+            key=key,
+            amount=0,
+            user_uuid=user_uuid,
+            transaction_count=0,
         )
 
         # Add the new wallet to the db
@@ -48,8 +68,17 @@ class Wallet(wrapper.Base):
 
         return wallet
 
+    @staticmethod
+    def check_key(expected: Optional[str], key: Optional[str]) -> bool:
+        """
+        Compares a wallet key with the key of a request in constant time.
+        :return: True if the keys are equal
+        """
+
+        return expected is not None and isinstance(key, str) and hmac.compare_digest(expected.encode(), key.encode())
+
     @staticmethod
     def auth_user(source_uuid: str, key: str) -> bool:
-        return wrapper.session.query(
-            wrapper.session.query(Wallet).filter(Wallet.source_uuid == source_uuid, Wallet.key == key).exists()
-        ).scalar()
+        row: Optional[tuple] = wrapper.session.query(Wallet.key).filter_by(source_uuid=source_uuid).first()
+
+        return row is not None and Wallet.check_key(row[0], key)
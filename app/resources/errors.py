@@ -1,21 +1,85 @@
+import functools
+from typing import Callable, NamedTuple, Optional
+
 from cryptic import MicroserviceException
 
 from app import wrapper
 from models.wallet import Wallet
 from schemes import unknown_source_or_destination, permission_denied
+from utils.wallet_cache import is_unknown, remember_unknown
+
+
+class WalletAccess(NamedTuple):
+    source_uuid: str
+    user_uuid: str
+    amount: int
 
 
 def wallet_exists(data: dict, user: str) -> Wallet:
+    if is_unknown(data["source_uuid"]):
+        raise MicroserviceException(unknown_source_or_destination)
+
     wallet: Wallet = wrapper.session.query(Wallet).get(data["source_uuid"])
 
     if wallet is None:
+        remember_unknown(data["source_uuid"])
         raise MicroserviceException(unknown_source_or_destination)
 
     return wallet
 
 
 def can_access_wallet(data: dict, user: str, wallet: Wallet) -> Wallet:
-    if wallet.key != data["key"]:
+    if not Wallet.check_key(wallet.key, data["key"]):
         raise MicroserviceException(permission_denied)
 
     return wallet
+
+
+def wallet_access(data: dict, user: str) -> WalletAccess:
+    """
+    Combines wallet_exists and can_access_wallet for endpoints that do not change the wallet.
+    Only key, owner and amount are loaded with one primary key lookup instead of the whole wallet.
+    """
+
+    source_uuid: str = data["source_uuid"]
+    if is_unknown(source_uuid):
+        raise MicroserviceException(unknown_source_or_destination)
+
+    row: Optional[tuple] = (
+        wrapper.session.query(Wallet.key, Wallet.user_uuid, Wallet.amount).filter_by(source_uuid=source_uuid).first()
+    )
+    if row is None:
+        remember_unknown(source_uuid)
+        raise MicroserviceException(unknown_source_or_destination)
+
+    key, user_uuid, amount = row
+    if not Wallet.check_key(key, data["key"]):
+        raise MicroserviceException(permission_denied)
+
+    return WalletAccess(source_uuid, user_uuid, amount)
+
+
+def check_errors(*errors: Callable) -> Callable:
+    """
+    Runs the error checks of an endpoint right before it, inside all other decorators of the endpoint.
+    The checks are measured by the metrics, limited by the rate limiter, run in the session scope and
+    under the wallet locks of the endpoint. Every check gets the result of the previous one and the
+    endpoint the result of the last one. The error of a failed check is returned instead of calling the endpoint.
+    """
+
+    def decorator(f: Callable) -> Callable:
+        @functools.wraps(f)
+        def checked(data: dict, user: str) -> dict:
+            args: tuple = ()
+            try:
+                for error in errors:
+                    args = (error(data, user, *args),)
+            except MicroserviceException as exception:
+                return exception.error
+
+            return f(data, user, *args)
+
+        checked.__checks__ = errors
+        return checked
+
+    return decorator
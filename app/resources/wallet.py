@@ -1,73 +1,217 @@
-from typing import Optional
-
-from cryptic import register_errors
+import datetime
+from typing import Optional, Dict, List, Tuple
 
 from app import m, wrapper
+from config import TRANSACTIONS_MAX_PAGE_SIZE
+from models.idempotency import IdempotencyKey
+from models.ledger import LedgerEntry
 from models.transaction import Transaction
+from models.types import storable_uuid
 from models.wallet import Wallet
-from resources.errors import wallet_exists, can_access_wallet
+from resources.errors import check_errors, wallet_exists, can_access_wallet, wallet_access, WalletAccess
 from schemes import *
-
-
-def update_miner(wallet: Wallet):
-    wallet.amount += m.contact_microservice("service", ["miner", "collect"], {"wallet_uuid": wallet.source_uuid})[
-        "coins"
-    ]
-    wrapper.session.commit()
-
-
-@m.user_endpoint(path=["create"], requires={})
+from utils.locks import wallet_locks
+from utils.metrics import metrics
+from utils.miner import collector
+from utils.notifications import dispatcher
+from utils.ratelimit import limiter, rows_cost
+from utils.session import session_scope
+from utils.transfer import transfer, lock_wallets
+from utils.validation import user_endpoint
+from utils.workers import workers
+from utils.wallet_cache import (
+    wallet_cache,
+    unknown_wallets,
+    WalletInfo,
+    get_wallet_info,
+    get_wallet_infos,
+    cache_wallet,
+    invalidate_wallet,
+    invalidate_user,
+)
+
+
+def update_miner(wallet: Wallet) -> Optional[Wallet]:
+    """
+    Adds the mined coins to the wallet. The error checks may have loaded the wallet before the request held its
+    wallet lock, so like in transfer the wallet is locked and loaded again after the miner rpc.
+    The caller is responsible for committing the session.
+    :return: the locked wallet or None if it has been deleted
+    """
+
+    coins: int = collector.fetch(wallet.source_uuid)
+    locked: Optional[Wallet] = lock_wallets(wallet.source_uuid).get(wallet.source_uuid)
+    if locked is not None:
+        collector.credit(locked, coins)
+
+    return locked
+
+
+def repeated_request(data: dict, wallet_uuid: str, endpoint: str) -> Optional[dict]:
+    """
+    Checks the optional idempotency key of a request.
+    :return: an error scheme, the result of the earlier request with the same key or None for a new request
+    """
+
+    if not IdempotencyKey.valid(data.get("idempotency_key")):
+        return invalid_idempotency_key
+
+    return IdempotencyKey.lookup(wallet_uuid, endpoint, data.get("idempotency_key"))
+
+
+def page_size(data: dict) -> int:
+    return min(data["count"], TRANSACTIONS_MAX_PAGE_SIZE)
+
+
+def batch_destinations(data: dict) -> List[str]:
+    return [item["destination_uuid"] for item in data["items"]]
+
+
+def transaction_page(data: dict, transactions: List[dict]) -> dict:
+    """
+    Builds the response of a transaction page. If the requested count was capped at TRANSACTIONS_MAX_PAGE_SIZE
+    and the page is full, it is marked as truncated and contains the cursor of its last transaction,
+    which continues the page with transactions/before.
+    """
+
+    truncated: bool = page_size(data) < data["count"] and len(transactions) == page_size(data)
+    if not truncated:
+        return {"transactions": transactions, "truncated": False}
+
+    last: dict = transactions[-1]
+    return {
+        "transactions": transactions,
+        "truncated": True,
+        "cursor": {"before_time": last["time_stamp"], "before_id": last["id"]},
+    }
+
+
+@user_endpoint(path=["create"], requires={})
+@metrics.instrument
+@limiter.endpoint()
+@workers.endpoint()
+@session_scope
 def create(data: dict, user: str) -> dict:
     wallet: Optional[Wallet] = wrapper.session.query(Wallet).filter_by(user_uuid=user).first()
     if wallet is not None:
         return already_own_a_wallet
 
     wallet: Wallet = Wallet.create(user)
+    cache_wallet(wallet)
 
     return wallet.serialize
 
 
-@m.user_endpoint(path=["get"], requires=scheme_default)
-@register_errors(wallet_exists, can_access_wallet)
+@user_endpoint(path=["get"], requires=scheme_default)
+@metrics.instrument
+@limiter.endpoint()
+@workers.endpoint("source_uuid")
+@session_scope
+@check_errors(wallet_exists, can_access_wallet)
 def get(data: dict, user: str, wallet: Wallet) -> dict:
-    update_miner(wallet)
-
-    return {**wallet.serialize, "transactions": Transaction.count_transactions(wallet.source_uuid)}
+    if collector.lazy:
+        return {**wallet.serialize, "amount": collector.balance(wallet), "transactions": wallet.transaction_count}
 
+    wallet: Optional[Wallet] = update_miner(wallet)
+    wrapper.session.commit()
+    if wallet is None:
+        return unknown_source_or_destination
 
-@m.user_endpoint(path=["transactions"], requires=scheme_transactions)
-@register_errors(wallet_exists, can_access_wallet)
-def transactions(data: dict, user: str, wallet: Wallet) -> dict:
-    return {"transactions": Transaction.slice_transactions(wallet.source_uuid, data["offset"], data["count"])}
+    return {**wallet.serialize, "transactions": wallet.transaction_count}
+
+
+@user_endpoint(path=["transactions"], requires=scheme_transactions)
+@metrics.instrument
+@limiter.endpoint(cost=lambda data: rows_cost(data["offset"] + page_size(data)))
+@workers.endpoint()
+@session_scope
+@check_errors(wallet_access)
+def transactions(data: dict, user: str, wallet: WalletAccess) -> dict:
+    return transaction_page(data, Transaction.slice_transactions(wallet.source_uuid, data["offset"], page_size(data)))
+
+
+@user_endpoint(path=["transactions", "before"], requires=scheme_transactions_before)
+@metrics.instrument
+@limiter.endpoint(cost=lambda data: rows_cost(page_size(data)))
+@workers.endpoint()
+@session_scope
+@check_errors(wallet_access)
+def transactions_before(data: dict, user: str, wallet: WalletAccess) -> dict:
+    try:
+        before_time: datetime.datetime = datetime.datetime.fromisoformat(data["before_time"])
+    except ValueError:
+        return invalid_cursor
+
+    return transaction_page(
+        data, Transaction.transactions_before(wallet.source_uuid, before_time, data["before_id"], page_size(data))
+    )
 
 
-@m.user_endpoint(path=["list"], requires={})
+@user_endpoint(path=["stats"], requires=scheme_stats)
+@metrics.instrument
+@limiter.endpoint(cost=2)
+@workers.endpoint()
+@session_scope
+@check_errors(wallet_access)
+def stats(data: dict, user: str, wallet: WalletAccess) -> dict:
+    try:
+        since: datetime.datetime = datetime.datetime.fromisoformat(data["since"])
+        until: datetime.datetime = datetime.datetime.fromisoformat(data["until"])
+    except ValueError:
+        return invalid_time_range
+    if since >= until:
+        return invalid_time_range
+
+    return {"stats": Transaction.stats(wallet.source_uuid, since, until, data["interval"])}
+
+
+@user_endpoint(path=["list"], requires={}, optional=scheme_list)
+@metrics.instrument
+@limiter.endpoint()
+@workers.endpoint()
+@session_scope
 def list_wallets(data: dict, user: str) -> dict:
-    return {"wallets": [wallet.source_uuid for wallet in wrapper.session.query(Wallet).filter_by(user_uuid=user)]}
+    if not data.get("details"):
+        return {
+            "wallets": [
+                source_uuid for source_uuid, in wrapper.session.query(Wallet.source_uuid).filter_by(user_uuid=user)
+            ]
+        }
+
+    wallets = wrapper.session.query(Wallet.source_uuid, Wallet.amount, Wallet.transaction_count).filter_by(
+        user_uuid=user
+    )
+
+    return {
+        "wallets": [
+            {"source_uuid": source_uuid, "amount": amount, "transactions": transaction_count}
+            for source_uuid, amount, transaction_count in wallets
+        ]
+    }
 
 
-@m.user_endpoint(path=["send"], requires=scheme_send)
-@register_errors(wallet_exists, can_access_wallet)
+@user_endpoint(path=["send"], requires=scheme_send, optional=scheme_idempotency)
+@metrics.instrument
+@limiter.endpoint(cost=2)
+@workers.endpoint("source_uuid", "destination_uuid")
+@session_scope
+@check_errors(wallet_exists, can_access_wallet)
 def send(data: dict, user: str, source_wallet: Wallet) -> dict:
     destination_uuid: str = data["destination_uuid"]
-    destination_wallet: Wallet = wrapper.session.query(Wallet).filter_by(source_uuid=destination_uuid).first()
 
-    if destination_wallet is None:
-        return unknown_source_or_destination
-
-    update_miner(source_wallet)
-
-    amount: int = data["send_amount"]
-    if source_wallet.amount - amount < 0 or amount < 0:
-        return not_enough_coins
+    result: Optional[dict] = repeated_request(data, source_wallet.source_uuid, "send")
+    if result is not None:
+        return result
 
-    source_wallet.amount -= amount
-    destination_wallet.amount += amount
-    wrapper.session.commit()
+    error: Optional[dict] = transfer(
+        source_wallet, destination_uuid, data["send_amount"], data["usage"], data.get("idempotency_key")
+    )
+    if error is not None:
+        return error
 
-    Transaction.create(source_wallet.source_uuid, amount, destination_uuid, data["usage"], origin=0)
+    destination_wallet: Wallet = wrapper.session.query(Wallet).get(destination_uuid)
 
-    m.contact_user(
+    dispatcher.notify(
         source_wallet.user_uuid,
         {
             "notify-id": "outgoing-transaction",
@@ -76,7 +220,7 @@ def send(data: dict, user: str, source_wallet: Wallet) -> dict:
             "new_amount": source_wallet.amount,
         },
     )
-    m.contact_user(
+    dispatcher.notify(
         destination_wallet.user_uuid,
         {
             "notify-id": "incoming-transaction",
@@ -89,61 +233,132 @@ def send(data: dict, user: str, source_wallet: Wallet) -> dict:
     return success_scheme
 
 
-@m.user_endpoint(path=["reset"], requires=scheme_reset)
-@register_errors(wallet_exists)
+@user_endpoint(path=["reset"], requires=scheme_reset)
+@metrics.instrument
+@limiter.endpoint()
+@workers.endpoint("source_uuid")
+@session_scope
+@check_errors(wallet_exists)
 def reset(data: dict, user: str, wallet: Wallet) -> dict:
     if wallet.user_uuid != user:
         return permission_denied
 
-    m.contact_microservice("service", ["miner", "stop"], {"wallet_uuid": wallet.source_uuid})
+    with metrics.external_call():
+        m.contact_microservice("service", ["miner", "stop"], {"wallet_uuid": wallet.source_uuid})
 
     wrapper.session.delete(wallet)
     wrapper.session.commit()
+    collector.forget(wallet.source_uuid)
+    invalidate_wallet(wallet.source_uuid)
 
     return success_scheme
 
 
-@m.user_endpoint(path=["delete"], requires=scheme_default)
-@register_errors(wallet_exists)
+@user_endpoint(path=["delete"], requires=scheme_default)
+@metrics.instrument
+@limiter.endpoint()
+@workers.endpoint("source_uuid")
+@session_scope
+@check_errors(wallet_exists)
 def delete(data: dict, user: str, wallet: Wallet) -> dict:
     if wallet.user_uuid != user:
         return permission_denied
 
-    m.contact_microservice("service", ["miner", "stop"], {"wallet_uuid": wallet.source_uuid})
+    with metrics.external_call():
+        m.contact_microservice("service", ["miner", "stop"], {"wallet_uuid": wallet.source_uuid})
 
     wrapper.session.delete(wallet)
     wrapper.session.commit()
+    collector.forget(wallet.source_uuid)
+    invalidate_wallet(wallet.source_uuid)
 
     return success_scheme
 
 
 @m.microservice_endpoint(path=["exists"])
+@metrics.instrument
+@workers.endpoint()
+@session_scope
 def exists(data: dict, microservice: str) -> dict:
-    return {"exists": wrapper.session.query(Wallet).filter_by(source_uuid=data["source_uuid"]).first() is not None}
+    return {"exists": get_wallet_info(data["source_uuid"]) is not None}
 
 
 @m.microservice_endpoint(path=["owner"])
+@metrics.instrument
+@workers.endpoint()
+@session_scope
 def owner(data: dict, microservice: str) -> dict:
-    wallet: Optional[Wallet] = wrapper.session.query(Wallet).filter_by(source_uuid=data["source_uuid"]).first()
-    if wallet is None:
+    info: Optional[WalletInfo] = get_wallet_info(data["source_uuid"])
+    if info is None:
         return unknown_source_or_destination
 
-    return {"owner": wallet.user_uuid}
+    return {"owner": info.user_uuid}
+
+
+@m.microservice_endpoint(path=["exists_many"])
+@metrics.instrument
+@workers.endpoint()
+@session_scope
+def exists_many(data: dict, microservice: str) -> dict:
+    infos: Dict[str, WalletInfo] = get_wallet_infos(data["source_uuids"])
+
+    return {"exists": {source_uuid: source_uuid in infos for source_uuid in data["source_uuids"]}}
+
+
+@m.microservice_endpoint(path=["owner_many"])
+@metrics.instrument
+@workers.endpoint()
+@session_scope
+def owner_many(data: dict, microservice: str) -> dict:
+    infos: Dict[str, WalletInfo] = get_wallet_infos(data["source_uuids"])
+
+    return {
+        "owners": {
+            source_uuid: (
+                {"owner": infos[source_uuid].user_uuid} if source_uuid in infos else unknown_source_or_destination
+            )
+            for source_uuid in data["source_uuids"]
+        }
+    }
 
 
 @m.microservice_endpoint(path=["put"])
+@metrics.instrument
+@workers.endpoint("destination_uuid")
+@session_scope
 def put(data: dict, microservice: str) -> dict:
     amount: int = data["amount"]
     destination_uuid: str = data["destination_uuid"]
+    if data["create_transaction"] and not storable_uuid(data["source_uuid"]):
+        return unknown_source_or_destination
+
+    result: Optional[dict] = repeated_request(data, destination_uuid, "put")
+    if result is not None:
+        return result
 
     wallet: Wallet = wrapper.session.query(Wallet).filter_by(source_uuid=destination_uuid).first()
     if wallet is None:
         return unknown_source_or_destination
 
     wallet.amount += amount
+    LedgerEntry.record(wallet.source_uuid, amount, "put")
+
+    result = success_scheme
+    if data["create_transaction"]:
+        source_uuid: str = data["source_uuid"]
+        usage: str = data["usage"]
+        origin: int = data["origin"]
+
+        transaction: Transaction = Transaction.create(
+            source_uuid, amount, destination_uuid, usage, origin, commit=False
+        )
+        wrapper.session.flush()
+        result = transaction.serialize
+
+    IdempotencyKey.record(destination_uuid, "put", data.get("idempotency_key"), result)
     wrapper.session.commit()
 
-    m.contact_user(
+    dispatcher.notify(
         wallet.user_uuid,
         {
             "notify-id": "incoming-transaction",
@@ -153,30 +368,110 @@ def put(data: dict, microservice: str) -> dict:
         },
     )
 
-    if not data["create_transaction"]:
-        return success_scheme
+    return result
+
+
+@m.microservice_endpoint(path=["put_batch"])
+@metrics.instrument
+@workers.endpoint(wallets=batch_destinations)
+@session_scope
+def put_batch(data: dict, microservice: str) -> dict:
+    items: List[dict] = data["items"]
+    if data["create_transaction"] and not storable_uuid(data["source_uuid"]):
+        return unknown_source_or_destination
+
+    destination_uuids: List[str] = batch_destinations(data)
+    wallets: Dict[str, Wallet] = lock_wallets(*destination_uuids)
+
+    results: List[dict] = []
+    transactions: List[dict] = []
+    for item in items:
+        wallet: Optional[Wallet] = wallets.get(item["destination_uuid"])
+        if wallet is None:
+            results.append(unknown_source_or_destination)
+            continue
+
+        wallet.amount += item["amount"]
+        LedgerEntry.record(wallet.source_uuid, item["amount"], "put")
+        results.append(success_scheme)
+
+        if data["create_transaction"]:
+            transactions.append(
+                {
+                    "source_uuid": data["source_uuid"],
+                    "send_amount": item["amount"],
+                    "destination_uuid": wallet.source_uuid,
+                    "usage": item["usage"],
+                    "origin": item["origin"],
+                }
+            )
+
+    if transactions:
+        Transaction.create_many(transactions)
+
+    # one notification per wallet with its final balance, collected before the commit expires the wallets
+    notifications: List[Tuple[str, dict]] = [
+        (
+            wallet.user_uuid,
+            {
+                "notify-id": "incoming-transaction",
+                "origin": "put",
+                "wallet_uuid": wallet.source_uuid,
+                "new_amount": wallet.amount,
+            },
+        )
+        for wallet in wallets.values()
+    ]
+    wrapper.session.commit()
 
-    source_uuid: str = data["source_uuid"]
-    usage: str = data["usage"]
-    origin: int = data["origin"]
+    for user_uuid, notification in notifications:
+        dispatcher.notify(user_uuid, notification)
 
-    transaction: Transaction = Transaction.create(source_uuid, amount, destination_uuid, usage, origin)
-    return transaction.serialize
+    return {"results": results}
 
 
 @m.microservice_endpoint(path=["dump"])
-@register_errors(wallet_exists, can_access_wallet)
+@metrics.instrument
+@workers.endpoint("source_uuid")
+@session_scope
+@check_errors(wallet_exists, can_access_wallet)
 def dump(data: dict, microservice: str, wallet: Wallet) -> dict:
     amount: int = data["amount"]
+    if data["create_transaction"] and not storable_uuid(data["destination_uuid"]):
+        return unknown_source_or_destination
 
-    update_miner(wallet)
+    result: Optional[dict] = repeated_request(data, wallet.source_uuid, "dump")
+    if result is not None:
+        return result
+
+    wallet: Optional[Wallet] = update_miner(wallet)
+    if wallet is None:
+        wrapper.session.commit()
+        return unknown_source_or_destination
 
     if wallet.amount < amount:
+        # keep the coins the miner has already paid out
+        wrapper.session.commit()
         return not_enough_coins
     wallet.amount -= amount
+    LedgerEntry.record(wallet.source_uuid, -amount, "dump")
+
+    result = success_scheme
+    if data["create_transaction"]:
+        destination_uuid: str = data["destination_uuid"]
+        usage: str = data["usage"]
+        origin: int = data["origin"]
+
+        transaction: Transaction = Transaction.create(
+            wallet.source_uuid, amount, destination_uuid, usage, origin, commit=False
+        )
+        wrapper.session.flush()
+        result = transaction.serialize
+
+    IdempotencyKey.record(wallet.source_uuid, "dump", data.get("idempotency_key"), result)
     wrapper.session.commit()
 
-    m.contact_user(
+    dispatcher.notify(
         wallet.user_uuid,
         {
             "notify-id": "outgoing-transaction",
@@ -186,22 +481,47 @@ def dump(data: dict, microservice: str, wallet: Wallet) -> dict:
         },
     )
 
-    if not data["create_transaction"]:
-        return success_scheme
+    return result
 
-    destination_uuid: str = data["destination_uuid"]
-    usage: str = data["usage"]
-    origin: int = data["origin"]
 
-    transaction: Transaction = Transaction.create(wallet.source_uuid, amount, destination_uuid, usage, origin)
-    return transaction.serialize
+@m.microservice_endpoint(path=["miner", "rate"])
+@metrics.instrument
+@workers.endpoint("wallet_uuid")
+@session_scope
+def miner_rate(data: dict, microservice: str) -> dict:
+    wallet: Optional[Wallet] = lock_wallets(data["wallet_uuid"]).get(data["wallet_uuid"])
+    if wallet is None:
+        return unknown_source_or_destination
+
+    collector.set_rate(wallet, data["rate"])
+    wrapper.session.commit()
+
+    return success_scheme
 
 
 @m.microservice_endpoint(path=["delete_user"])
+@metrics.instrument
+@workers.endpoint()
+@session_scope
 def delete_user(data: dict, microservice: str) -> dict:
     user: str = data["user_uuid"]
 
     wrapper.session.query(Wallet).filter_by(user_uuid=user).delete()
     wrapper.session.commit()
+    invalidate_user(user)
 
     return success_scheme
+
+
+@m.microservice_endpoint(path=["metrics"])
+def export_metrics(data: dict, microservice: str) -> dict:
+    gauges: Dict[str, dict] = {
+        "miner": collector.stats(),
+        "wallet_cache": wallet_cache.stats(),
+        "unknown_wallets": unknown_wallets.stats(),
+        "rate_limit": limiter.stats(),
+        "notifications": dispatcher.stats(),
+        "wallet_locks": {**wallet_locks.stats(), "hottest_wait_seconds": dict(wallet_locks.hottest())},
+    }
+
+    return {"metrics": metrics.export(gauges)}
@@ -1,4 +1,4 @@
-from scheme import Text, Integer, UUID
+from scheme import Text, Integer, UUID, Boolean
 
 scheme_default: dict = {"source_uuid": UUID(), "key": Text(pattern=r"^[a-f0-9]{10}$")}
 
@@ -6,6 +6,22 @@ scheme_reset: dict = {"source_uuid": UUID()}
 
 scheme_transactions: dict = {**scheme_default, "offset": Integer(minimum=0), "count": Integer(minimum=1)}
 
+scheme_transactions_before: dict = {
+    **scheme_default,
+    "before_id": Integer(minimum=0),
+    "before_time": Text(pattern=r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(\.\d{6})?$"),
+    "count": Integer(minimum=1),
+}
+
+scheme_stats: dict = {
+    **scheme_default,
+    "since": Text(pattern=r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(\.\d{6})?$"),
+    "until": Text(pattern=r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(\.\d{6})?$"),
+    "interval": Text(pattern=r"^(hour|day)$"),
+}
+
+scheme_list: dict = {"details": Boolean()}
+
 scheme_send: dict = {
     "source_uuid": UUID(),
     "key": Text(pattern=r"^[a-f0-9]{10}$"),
@@ -14,8 +30,12 @@ scheme_send: dict = {
     "usage": Text(),
 }
 
+scheme_idempotency: dict = {"idempotency_key": Text()}
+
 success_scheme: dict = {"ok": True}
 
+invalid_input_data: dict = {"error": "invalid_input_data"}
+
 permission_denied: dict = {"error": "permission_denied"}
 
 already_own_a_wallet: dict = {"error": "already_own_a_wallet"}
@@ -23,3 +43,11 @@ already_own_a_wallet: dict = {"error": "already_own_a_wallet"}
 unknown_source_or_destination: dict = {"error": "unknown_source_or_destination"}
 
 not_enough_coins: dict = {"error": "not_enough_coins"}
+
+invalid_cursor: dict = {"error": "invalid_cursor"}
+
+invalid_time_range: dict = {"error": "invalid_time_range"}
+
+invalid_idempotency_key: dict = {"error": "invalid_idempotency_key"}
+
+rate_limited: dict = {"error": "rate_limited"}
@@ -0,0 +1,76 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from utils.cache import LRUCache
+
+
+class TestCache(TestCase):
+    def test__get__miss(self):
+        cache = LRUCache(2, 10)
+
+        self.assertEqual("default", cache.get("key", "default"))
+        self.assertEqual({"size": 0, "hits": 0, "misses": 1, "evictions": 0}, cache.stats())
+
+    def test__get__hit(self):
+        cache = LRUCache(2, 10)
+        cache.put("key", "value")
+
+        self.assertEqual("value", cache.get("key"))
+        self.assertEqual({"size": 1, "hits": 1, "misses": 0, "evictions": 0}, cache.stats())
+
+    @patch("utils.cache.time.monotonic")
+    def test__get__expired(self, monotonic_patch):
+        cache = LRUCache(2, 10)
+        monotonic_patch.return_value = 100
+        cache.put("key", "value")
+        cache.put("short", "value", ttl=1)
+
+        monotonic_patch.return_value = 105
+        self.assertIsNone(cache.get("short"))
+        self.assertEqual("value", cache.get("key"))
+
+        monotonic_patch.return_value = 111
+        self.assertIsNone(cache.get("key"))
+        self.assertEqual(0, len(cache))
+
+    def test__put__evicts_least_recently_used(self):
+        cache = LRUCache(2, 10)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+
+        self.assertEqual(1, cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(3, cache.get("c"))
+        self.assertEqual(1, cache.stats()["evictions"])
+
+    def test__put__disabled(self):
+        cache = LRUCache(0, 10)
+        cache.put("a", 1)
+
+        self.assertIsNone(cache.get("a"))
+
+    def test__invalidate(self):
+        cache = LRUCache(2, 10)
+        cache.put("a", 1)
+        cache.invalidate("a")
+        cache.invalidate("unknown")
+
+        self.assertIsNone(cache.get("a"))
+
+    def test__invalidate_where(self):
+        cache = LRUCache(3, 10)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.put("c", 3)
+        cache.invalidate_where(lambda value: value % 2)
+
+        self.assertEqual([None, 2, None], [cache.get(key) for key in "abc"])
+
+    def test__clear(self):
+        cache = LRUCache(2, 10)
+        cache.put("a", 1)
+        cache.clear()
+
+        self.assertEqual(0, len(cache))
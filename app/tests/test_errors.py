@@ -1,15 +1,18 @@
 from unittest import TestCase
+from unittest.mock import patch
 
 from mock.mock_loader import mock
 from models.wallet import Wallet
 from resources import errors
-from resources.errors import MicroserviceException
+from resources.errors import MicroserviceException, WalletAccess
 from schemes import unknown_source_or_destination, permission_denied
+from utils.wallet_cache import unknown_wallets
 
 
 class TestErrors(TestCase):
     def setUp(self):
         mock.reset_mocks()
+        unknown_wallets.clear()
 
         self.query_wallet = mock.MagicMock()
         mock.wrapper.session.query.side_effect = {Wallet: self.query_wallet}.__getitem__
@@ -23,6 +26,15 @@ class TestErrors(TestCase):
         self.assertEqual(unknown_source_or_destination, context.exception.error)
         self.query_wallet.get.assert_called_with("source")
 
+    def test__wallet_exists__unknown_cached(self):
+        self.query_wallet.get.return_value = None
+        for _ in range(2):
+            with self.assertRaises(MicroserviceException) as context:
+                errors.wallet_exists({"source_uuid": "source"}, "")
+
+            self.assertEqual(unknown_source_or_destination, context.exception.error)
+        self.query_wallet.get.assert_called_once_with("source")
+
     def test__wallet_exists__successful(self):
         mock_wallet = self.query_wallet.get.return_value = mock.MagicMock()
 
@@ -43,3 +55,77 @@ class TestErrors(TestCase):
         mock_wallet.key = "s3cr3t"
 
         self.assertEqual(mock_wallet, errors.can_access_wallet({"key": "s3cr3t"}, "", mock_wallet))
+
+    def test__can_access_wallet__no_key(self):
+        mock_wallet = mock.MagicMock()
+        mock_wallet.key = None
+
+        with self.assertRaises(MicroserviceException) as context:
+            errors.can_access_wallet({"key": "s3cr3t"}, "", mock_wallet)
+
+        self.assertEqual(permission_denied, context.exception.error)
+
+    @patch("resources.errors.Wallet")
+    def test__wallet_access__wallet_not_found(self, wallet_patch):
+        mock.wrapper.session.query.side_effect = None
+        query_row = mock.wrapper.session.query.return_value
+        query_row.filter_by().first.return_value = None
+
+        for _ in range(2):
+            with self.assertRaises(MicroserviceException) as context:
+                errors.wallet_access({"source_uuid": "source", "key": "s3cr3t"}, "")
+
+            self.assertEqual(unknown_source_or_destination, context.exception.error)
+        mock.wrapper.session.query.assert_called_once_with(
+            wallet_patch.key, wallet_patch.user_uuid, wallet_patch.amount
+        )
+        query_row.filter_by.assert_called_with(source_uuid="source")
+
+    @patch("resources.errors.Wallet.key")
+    def test__wallet_access__permission_denied(self, key_patch):
+        mock.wrapper.session.query.side_effect = None
+        mock.wrapper.session.query().filter_by().first.return_value = ("s3cr3t", "user", 42)
+
+        with self.assertRaises(MicroserviceException) as context:
+            errors.wallet_access({"source_uuid": "source", "key": "wrong"}, "")
+
+        self.assertEqual(permission_denied, context.exception.error)
+
+    @patch("resources.errors.Wallet.key")
+    def test__wallet_access__successful(self, key_patch):
+        mock.wrapper.session.query.side_effect = None
+        mock.wrapper.session.query().filter_by().first.return_value = ("s3cr3t", "user", 42)
+
+        self.assertEqual(
+            WalletAccess("source", "user", 42), errors.wallet_access({"source_uuid": "source", "key": "s3cr3t"}, "")
+        )
+
+    def test__check_errors__successful(self):
+        first = mock.MagicMock()
+        second = mock.MagicMock()
+        endpoint = mock.MagicMock()
+
+        checked = errors.check_errors(first, second)(endpoint)
+
+        self.assertEqual(endpoint.return_value, checked({"source_uuid": "source"}, "user"))
+        first.assert_called_with({"source_uuid": "source"}, "user")
+        second.assert_called_with({"source_uuid": "source"}, "user", first.return_value)
+        endpoint.assert_called_with({"source_uuid": "source"}, "user", second.return_value)
+        self.assertEqual((first, second), checked.__checks__)
+
+    def test__check_errors__error(self):
+        first = mock.MagicMock(side_effect=MicroserviceException(permission_denied))
+        second = mock.MagicMock()
+        endpoint = mock.MagicMock()
+
+        checked = errors.check_errors(first, second)(endpoint)
+
+        self.assertEqual(permission_denied, checked({"source_uuid": "source"}, "user"))
+        second.assert_not_called()
+        endpoint.assert_not_called()
+
+    def test__check_errors__without_checks(self):
+        endpoint = mock.MagicMock()
+
+        self.assertEqual(endpoint.return_value, errors.check_errors()(endpoint)({}, "user"))
+        endpoint.assert_called_with({}, "user")
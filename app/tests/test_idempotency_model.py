@@ -0,0 +1,69 @@
+import datetime
+import json
+from unittest import TestCase
+from unittest.mock import patch
+
+from mock.mock_loader import mock
+from models.idempotency import IdempotencyKey
+
+
+class TestIdempotencyModel(TestCase):
+    def setUp(self):
+        mock.reset_mocks()
+
+        self.query_key = mock.MagicMock()
+        mock.wrapper.session.query.side_effect = {IdempotencyKey: self.query_key}.__getitem__
+
+    def test__model__idempotency__structure(self):
+        self.assertEqual("currency_idempotency_key", IdempotencyKey.__tablename__)
+        self.assertTrue(issubclass(IdempotencyKey, mock.wrapper.Base))
+        for col in ["wallet_uuid", "endpoint", "key", "time_stamp", "result"]:
+            self.assertIn(col, dir(IdempotencyKey))
+
+    def test__model__idempotency__valid(self):
+        for key in [None, "a", "k" * 64]:
+            self.assertTrue(IdempotencyKey.valid(key))
+        for key in ["", "k" * 65, 42, ["key"]]:
+            self.assertFalse(IdempotencyKey.valid(key))
+
+    def test__model__idempotency__lookup__without_key(self):
+        self.assertIsNone(IdempotencyKey.lookup("wallet", "send", None))
+        mock.wrapper.session.query.assert_not_called()
+
+    def test__model__idempotency__lookup__unknown(self):
+        self.query_key.get.return_value = None
+
+        self.assertIsNone(IdempotencyKey.lookup("wallet", "send", "key"))
+        self.query_key.get.assert_called_with(("wallet", "send", "key"))
+
+    @patch("models.idempotency.IDEMPOTENCY_KEY_TTL", 60)
+    def test__model__idempotency__lookup__expired(self):
+        self.query_key.get.return_value = IdempotencyKey(
+            time_stamp=datetime.datetime.now() - datetime.timedelta(seconds=61), result="{}"
+        )
+
+        self.assertIsNone(IdempotencyKey.lookup("wallet", "send", "key"))
+
+    @patch("models.idempotency.IDEMPOTENCY_KEY_TTL", 60)
+    def test__model__idempotency__lookup__successful(self):
+        self.query_key.get.return_value = IdempotencyKey(
+            time_stamp=datetime.datetime.now() - datetime.timedelta(seconds=59), result=json.dumps({"ok": True})
+        )
+
+        self.assertEqual({"ok": True}, IdempotencyKey.lookup("wallet", "send", "key"))
+
+    def test__model__idempotency__record__without_key(self):
+        IdempotencyKey.record("wallet", "put", None, {"ok": True})
+
+        mock.wrapper.session.add.assert_not_called()
+
+    def test__model__idempotency__record__successful(self):
+        now = datetime.datetime.now()
+        IdempotencyKey.record("wallet", "put", "key", {"id": 42})
+
+        self.query_key.filter().delete.assert_called_once_with(synchronize_session=False)
+        entry = mock.wrapper.session.add.call_args[0][0]
+        self.assertEqual(("wallet", "put", "key"), (entry.wallet_uuid, entry.endpoint, entry.key))
+        self.assertEqual({"id": 42}, json.loads(entry.result))
+        self.assertLess(abs((entry.time_stamp - now).total_seconds()), 0.01)
+        mock.wrapper.session.commit.assert_not_called()
@@ -0,0 +1,84 @@
+import datetime
+from unittest import TestCase
+from unittest.mock import patch
+
+from mock.mock_loader import mock
+from models.ledger import LedgerEntry, BalanceSnapshot
+
+
+class TestLedgerModel(TestCase):
+    def setUp(self):
+        mock.reset_mocks()
+
+        self.query_snapshot = mock.MagicMock()
+        self.query_default = mock.MagicMock()
+        mock.wrapper.session.query.side_effect = lambda *a: {(BalanceSnapshot,): self.query_snapshot}.get(
+            a, self.query_default
+        )
+
+    def test__model__ledger__structure(self):
+        self.assertEqual("currency_ledger", LedgerEntry.__tablename__)
+        self.assertTrue(issubclass(LedgerEntry, mock.wrapper.Base))
+        for col in ["id", "time_stamp", "wallet_uuid", "delta", "origin"]:
+            self.assertIn(col, dir(LedgerEntry))
+
+        self.assertEqual("currency_balance_snapshot", BalanceSnapshot.__tablename__)
+        self.assertTrue(issubclass(BalanceSnapshot, mock.wrapper.Base))
+        for col in ["wallet_uuid", "time_stamp", "amount", "last_entry_id"]:
+            self.assertIn(col, dir(BalanceSnapshot))
+
+    @patch("models.ledger.LEDGER_ENABLED", False)
+    def test__model__ledger__record__disabled(self):
+        self.assertIsNone(LedgerEntry.record("wallet", 42, "put"))
+        mock.wrapper.session.add.assert_not_called()
+
+    @patch("models.ledger.LEDGER_ENABLED", True)
+    def test__model__ledger__record__no_change(self):
+        self.assertIsNone(LedgerEntry.record("wallet", 0, "miner"))
+        mock.wrapper.session.add.assert_not_called()
+
+    @patch("models.ledger.LEDGER_ENABLED", True)
+    def test__model__ledger__record__successful(self):
+        now = datetime.datetime.now()
+        actual_result = LedgerEntry.record("wallet", -42, "dump")
+
+        self.assertIsInstance(actual_result, LedgerEntry)
+        self.assertEqual("wallet", actual_result.wallet_uuid)
+        self.assertEqual(-42, actual_result.delta)
+        self.assertEqual("dump", actual_result.origin)
+        self.assertLess(abs((actual_result.time_stamp - now).total_seconds()), 0.01)
+        mock.wrapper.session.add.assert_called_with(actual_result)
+        mock.wrapper.session.commit.assert_not_called()
+
+    def test__model__ledger__balance__with_snapshot(self):
+        self.query_snapshot.get.return_value.amount = 1300
+        self.query_default.filter().scalar.return_value = 37
+
+        self.assertEqual(1337, LedgerEntry.balance("wallet"))
+        self.query_snapshot.get.assert_called_with("wallet")
+
+    def test__model__ledger__balance__without_snapshot(self):
+        self.query_snapshot.get.return_value = None
+        self.query_default.filter().scalar.return_value = 37
+
+        self.assertEqual(37, LedgerEntry.balance("wallet"))
+
+    @patch("models.ledger.BalanceSnapshot.seed")
+    def test__model__snapshot__compact__nothing_to_fold(self, seed_patch):
+        self.query_default.filter().scalar.return_value = None
+
+        self.assertEqual(0, BalanceSnapshot.compact(datetime.datetime.now()))
+        seed_patch.assert_called_with()
+        mock.wrapper.session.commit.assert_called_with()
+
+    @patch("models.ledger.BalanceSnapshot.seed")
+    def test__model__snapshot__compact__successful(self, seed_patch):
+        self.query_default.filter().scalar.return_value = 99
+        self.query_default.filter().group_by().all.return_value = [("a", 5), ("b", -3)]
+        self.query_default.filter().delete.return_value = 7
+
+        self.assertEqual(7, BalanceSnapshot.compact(datetime.datetime.now()))
+        seed_patch.assert_called_with()
+        self.assertEqual(2, self.query_snapshot.filter().update.call_count)
+        self.query_default.filter().delete.assert_called_with(synchronize_session=False)
+        mock.wrapper.session.commit.assert_called_with()
@@ -0,0 +1,126 @@
+import threading
+from unittest import TestCase
+from unittest.mock import patch
+
+from utils.locks import StripedLockManager
+
+
+class TestLocks(TestCase):
+    def setUp(self):
+        self.locks = StripedLockManager(16)
+
+    def run_thread(self, target, *args) -> threading.Thread:
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        return thread
+
+    def test__stripe(self):
+        self.assertEqual(self.locks.stripe("wallet"), self.locks.stripe("wallet"))
+        self.assertIn(self.locks.stripe("wallet"), range(16))
+
+    def test__hold__same_wallet_is_serialized(self):
+        entered = threading.Event()
+
+        def hold():
+            with self.locks.hold("a"):
+                entered.set()
+
+        with self.locks.hold("a", "b"):
+            thread = self.run_thread(hold)
+            self.assertFalse(entered.wait(0.1))
+
+        thread.join(1)
+        self.assertTrue(entered.is_set())
+
+    def test__hold__different_stripes_run_in_parallel(self):
+        other = next(str(i) for i in range(100) if self.locks.stripe(str(i)) != self.locks.stripe("a"))
+        entered = threading.Event()
+
+        def hold():
+            with self.locks.hold(other, None):
+                entered.set()
+
+        with self.locks.hold("a"):
+            self.run_thread(hold)
+            self.assertTrue(entered.wait(1))
+
+    def test__hold__shared_stripe_is_acquired_once(self):
+        same = next(str(i) for i in range(1000) if self.locks.stripe(str(i)) == self.locks.stripe("a"))
+
+        with self.locks.hold("a", same, "a"):
+            pass
+
+        self.assertEqual(1, self.locks.stats()["acquisitions"])
+
+    def test__hold__opposite_order_does_not_deadlock(self):
+        def transfer(source_uuid: str, destination_uuid: str):
+            for _ in range(200):
+                with self.locks.hold(source_uuid, destination_uuid):
+                    pass
+
+        threads = [self.run_thread(transfer, "a", "b"), self.run_thread(transfer, "b", "a")]
+        for thread in threads:
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+
+    @patch("utils.locks.time.perf_counter")
+    def test__hold__contention(self, perf_counter_patch):
+        perf_counter_patch.side_effect = [10, 12.5]
+        entered = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with self.locks.hold("hot"):
+                entered.set()
+                release.wait(1)
+
+        thread = self.run_thread(hold)
+        entered.wait(1)
+        threading.Timer(0.05, release.set).start()
+        with self.locks.hold("hot"):
+            pass
+        thread.join(1)
+
+        self.assertEqual({"acquisitions": 2, "contended": 1, "wait_seconds": 2.5}, self.locks.stats())
+        self.assertEqual([("hot", 2.5)], self.locks.hottest())
+
+    def test__try_hold(self):
+        other = next(str(i) for i in range(100) if self.locks.stripe(str(i)) != self.locks.stripe("a"))
+        entered = threading.Event()
+
+        def hold():
+            with self.locks.hold(other):
+                entered.set()
+
+        self.assertFalse(self.locks.try_hold(other))
+        with self.locks.hold("a"):
+            with self.locks.hold("a"):
+                self.assertTrue(self.locks.try_hold(other))
+            thread = self.run_thread(hold)
+            self.assertFalse(entered.wait(0.1))
+
+        thread.join(1)
+        self.assertTrue(entered.is_set())
+
+    def test__try_hold__busy(self):
+        other = next(str(i) for i in range(100) if self.locks.stripe(str(i)) != self.locks.stripe("a"))
+        held, release = threading.Event(), threading.Event()
+
+        def hold():
+            with self.locks.hold(other):
+                held.set()
+                release.wait(1)
+
+        thread = self.run_thread(hold)
+        held.wait(1)
+        with self.locks.hold("a"):
+            self.assertFalse(self.locks.try_hold(other))
+        release.set()
+        thread.join(1)
+
+    def test__hottest__bounded(self):
+        with patch("utils.locks.HOTTEST_WALLETS_TRACKED", 4):
+            for i in range(5):
+                self.locks._record([str(i)], i + 1)
+
+        self.assertEqual([("4", 5), ("3", 4)], self.locks.hottest())
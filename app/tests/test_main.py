@@ -1,10 +1,19 @@
 from importlib import machinery, util
 from unittest import TestCase
+from unittest.mock import patch
 
 from mock.mock_loader import mock
 from resources import wallet
-from resources.errors import wallet_exists, can_access_wallet
-from schemes import scheme_default, scheme_send, scheme_reset, scheme_transactions
+from resources.errors import wallet_exists, can_access_wallet, wallet_access
+from schemes import (
+    scheme_default,
+    scheme_send,
+    scheme_reset,
+    scheme_transactions,
+    scheme_transactions_before,
+    scheme_stats,
+)
+from utils.validation import validators
 
 
 def import_app(name: str = "app"):
@@ -32,9 +41,11 @@ class TestApp(TestCase):
         main = import_main()
         self.assertEqual(import_app(), main.app)
 
-    def test__run_as_main(self):
+    @patch("utils.session.configure_session")
+    def test__run_as_main(self, configure_session_patch):
         import_main("__main__")
 
+        configure_session_patch.assert_called_with()
         mock.wrapper.Base.metadata.create_all.assert_called_with(bind=mock.wrapper.engine)
         mock.m.run.assert_called_with()
 
@@ -44,7 +55,8 @@ class TestApp(TestCase):
         mock.wrapper.Base.metadata.create_all.assert_not_called()
         mock.m.run.assert_not_called()
 
-    def test__endpoints_available(self):
+    @patch("utils.session.configure_session")
+    def test__endpoints_available(self, configure_session_patch):
         main = import_main("__main__")
         elements = [getattr(main, element_name) for element_name in dir(main)]
 
@@ -54,7 +66,9 @@ class TestApp(TestCase):
         expected_user_endpoints = [
             (["create"], {}, wallet.create),
             (["get"], scheme_default, wallet.get, wallet_exists, can_access_wallet),
-            (["transactions"], scheme_transactions, wallet.transactions, wallet_exists, can_access_wallet),
+            (["transactions"], scheme_transactions, wallet.transactions, wallet_access),
+            (["transactions", "before"], scheme_transactions_before, wallet.transactions_before, wallet_access),
+            (["stats"], scheme_stats, wallet.stats, wallet_access),
             (["list"], {}, wallet.list_wallets),
             (["send"], scheme_send, wallet.send, wallet_exists, can_access_wallet),
             (["reset"], scheme_reset, wallet.reset, wallet_exists),
@@ -64,21 +78,28 @@ class TestApp(TestCase):
         expected_ms_endpoints = [
             (["exists"], wallet.exists),
             (["owner"], wallet.owner),
+            (["exists_many"], wallet.exists_many),
+            (["owner_many"], wallet.owner_many),
             (["put"], wallet.put),
+            (["put_batch"], wallet.put_batch),
             (["dump"], wallet.dump, wallet_exists, can_access_wallet),
+            (["miner", "rate"], wallet.miner_rate),
             (["delete_user"], wallet.delete_user),
+            (["metrics"], wallet.export_metrics),
         ]
 
         for path, requires, func, *errors in expected_user_endpoints:
-            self.assertIn((path, requires), registered_user_endpoints)
+            self.assertIn((path, None), registered_user_endpoints)
+            self.assertEqual(requires, validators[tuple(path)].fields)
             endpoint_handler = mock.user_endpoint_handlers[tuple(path)]
-            registered_user_endpoints.remove((path, requires))
+            registered_user_endpoints.remove((path, None))
             self.assertIn(endpoint_handler, elements)
             self.assertEqual(func, endpoint_handler)
+            self.assertNotIn("__errors__", dir(endpoint_handler))
             if errors:
-                self.assertEqual(tuple(errors), endpoint_handler.__errors__)
+                self.assertEqual(tuple(errors), endpoint_handler.__checks__)
             else:
-                self.assertNotIn("__errors__", dir(endpoint_handler))
+                self.assertNotIn("__checks__", dir(endpoint_handler))
 
         for path, func, *errors in expected_ms_endpoints:
             self.assertIn(path, registered_ms_endpoints)
@@ -86,10 +107,11 @@ class TestApp(TestCase):
             registered_ms_endpoints.remove(path)
             self.assertIn(endpoint_handler, elements)
             self.assertEqual(func, endpoint_handler)
+            self.assertNotIn("__errors__", dir(endpoint_handler))
             if errors:
-                self.assertEqual(tuple(errors), endpoint_handler.__errors__)
+                self.assertEqual(tuple(errors), endpoint_handler.__checks__)
             else:
-                self.assertNotIn("__errors__", dir(endpoint_handler))
+                self.assertNotIn("__checks__", dir(endpoint_handler))
 
         self.assertFalse(registered_user_endpoints)
         self.assertFalse(registered_ms_endpoints)
@@ -0,0 +1,98 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+
+from utils.metrics import Metrics, Histogram
+
+
+class TestMetrics(TestCase):
+    def setUp(self):
+        self.metrics = Metrics(1)
+
+    def test__histogram__observe(self):
+        histogram = Histogram((1, 5))
+        histogram.observe(0.5)
+        histogram.observe(3)
+        histogram.observe(10)
+
+        self.assertEqual([1, 2], histogram.counts)
+        self.assertEqual(13.5, histogram.sum)
+        self.assertEqual(3, histogram.count)
+
+    @patch("utils.metrics.time.perf_counter")
+    def test__instrument(self, perf_counter_patch):
+        perf_counter_patch.side_effect = [10, 11, 12, 14.5]
+
+        def endpoint(data: dict, user: str) -> dict:
+            self.assertEqual("endpoint", self.metrics.current.endpoint)
+            with self.metrics.external_call():
+                pass
+            return {"ok": data, "user": user}
+
+        instrumented = self.metrics.instrument(endpoint)
+
+        with self.assertLogs("utils.metrics", "WARNING") as logs:
+            self.assertEqual({"ok": {}, "user": "user"}, instrumented({}, "user"))
+
+        self.assertIsNone(self.metrics.current)
+        self.assertEqual(1, len(logs.records))
+        self.assertTrue(logs.records[0].getMessage().startswith("slow request endpoint: 4.500s total"))
+        exported = self.metrics.export({})
+        self.assertIn('currency_request_seconds_bucket{endpoint="endpoint",le="2.5"} 0', exported)
+        self.assertIn('currency_request_seconds_bucket{endpoint="endpoint",le="5"} 1', exported)
+        self.assertIn('currency_request_external_seconds_sum{endpoint="endpoint"} 1', exported)
+        self.assertIn('currency_request_statements_count{endpoint="endpoint"} 1', exported)
+        self.assertIn("currency_slow_requests 1", exported)
+
+    def test__instrument__nested(self):
+        def inner():
+            return self.metrics.current
+
+        def outer():
+            return self.metrics.current, self.metrics.instrument(inner)()
+
+        current, inner_current = self.metrics.instrument(outer)()
+
+        self.assertIs(current, inner_current)
+        exported = self.metrics.export({})
+        self.assertIn('currency_request_seconds_count{endpoint="outer"} 1', exported)
+        self.assertNotIn('endpoint="inner"', exported)
+
+    def test__instrument__exception(self):
+        def endpoint():
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            self.metrics.instrument(endpoint)()
+
+        self.assertIsNone(self.metrics.current)
+        self.assertIn('currency_request_seconds_count{endpoint="endpoint"} 1', self.metrics.export({}))
+
+    def test__statements(self):
+        engine = create_engine("sqlite://")
+
+        def endpoint():
+            engine.execute("SELECT 1")
+            engine.execute("SELECT 2")
+            return self.metrics.current
+
+        with patch("utils.metrics.metrics", self.metrics):
+            request = self.metrics.instrument(endpoint)()
+
+        self.assertEqual(["SELECT 1", "SELECT 2"], request.statements)
+        self.assertGreater(request.db_time, 0)
+
+    def test__export__gauges(self):
+        exported = self.metrics.export({"cache": {"size": 3, "hits": 7}})
+
+        self.assertIn("# TYPE currency_cache_hits gauge\ncurrency_cache_hits 7\n", exported)
+        self.assertIn("currency_cache_size 3\n", exported)
+
+    def test__export__labeled_gauges(self):
+        exported = self.metrics.export({"locks": {"wait": {"a": 1.5, "b": 0.5}}})
+
+        self.assertIn(
+            '# TYPE currency_locks_wait gauge\ncurrency_locks_wait{key="a"} 1.5\ncurrency_locks_wait{key="b"} 0.5\n',
+            exported,
+        )
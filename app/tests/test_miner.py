@@ -0,0 +1,303 @@
+import datetime
+import sys
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from mock.mock_loader import mock
+from models.wallet import Wallet
+from utils import miner
+from utils.locks import StripedLockManager
+from utils.miner import MinerCollector
+
+
+class TestMiner(TestCase):
+    def setUp(self):
+        mock.reset_mocks()
+
+        self.query_wallet = mock.MagicMock()
+        mock.wrapper.session.query.side_effect = {Wallet: self.query_wallet}.__getitem__
+        mock.m.contact_microservice.reset_mock(return_value=True, side_effect=True)
+
+        self.locks = StripedLockManager(1024)
+        self.collector = MinerCollector(5, 3, self.locks)
+
+    def make_wallet(self, source_uuid: str, amount: int = 0):
+        wallet = mock.MagicMock()
+        wallet.source_uuid = source_uuid
+        wallet.amount = amount
+        return wallet
+
+    @patch("utils.miner.time.monotonic")
+    def test__collect__single(self, monotonic_patch):
+        monotonic_patch.return_value = 100
+        mock.m.contact_microservice.return_value = {"coins": 31}
+        test_wallet = self.make_wallet("wallet", 11)
+
+        self.collector.collect(test_wallet)
+
+        self.assertEqual(42, test_wallet.amount)
+        mock.m.contact_microservice.assert_called_with("service", ["miner", "collect"], {"wallet_uuid": "wallet"})
+        self.assertEqual({"rpcs": 1, "rpcs_saved": 0, "pending": 0}, self.collector.stats())
+
+    @patch("utils.miner.time.monotonic")
+    def test__collect__inside_window(self, monotonic_patch):
+        monotonic_patch.return_value = 100
+        mock.m.contact_microservice.return_value = {"coins": 31}
+        test_wallet = self.make_wallet("wallet")
+
+        self.collector.collect(test_wallet)
+        monotonic_patch.return_value = 104
+        self.collector.collect(test_wallet)
+
+        self.assertEqual(31, test_wallet.amount)
+        self.assertEqual(1, mock.m.contact_microservice.call_count)
+        self.assertEqual({"rpcs": 1, "rpcs_saved": 1, "pending": 1}, self.collector.stats())
+
+    @patch("utils.miner.time.monotonic")
+    def test__collect__inside_window__without_batches(self, monotonic_patch):
+        collector = MinerCollector(5, 1, self.locks)
+        monotonic_patch.return_value = 100
+        mock.m.contact_microservice.return_value = {"coins": 31}
+
+        collector.collect(self.make_wallet("a"))
+        monotonic_patch.return_value = 104
+        collector.collect(self.make_wallet("a"))
+        monotonic_patch.return_value = 106
+        collector.collect(self.make_wallet("b"))
+
+        self.assertEqual(2, mock.m.contact_microservice.call_count)
+        mock.m.contact_microservice.assert_called_with("service", ["miner", "collect"], {"wallet_uuid": "b"})
+        self.assertEqual({"rpcs": 2, "rpcs_saved": 1, "pending": 0}, collector.stats())
+
+    @patch("utils.miner.time.monotonic")
+    def test__collect__after_window(self, monotonic_patch):
+        monotonic_patch.return_value = 100
+        mock.m.contact_microservice.return_value = {"coins": 31}
+        test_wallet = self.make_wallet("wallet")
+
+        self.collector.collect(test_wallet)
+        monotonic_patch.return_value = 105
+        self.collector.collect(test_wallet)
+
+        self.assertEqual(62, test_wallet.amount)
+        self.assertEqual(2, mock.m.contact_microservice.call_count)
+
+    @patch("utils.miner.time.monotonic")
+    def test__collect__pending_batched(self, monotonic_patch):
+        monotonic_patch.return_value = 100
+        mock.m.contact_microservice.return_value = {"coins": 0}
+        for source_uuid in ["a", "b", "c"]:
+            self.collector.collect(self.make_wallet(source_uuid))
+
+        monotonic_patch.return_value = 101
+        for source_uuid in ["a", "b", "c"]:
+            self.collector.collect(self.make_wallet(source_uuid))
+
+        monotonic_patch.return_value = 110
+        mock.m.contact_microservice.return_value = {"coins": {"d": 1, "a": 2, "b": 0}}
+        test_wallet = self.make_wallet("d")
+        with self.locks.hold("d"):
+            self.collector.collect(test_wallet)
+
+        self.assertEqual(1, test_wallet.amount)
+        mock.m.contact_microservice.assert_called_with(
+            "service", ["miner", "collect_many"], {"wallet_uuids": ["d", "a", "b"]}
+        )
+        self.query_wallet.filter_by.assert_called_once_with(source_uuid="a")
+        self.query_wallet.filter_by().update.assert_called_once()
+        self.assertEqual({"rpcs": 4, "rpcs_saved": 3, "pending": 1}, self.collector.stats())
+
+    @patch("utils.miner.time.monotonic")
+    def test__collect__pending_wallet_busy(self, monotonic_patch):
+        busy = next(str(i) for i in range(100) if self.locks.stripe(str(i)) != self.locks.stripe("d"))
+        monotonic_patch.return_value = 100
+        mock.m.contact_microservice.return_value = {"coins": 0}
+        self.collector.collect(self.make_wallet(busy))
+        monotonic_patch.return_value = 101
+        self.collector.collect(self.make_wallet(busy))
+
+        held, release = threading.Event(), threading.Event()
+
+        def hold():
+            with self.locks.hold(busy):
+                held.set()
+                release.wait(1)
+
+        thread = threading.Thread(target=hold, daemon=True)
+        thread.start()
+        held.wait(1)
+
+        monotonic_patch.return_value = 110
+        mock.m.contact_microservice.return_value = {"coins": 1}
+        with self.locks.hold("d"):
+            self.collector.collect(self.make_wallet("d"))
+        release.set()
+        thread.join(1)
+
+        mock.m.contact_microservice.assert_called_with("service", ["miner", "collect"], {"wallet_uuid": "d"})
+        self.query_wallet.filter_by.assert_not_called()
+        self.assertEqual(1, self.collector.stats()["pending"])
+
+    @patch("utils.miner.time.monotonic")
+    def test__collect__pending_wallet_held_until_request_ends(self, monotonic_patch):
+        monotonic_patch.return_value = 100
+        mock.m.contact_microservice.return_value = {"coins": 0}
+        self.collector.collect(self.make_wallet("a"))
+        monotonic_patch.return_value = 101
+        self.collector.collect(self.make_wallet("a"))
+
+        monotonic_patch.return_value = 110
+        mock.m.contact_microservice.return_value = {"coins": {"d": 0, "a": 2}}
+        entered = threading.Event()
+
+        def hold():
+            with self.locks.hold("a"):
+                entered.set()
+
+        with self.locks.hold("d"):
+            self.collector.collect(self.make_wallet("d"))
+            thread = threading.Thread(target=hold, daemon=True)
+            thread.start()
+            self.assertFalse(entered.wait(0.1))
+
+        thread.join(1)
+        self.assertTrue(entered.is_set())
+
+    @patch("utils.miner.time.monotonic")
+    def test__collect__pending_outside_of_request(self, monotonic_patch):
+        monotonic_patch.return_value = 100
+        mock.m.contact_microservice.return_value = {"coins": 0}
+        self.collector.collect(self.make_wallet("a"))
+        monotonic_patch.return_value = 101
+        self.collector.collect(self.make_wallet("a"))
+
+        monotonic_patch.return_value = 110
+        self.collector.collect(self.make_wallet("d"))
+
+        mock.m.contact_microservice.assert_called_with("service", ["miner", "collect"], {"wallet_uuid": "d"})
+        self.assertEqual(1, self.collector.stats()["pending"])
+
+    @patch("utils.miner.time.monotonic")
+    def test__fetch__without_batch(self, monotonic_patch):
+        monotonic_patch.return_value = 100
+        mock.m.contact_microservice.return_value = {"coins": 0}
+        self.collector.collect(self.make_wallet("a"))
+        monotonic_patch.return_value = 101
+        self.collector.collect(self.make_wallet("a"))
+
+        monotonic_patch.return_value = 110
+        mock.m.contact_microservice.return_value = {"coins": 7}
+        with self.locks.hold("d"):
+            self.assertEqual(7, self.collector.fetch("d", batch=False))
+
+        mock.m.contact_microservice.assert_called_with("service", ["miner", "collect"], {"wallet_uuid": "d"})
+        self.query_wallet.filter_by.assert_not_called()
+        self.assertEqual(1, self.collector.stats()["pending"])
+
+    @patch("utils.miner.time.monotonic")
+    def test__forget(self, monotonic_patch):
+        monotonic_patch.return_value = 100
+        mock.m.contact_microservice.return_value = {"coins": 0}
+        test_wallet = self.make_wallet("wallet")
+
+        self.collector.collect(test_wallet)
+        self.collector.forget("wallet")
+        self.collector.collect(test_wallet)
+
+        self.assertEqual(2, mock.m.contact_microservice.call_count)
+
+    @patch("utils.miner.LedgerEntry")
+    def test__collect__concurrent(self, ledger_patch):
+        collector = MinerCollector(0.001, 4, self.locks)
+        errors = []
+
+        def request(batch):
+            time.sleep(0.0002)
+            return {source_uuid: 1 for source_uuid in batch}
+
+        # switch threads as often as possible to interleave the bookkeeping of the collector
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+
+        def run(thread: int):
+            try:
+                for i in range(200):
+                    with self.locks.hold(str((thread + i) % 8)):
+                        collector.collect(self.make_wallet(str((thread + i) % 8)))
+                    if i % 50 == 0:
+                        collector.forget(str((thread * i) % 8))
+            except Exception as error:
+                errors.append(error)
+
+        with patch.object(collector, "_request", side_effect=request):
+            threads = [threading.Thread(target=run, args=(thread,)) for thread in range(16)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(10)
+
+        self.assertEqual([], errors)
+        stats = collector.stats()
+        self.assertEqual(16 * 200, stats["rpcs"] + stats["rpcs_saved"])
+
+    def test__collector(self):
+        self.assertIsInstance(miner.collector, MinerCollector)
+        # miner/collect_many is only used when the service microservice provides it
+        self.assertEqual(1, miner.collector.batch_size)
+
+    @patch("utils.miner.LedgerEntry")
+    def test__collect__lazy(self, ledger_patch):
+        collector = MinerCollector(5, 3, self.locks, lazy=True)
+        test_wallet = Wallet(
+            source_uuid="wallet",
+            amount=10,
+            mining_rate=2.0,
+            mining_settled=datetime.datetime.now() - datetime.timedelta(seconds=16.25),
+        )
+        settled = test_wallet.mining_settled
+
+        collector.collect(test_wallet)
+
+        self.assertEqual(42, test_wallet.amount)
+        self.assertEqual(settled + datetime.timedelta(seconds=16), test_wallet.mining_settled)
+        ledger_patch.record.assert_called_with("wallet", 32, "miner")
+        mock.m.contact_microservice.assert_not_called()
+        self.assertEqual({"rpcs": 0, "rpcs_saved": 1, "pending": 0}, collector.stats())
+
+    @patch("utils.miner.LedgerEntry")
+    def test__settle__nothing_mined(self, ledger_patch):
+        settled = datetime.datetime.now()
+        test_wallet = Wallet(source_uuid="wallet", amount=10, mining_rate=0, mining_settled=settled)
+
+        MinerCollector.settle(test_wallet, settled + datetime.timedelta(hours=1))
+
+        self.assertEqual(10, test_wallet.amount)
+        self.assertEqual(settled, test_wallet.mining_settled)
+        ledger_patch.record.assert_not_called()
+
+    def test__balance(self):
+        test_wallet = Wallet(
+            amount=10, mining_rate=1.0, mining_settled=datetime.datetime.now() - datetime.timedelta(seconds=32.5)
+        )
+
+        self.assertEqual(42, self.collector.balance(test_wallet))
+        self.assertEqual(10, test_wallet.amount)
+
+    @patch("utils.miner.datetime")
+    @patch("utils.miner.LedgerEntry")
+    def test__set_rate(self, ledger_patch, datetime_patch):
+        settled = datetime.datetime(2020, 1, 1, 12)
+        now = settled + datetime.timedelta(seconds=10)
+        datetime_patch.datetime.now.return_value = now
+        datetime_patch.timedelta = datetime.timedelta
+        test_wallet = Wallet(source_uuid="wallet", amount=0, mining_rate=0.5, mining_settled=settled)
+
+        self.collector.set_rate(test_wallet, 2.0)
+
+        self.assertEqual(5, test_wallet.amount)
+        self.assertEqual(2.0, test_wallet.mining_rate)
+        self.assertEqual(now, test_wallet.mining_settled)
+        ledger_patch.record.assert_called_with("wallet", 5, "miner")
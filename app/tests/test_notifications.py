@@ -0,0 +1,79 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from mock.mock_loader import mock
+from utils.notifications import NotificationDispatcher
+
+
+def make_notification(wallet_uuid: str, new_amount: int, notify_id: str = "incoming-transaction") -> dict:
+    return {"notify-id": notify_id, "origin": "put", "wallet_uuid": wallet_uuid, "new_amount": new_amount}
+
+
+class TestNotifications(TestCase):
+    def setUp(self):
+        mock.reset_mocks()
+        mock.m.contact_user.reset_mock(return_value=True, side_effect=True)
+
+        thread_patcher = patch("utils.notifications.threading.Thread")
+        self.thread_patch = thread_patcher.start()
+        self.addCleanup(thread_patcher.stop)
+
+        self.dispatcher = NotificationDispatcher(1, 2)
+
+    def test__notify__starts_worker_once(self):
+        self.dispatcher.notify("user", make_notification("a", 1))
+        self.dispatcher.notify("user", make_notification("b", 1))
+
+        self.thread_patch.assert_called_once()
+        self.thread_patch().start.assert_called_once_with()
+        mock.m.contact_user.assert_not_called()
+
+    @patch("utils.notifications.time.monotonic")
+    def test__flush__due(self, monotonic_patch):
+        monotonic_patch.return_value = 100
+        self.dispatcher.notify("user", make_notification("a", 1))
+        monotonic_patch.return_value = 100.5
+        self.dispatcher.notify("user", make_notification("b", 2))
+
+        self.assertEqual(0, self.dispatcher.flush(100.9))
+        self.assertEqual(1, self.dispatcher.flush(101))
+        mock.m.contact_user.assert_called_once_with("user", make_notification("a", 1))
+        self.assertEqual({"depth": 1, "sent": 1, "coalesced": 0, "dropped": 0}, self.dispatcher.stats())
+
+    def test__notify__coalesces_wallet(self):
+        self.dispatcher.notify("user", make_notification("a", 1))
+        self.dispatcher.notify("user", make_notification("a", 2))
+        self.dispatcher.notify("user", make_notification("a", 3))
+
+        self.assertEqual(1, self.dispatcher.flush())
+        mock.m.contact_user.assert_called_once_with("user", make_notification("a", 3))
+        self.assertEqual(2, self.dispatcher.stats()["coalesced"])
+
+    def test__notify__coalesces_incoming_and_outgoing(self):
+        self.dispatcher.notify("user", make_notification("a", 50, "outgoing-transaction"))
+        self.dispatcher.notify("user", make_notification("a", 100))
+        self.dispatcher.notify("user", make_notification("a", 80, "outgoing-transaction"))
+
+        self.assertEqual(1, self.dispatcher.flush())
+        mock.m.contact_user.assert_called_once_with("user", make_notification("a", 80, "outgoing-transaction"))
+        self.assertEqual(2, self.dispatcher.stats()["coalesced"])
+
+    def test__notify__drops_when_full(self):
+        self.dispatcher.notify("user", make_notification("a", 1))
+        self.dispatcher.notify("user", make_notification("b", 1))
+        self.dispatcher.notify("user", make_notification("c", 1))
+        self.dispatcher.notify("user", make_notification("a", 2))
+
+        self.assertEqual({"depth": 2, "sent": 0, "coalesced": 1, "dropped": 1}, self.dispatcher.stats())
+
+    def test__flush__error(self):
+        mock.m.contact_user.side_effect = [Exception, None]
+        self.dispatcher.notify("user", make_notification("a", 1))
+        self.dispatcher.notify("user", make_notification("b", 1))
+
+        with self.assertLogs("utils.notifications", "ERROR") as logs:
+            self.assertEqual(2, self.dispatcher.flush())
+
+        mock.m.contact_user.assert_called_with("user", make_notification("b", 1))
+        self.assertEqual(1, len(logs.records))
+        self.assertEqual("could not notify user user", logs.records[0].getMessage())
@@ -0,0 +1,88 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from schemes import rate_limited
+from utils.ratelimit import RateLimiter, rows_cost
+
+
+class TestRateLimiter(TestCase):
+    def setUp(self):
+        self.limiter = RateLimiter(True, 1, 3, 100)
+        self.now = 1000.0
+        time_patch = patch("utils.ratelimit.time.monotonic", side_effect=lambda: self.now)
+        time_patch.start()
+        self.addCleanup(time_patch.stop)
+
+    def test__acquire__burst(self):
+        self.assertTrue(self.limiter.acquire(["a"], 2))
+        self.assertTrue(self.limiter.acquire(["a"], 1))
+        self.assertFalse(self.limiter.acquire(["a"], 1))
+        self.assertTrue(self.limiter.acquire(["b"], 1))
+
+    def test__acquire__refill(self):
+        self.assertTrue(self.limiter.acquire(["a"], 3))
+        self.now += 1.5
+        self.assertTrue(self.limiter.acquire(["a"], 1.5))
+        self.assertFalse(self.limiter.acquire(["a"], 0.5))
+        self.now += 100
+        self.assertTrue(self.limiter.acquire(["a"], 3))
+        self.assertFalse(self.limiter.acquire(["a"], 1))
+
+    def test__acquire__all_or_nothing(self):
+        self.assertTrue(self.limiter.acquire(["wallet"], 3))
+        self.assertFalse(self.limiter.acquire(["user", "wallet"], 1))
+        self.assertTrue(self.limiter.acquire(["user"], 3))
+
+    def test__acquire__cost_capped_at_burst(self):
+        self.assertTrue(self.limiter.acquire(["a"], 50))
+        self.assertFalse(self.limiter.acquire(["a"], 50))
+
+    def test__acquire__evicts_least_recently_used(self):
+        limiter = RateLimiter(True, 1, 1, 2)
+        self.assertTrue(limiter.acquire(["a"], 1))
+        self.assertTrue(limiter.acquire(["b"], 1))
+        self.assertTrue(limiter.acquire(["c"], 1))
+
+        self.assertEqual(2, limiter.stats()["buckets"])
+        self.assertTrue(limiter.acquire(["a"], 1))
+        self.assertFalse(limiter.acquire(["c"], 1))
+
+    def test__endpoint(self):
+        calls = []
+
+        @self.limiter.endpoint(cost=lambda data: data["count"])
+        def transactions(data: dict, user: str, wallet: str) -> dict:
+            calls.append(wallet)
+            return {"ok": True}
+
+        self.assertEqual({"ok": True}, transactions({"source_uuid": "w", "count": 2}, "user", "wallet"))
+        self.assertEqual(rate_limited, transactions({"source_uuid": "other", "count": 2}, "user", "wallet"))
+        self.assertEqual(rate_limited, transactions({"source_uuid": "w", "count": 2}, "other", "wallet"))
+        self.assertEqual({"ok": True}, transactions({"source_uuid": "x", "count": 1}, "user", "wallet"))
+
+        self.assertEqual(["wallet", "wallet"], calls)
+        self.assertEqual({"buckets": 3, "admitted": 2, "rejected": {"transactions": 2}}, self.limiter.stats())
+
+    def test__endpoint__without_wallet(self):
+        @self.limiter.endpoint()
+        def create(data: dict, user: str) -> dict:
+            return {"ok": True}
+
+        for _ in range(3):
+            self.assertEqual({"ok": True}, create({}, "user"))
+        self.assertEqual(rate_limited, create({}, "user"))
+
+    def test__endpoint__disabled(self):
+        limiter = RateLimiter(False, 1, 1, 100)
+
+        @limiter.endpoint(cost=2)
+        def send(data: dict, user: str) -> dict:
+            return {"ok": True}
+
+        for _ in range(3):
+            self.assertEqual({"ok": True}, send({"source_uuid": "w"}, "user"))
+        self.assertEqual({"buckets": 0, "admitted": 0, "rejected": {}}, limiter.stats())
+
+    def test__rows_cost(self):
+        self.assertEqual(1.2, rows_cost(20))
+        self.assertEqual(11, rows_cost(1000))
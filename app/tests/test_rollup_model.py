@@ -0,0 +1,108 @@
+import datetime
+from unittest import TestCase
+from unittest.mock import patch
+
+from sqlalchemy.exc import IntegrityError
+
+from mock.mock_loader import mock
+from models.rollup import TransactionRollup
+
+
+class TestRollupModel(TestCase):
+    def setUp(self):
+        mock.reset_mocks()
+
+        self.query_rollup = mock.MagicMock()
+        mock.wrapper.session.query.side_effect = {TransactionRollup: self.query_rollup}.__getitem__
+
+    def test__model__rollup__structure(self):
+        self.assertEqual("currency_transaction_rollup", TransactionRollup.__tablename__)
+        self.assertTrue(issubclass(TransactionRollup, mock.wrapper.Base))
+        for col in ["wallet_uuid", "hour", "origin", "incoming", "outgoing"]:
+            self.assertIn(col, dir(TransactionRollup))
+
+    @patch("models.rollup.STATS_ROLLUP_ENABLED", False)
+    def test__model__rollup__record__disabled(self):
+        TransactionRollup.record(
+            [
+                {
+                    "time_stamp": datetime.datetime.now(),
+                    "source_uuid": "a",
+                    "send_amount": 1,
+                    "destination_uuid": "b",
+                    "origin": 0,
+                }
+            ]
+        )
+
+        mock.wrapper.session.query.assert_not_called()
+        mock.wrapper.session.add.assert_not_called()
+
+    @patch("models.rollup.STATS_ROLLUP_ENABLED", True)
+    def test__model__rollup__record__successful(self):
+        time_stamp = datetime.datetime(2020, 1, 1, 13, 37, 42)
+        hour = datetime.datetime(2020, 1, 1, 13)
+        self.query_rollup.filter_by().update.side_effect = [1, 0, 1]
+        self.query_rollup.filter_by.reset_mock()
+
+        TransactionRollup.record(
+            [
+                {"time_stamp": time_stamp, "source_uuid": "a", "send_amount": 1, "destination_uuid": "b", "origin": 0},
+                {"time_stamp": time_stamp, "source_uuid": None, "send_amount": 2, "destination_uuid": "b", "origin": 0},
+                {"time_stamp": time_stamp, "source_uuid": "c", "send_amount": 3, "destination_uuid": "c", "origin": 1},
+            ]
+        )
+
+        self.assertEqual(
+            [
+                {"wallet_uuid": "a", "hour": hour, "origin": 0},
+                {"wallet_uuid": "b", "hour": hour, "origin": 0},
+                {"wallet_uuid": "c", "hour": hour, "origin": 1},
+            ],
+            [c[1] for c in self.query_rollup.filter_by.call_args_list],
+        )
+        rollup = mock.wrapper.session.add.call_args[0][0]
+        self.assertEqual(
+            ("b", hour, 0, 3, 0), (rollup.wallet_uuid, rollup.hour, rollup.origin, rollup.incoming, rollup.outgoing)
+        )
+        mock.wrapper.session.add.assert_called_once()
+        mock.wrapper.session.commit.assert_not_called()
+
+    @patch("models.rollup.wrapper.engine.dialect.name", "mysql")
+    @patch("models.rollup.mysql_insert")
+    def test__model__rollup__add__mysql(self, insert_patch):
+        hour = datetime.datetime(2020, 1, 1, 13)
+        table = mock.MagicMock()
+
+        with patch.object(TransactionRollup, "__table__", table, create=True):
+            TransactionRollup.add("a", hour, 0, 3, 4)
+
+        insert_patch.assert_called_with(table)
+        insert_patch().values.assert_called_with(wallet_uuid="a", hour=hour, origin=0, incoming=3, outgoing=4)
+        statement = insert_patch().values()
+        statement.on_duplicate_key_update.assert_called_with(
+            incoming=table.c.incoming + statement.inserted.incoming,
+            outgoing=table.c.outgoing + statement.inserted.outgoing,
+        )
+        mock.wrapper.session.execute.assert_called_with(statement.on_duplicate_key_update())
+        self.query_rollup.filter_by.assert_not_called()
+        mock.wrapper.session.add.assert_not_called()
+
+    @patch("models.rollup.wrapper.engine.dialect.name", "sqlite")
+    def test__model__rollup__add__concurrent_first_insert(self):
+        hour = datetime.datetime(2020, 1, 1, 13)
+        self.query_rollup.filter_by().update.side_effect = [0, 1]
+        self.query_rollup.filter_by.reset_mock()
+
+        with patch.object(
+            mock.wrapper.session, "flush", side_effect=IntegrityError("INSERT", {}, Exception("duplicate key"))
+        ):
+            TransactionRollup.add("a", hour, 0, 3, 4)
+
+        mock.wrapper.session.begin_nested.assert_called_once_with()
+        mock.wrapper.session.add.assert_called_once()
+        self.assertEqual(
+            [{"wallet_uuid": "a", "hour": hour, "origin": 0}] * 2,
+            [c[1] for c in self.query_rollup.filter_by.call_args_list],
+        )
+        self.assertEqual(2, self.query_rollup.filter_by().update.call_count)
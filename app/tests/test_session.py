@@ -0,0 +1,76 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from mock.mock_loader import mock
+from utils import session
+
+
+class TestSession(TestCase):
+    def setUp(self):
+        mock.reset_mocks()
+
+    def test__session_scope__commit(self):
+        endpoint = session.session_scope(lambda data, user: {"data": data, "user": user})
+
+        self.assertEqual({"data": {}, "user": "user"}, endpoint({}, "user"))
+        mock.wrapper.session.commit.assert_called_with()
+        mock.wrapper.session.rollback.assert_not_called()
+        mock.wrapper.Session.remove.assert_called_with()
+
+    def test__session_scope__rollback(self):
+        def endpoint(data: dict, user: str):
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            session.session_scope(endpoint)({}, "user")
+
+        mock.wrapper.session.commit.assert_not_called()
+        mock.wrapper.session.rollback.assert_called_with()
+        mock.wrapper.Session.remove.assert_called_with()
+
+    def test__session_scope__failed_commit(self):
+        mock.wrapper.session.commit.side_effect = ValueError
+        try:
+            with self.assertRaises(ValueError):
+                session.session_scope(lambda: None)()
+        finally:
+            mock.wrapper.session.commit.side_effect = None
+
+        mock.wrapper.session.rollback.assert_called_with()
+        mock.wrapper.Session.remove.assert_called_with()
+
+    @patch("utils.session.create_engine")
+    def test__configure_session(self, create_engine_patch):
+        engine = mock.wrapper.engine
+        engine.dialect.name = "mysql"
+
+        try:
+            session.configure_session()
+
+            mock.wrapper.Session.remove.assert_called_with()
+            engine.dispose.assert_called_with()
+            create_engine_patch.assert_called_with(
+                engine.url,
+                pool_pre_ping=session.DATABASE_POOL_PRE_PING,
+                pool_recycle=session.DATABASE_POOL_RECYCLE,
+                pool_size=session.DATABASE_POOL_SIZE,
+                max_overflow=session.DATABASE_MAX_OVERFLOW,
+            )
+            self.assertEqual(create_engine_patch(), mock.wrapper.engine)
+            mock.wrapper.Session.configure.assert_called_with(bind=create_engine_patch())
+        finally:
+            mock.wrapper.engine = engine
+
+    @patch("utils.session.create_engine")
+    def test__configure_session__sqlite(self, create_engine_patch):
+        engine = mock.wrapper.engine
+        engine.dialect.name = "sqlite"
+
+        try:
+            session.configure_session()
+
+            create_engine_patch.assert_called_with(
+                engine.url, pool_pre_ping=session.DATABASE_POOL_PRE_PING, pool_recycle=session.DATABASE_POOL_RECYCLE
+            )
+        finally:
+            mock.wrapper.engine = engine
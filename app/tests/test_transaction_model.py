@@ -1,10 +1,17 @@
 import datetime
+from collections import Counter
 from unittest import TestCase
 
-from unittest.mock import patch
+from unittest.mock import patch, call
 
 from mock.mock_loader import mock
-from models.transaction import Transaction
+from models.rollup import TransactionRollup
+from models.transaction import Transaction, TransactionArchive, PAGE_FETCH_SIZE
+from models.wallet import Wallet
+
+
+def make_row(i: int) -> tuple:
+    return i, datetime.datetime.fromtimestamp(i), "source", i, "destination", "usage", 0
 
 
 class TestTransactionModel(TestCase):
@@ -16,6 +23,10 @@ class TestTransactionModel(TestCase):
         self.assertTrue(issubclass(Transaction, mock.wrapper.Base))
         for col in ["id", "time_stamp", "source_uuid", "send_amount", "destination_uuid", "usage", "origin"]:
             self.assertIn(col, dir(Transaction))
+        self.assertEqual(
+            ["currency_transaction_source_time", "currency_transaction_destination_time"],
+            [index.name for index in Transaction.__table_args__],
+        )
 
     def test__model__transaction__serialize(self):
         time_stamp = datetime.datetime.fromtimestamp(421337)
@@ -45,7 +56,27 @@ class TestTransactionModel(TestCase):
         serialized["send_amount"] = 1234
         self.assertEqual(expected_result, transaction.serialize)
 
-    def test__model__transaction__create(self):
+    def test__model__transaction__serialize_row(self):
+        time_stamp = datetime.datetime.fromtimestamp(421337)
+
+        expected_result = {
+            "id": 42,
+            "time_stamp": str(time_stamp),
+            "source_uuid": "from",
+            "send_amount": 7,
+            "destination_uuid": "to",
+            "usage": "text",
+            "origin": 3,
+        }
+        actual_result = Transaction.serialize_row((42, time_stamp, "from", 7, "to", "text", 3))
+
+        self.assertEqual(expected_result, actual_result)
+
+    @patch("models.transaction.Wallet.source_uuid")
+    def test__model__transaction__create(self, source_uuid_patch):
+        query_wallet = mock.MagicMock()
+        mock.wrapper.session.query.side_effect = {Wallet: query_wallet}.__getitem__
+
         now = datetime.datetime.now()
         actual_result = Transaction.create("source", 37, "dest", "the usage", 1)
 
@@ -57,8 +88,27 @@ class TestTransactionModel(TestCase):
         self.assertEqual(1, actual_result.origin)
         self.assertLess(abs((actual_result.time_stamp - now).total_seconds()), 0.01)
         mock.wrapper.session.add.assert_called_with(actual_result)
+        source_uuid_patch.in_.assert_called_with(["dest", "source"])
+        query_wallet.filter.assert_called_with(source_uuid_patch.in_())
+        query_wallet.filter().update.assert_called_once()
         mock.wrapper.session.commit.assert_called_with()
 
+    @patch("models.transaction.Wallet.source_uuid")
+    def test__model__transaction__create__same_wallet(self, source_uuid_patch):
+        mock.wrapper.session.query.side_effect = None
+
+        Transaction.create("source", 37, "source", "the usage", 1)
+
+        source_uuid_patch.in_.assert_called_with(["source"])
+
+    def test__model__transaction__create__without_commit(self):
+        mock.wrapper.session.query.side_effect = None
+
+        actual_result = Transaction.create("source", 37, "dest", "the usage", 1, commit=False)
+
+        mock.wrapper.session.add.assert_called_with(actual_result)
+        mock.wrapper.session.commit.assert_not_called()
+
     @patch("models.transaction.Transaction.destination_uuid")
     @patch("models.transaction.Transaction.source_uuid")
     @patch("models.transaction.or_")
@@ -81,28 +131,288 @@ class TestTransactionModel(TestCase):
     def test__model__transaction__count_transactions(self, query_patch):
         source = mock.MagicMock()
 
-        expected_result = query_patch().count()
-        actual_result = Transaction.count_transactions(source)
+        query_patch().count.side_effect = [3, 4]
+
+        self.assertEqual(7, Transaction.count_transactions(source))
+        query_patch.assert_any_call(source)
+        query_patch.assert_called_with(source, TransactionArchive)
+
+    @patch("models.transaction.Transaction.count_for_wallets")
+    def test__model__transaction__create_many(self, count_for_wallets_patch):
+        now = datetime.datetime.now()
+        transactions = [
+            {"source_uuid": "a", "send_amount": 1, "destination_uuid": "b", "usage": "", "origin": 0},
+            {"source_uuid": None, "send_amount": 2, "destination_uuid": "b", "usage": "", "origin": 1},
+            {"source_uuid": "c", "send_amount": 3, "destination_uuid": "c", "usage": "", "origin": 0},
+        ]
+
+        Transaction.create_many(transactions)
+
+        model, mappings = mock.wrapper.session.bulk_insert_mappings.call_args[0]
+        self.assertEqual(Transaction, model)
+        self.assertEqual(transactions, [{k: v for k, v in m.items() if k != "time_stamp"} for m in mappings])
+        self.assertLess(abs((mappings[0]["time_stamp"] - now).total_seconds()), 0.01)
+        count_for_wallets_patch.assert_called_with(Counter({"a": 1, "b": 2, "c": 1}))
+        mock.wrapper.session.commit.assert_not_called()
+
+    @patch("models.transaction.Wallet.source_uuid")
+    def test__model__transaction__count_for_wallets(self, source_uuid_patch):
+        query_wallet = mock.MagicMock()
+        mock.wrapper.session.query.side_effect = {Wallet: query_wallet}.__getitem__
+
+        Transaction.count_for_wallets(Counter({"c": 1, "b": 2, "a": 1}))
+
+        self.assertEqual([call(["a", "c"]), call(["b"])], source_uuid_patch.in_.call_args_list)
+        self.assertEqual(2, query_wallet.filter().update.call_count)
+
+    def test__model__transaction__reconcile_transaction_counts(self):
+        query_wallet = mock.MagicMock()
+        mock.wrapper.session.query.side_effect = {Wallet: query_wallet}.__getitem__
+        query_wallet.update.return_value = 42
+
+        self.assertEqual(42, Transaction.reconcile_transaction_counts())
+        query_wallet.update.assert_called_once()
+        mock.wrapper.session.commit.assert_called_with()
+
+    @patch("models.transaction.STATS_ROLLUP_ENABLED", False)
+    def test__model__transaction__stats(self):
+        query = mock.MagicMock()
+        mock.wrapper.session.query.side_effect = lambda *columns: query
+        query.filter().group_by.side_effect = [
+            [("2020-01-01 00:00:00", 0, 5), ("2020-01-02 00:00:00", 1, 1)],
+            [("2020-01-01 00:00:00", 0, 2)],
+            [],
+            [("2019-12-31 00:00:00", 0, 7)],
+        ]
+        query.filter.reset_mock()
+
+        actual_result = Transaction.stats(
+            "wallet", datetime.datetime(2019, 12, 31, 12, 30), datetime.datetime(2020, 1, 3, 0, 0, 1), "day"
+        )
+
+        self.assertEqual(
+            [
+                {"time": "2019-12-31 00:00:00", "origin": 0, "incoming": 0, "outgoing": 7},
+                {"time": "2020-01-01 00:00:00", "origin": 0, "incoming": 5, "outgoing": 2},
+                {"time": "2020-01-02 00:00:00", "origin": 1, "incoming": 1, "outgoing": 0},
+            ],
+            actual_result,
+        )
+        self.assertEqual(4, query.filter.call_count)
+        for (column, since, until), _ in query.filter.call_args_list:
+            self.assertEqual(datetime.datetime(2019, 12, 31, 12), since.right.value)
+            self.assertEqual(datetime.datetime(2020, 1, 3, 1), until.right.value)
+
+    @patch("models.transaction.STATS_ROLLUP_ENABLED", True)
+    def test__model__transaction__stats__rollup(self):
+        query = mock.MagicMock()
+        mock.wrapper.session.query.side_effect = lambda *columns: query
+        query.filter().group_by.return_value = [("2020-01-01 13:00:00", 0, 5, 2)]
+        query.filter.reset_mock()
+
+        actual_result = Transaction.stats(
+            "wallet", datetime.datetime(2020, 1, 1), datetime.datetime(2020, 1, 2), "hour"
+        )
+
+        self.assertEqual([{"time": "2020-01-01 13:00:00", "origin": 0, "incoming": 5, "outgoing": 2}], actual_result)
+        query.filter.assert_called_once()
+
+    def test__model__transaction__rebuild_rollups(self):
+        query_rollup = mock.MagicMock()
+        query = mock.MagicMock()
+        mock.wrapper.session.query.side_effect = lambda *columns: (
+            query_rollup if columns == (TransactionRollup,) else query
+        )
+        query.filter().group_by.side_effect = [
+            [("b", "2020-01-01 13:00:00", 0, 5)],
+            [("a", "2020-01-01 13:00:00", 0, 5)],
+            [("b", "2020-01-01 13:00:00", 0, 1)],
+            [],
+        ]
+
+        self.assertEqual(2, Transaction.rebuild_rollups())
+        query_rollup.delete.assert_called_once_with(synchronize_session=False)
+        model, mappings = mock.wrapper.session.bulk_insert_mappings.call_args[0]
+        self.assertEqual(TransactionRollup, model)
+        hour = datetime.datetime(2020, 1, 1, 13)
+        self.assertEqual(
+            [
+                {"wallet_uuid": "b", "hour": hour, "origin": 0, "incoming": 6, "outgoing": 0},
+                {"wallet_uuid": "a", "hour": hour, "origin": 0, "incoming": 0, "outgoing": 5},
+            ],
+            mappings,
+        )
+        mock.wrapper.session.commit.assert_called_once_with()
+
+    @patch("models.transaction.select")
+    @patch("models.transaction.TransactionArchive")
+    def test__model__transaction__archive(self, archive_patch, select_patch):
+        query_ids = mock.MagicMock()
+        query_transaction = mock.MagicMock()
+        mock.wrapper.session.query.side_effect = lambda entity: (
+            query_ids if entity is Transaction.id else query_transaction
+        )
+        query_ids.filter().order_by().limit.side_effect = [[(1,), (2,)], []]
+        archive_patch.__table__ = mock.MagicMock()
+        before = datetime.datetime.now()
+
+        self.assertEqual(2, Transaction.archive(before, 2))
+        query_ids.filter().order_by().limit.assert_called_with(2)
+        mock.wrapper.session.execute.assert_called_once_with(
+            archive_patch.__table__.insert().from_select(Transaction.serialized_columns, select_patch().where())
+        )
+        query_transaction.filter().delete.assert_called_once_with(synchronize_session=False)
+        mock.wrapper.session.commit.assert_called_once_with()
+
+    @patch("models.transaction.aliased")
+    @patch("models.transaction.union")
+    @patch("models.transaction.desc")
+    def test__model__transaction__history(self, desc_patch, union_patch, aliased_patch):
+        query_transaction = mock.MagicMock()
+        query_aliased = mock.MagicMock()
+        mock.wrapper.session.query.side_effect = lambda *entities: (
+            query_transaction if entities == (Transaction,) else query_aliased
+        )
+
+        expected_result = query_aliased.order_by.return_value
+        actual_result = Transaction.history("the-source", 42, "criterion")
 
         self.assertEqual(expected_result, actual_result)
-        query_patch.assert_called_with(source)
+        self.assertEqual(2, query_transaction.filter.call_count)
+        query_transaction.filter().order_by().limit.assert_called_with(42)
+        branch = query_transaction.filter().order_by().limit().subquery().select()
+        union_patch.assert_called_with(branch, branch)
+        aliased_patch.assert_called_with(Transaction, union_patch().alias())
+        mock.wrapper.session.query.assert_called_with(
+            *[getattr(aliased_patch(), name) for name in Transaction.serialized_columns]
+        )
 
-    @patch("models.transaction.Transaction.time_stamp")
+    @patch("models.transaction.aliased")
+    @patch("models.transaction.union")
     @patch("models.transaction.desc")
-    @patch("models.transaction.Transaction.query")
-    def test__model__transaction__slice_transactions(self, query_patch, desc_patch, timestamp_patch):
-        source = mock.MagicMock()
+    def test__model__transaction__history__archive(self, desc_patch, union_patch, aliased_patch):
+        query_archive = mock.MagicMock()
+        mock.wrapper.session.query.side_effect = lambda *entities: (
+            query_archive if entities == (TransactionArchive,) else mock.MagicMock()
+        )
+
+        Transaction.history("the-source", 42, model=TransactionArchive)
+
+        self.assertEqual(2, query_archive.filter.call_count)
+        aliased_patch.assert_called_with(TransactionArchive, union_patch().alias())
+
+    @patch("models.transaction.Transaction.history")
+    def test__model__transaction__slice_transactions(self, history_patch):
         offset = 42
-        count = 1337
+        count = 5
+
+        transactions = [make_row(i) for i in range(5)]
+        history_patch().slice().yield_per.return_value = transactions
+        history_patch.reset_mock()
+
+        expected_result = [Transaction.serialize_row(t) for t in transactions]
+        actual_result = Transaction.slice_transactions("source", offset, count)
+
+        self.assertEqual(expected_result, actual_result)
+        history_patch.assert_called_once_with("source", offset + count)
+        history_patch().slice.assert_called_with(offset, offset + count)
+        history_patch().slice().yield_per.assert_called_with(PAGE_FETCH_SIZE)
+
+    @patch("models.transaction.Transaction.history")
+    def test__model__transaction__slice_transactions__archive(self, history_patch):
+        hot, archive = mock.MagicMock(), mock.MagicMock()
+        history_patch.side_effect = lambda *args, model=None: archive if model is TransactionArchive else hot
+        hot.slice().yield_per.return_value = [make_row(2)]
+        archive.slice().yield_per.return_value = [make_row(1), make_row(0)]
+
+        expected_result = [Transaction.serialize_row(make_row(i)) for i in (2, 1, 0)]
+        actual_result = Transaction.slice_transactions("source", 4, 3)
+
+        self.assertEqual(expected_result, actual_result)
+        history_patch.assert_called_with("source", 2, model=TransactionArchive)
+        hot.slice.assert_called_with(4, 7)
+        archive.slice.assert_called_with(0, 2)
+
+    @patch("models.transaction.Transaction.history")
+    def test__model__transaction__slice_transactions__archive_only(self, history_patch):
+        hot, archive = mock.MagicMock(), mock.MagicMock()
+        history_patch.side_effect = lambda *args, model=None: archive if model is TransactionArchive else hot
+        hot.slice().yield_per.return_value = []
+        hot.count.return_value = 3
+        archive.slice().yield_per.return_value = [make_row(0)]
 
-        transactions = [mock.MagicMock() for _ in range(5)]
-        query_patch().order_by().slice.return_value = transactions
+        self.assertEqual([Transaction.serialize_row(make_row(0))], Transaction.slice_transactions("source", 5, 2))
+        history_patch.assert_any_call("source", 5)
+        history_patch.assert_called_with("source", 4, model=TransactionArchive)
+        archive.slice.assert_called_with(2, 4)
 
-        expected_result = [t.serialize for t in transactions]
-        actual_result = Transaction.slice_transactions(source, offset, count)
+    @patch("models.transaction.Transaction.history")
+    def test__model__transaction__transactions_before__first_page(self, history_patch):
+        transactions = [make_row(i) for i in range(5)]
+        history_patch().limit.return_value = transactions
+        history_patch.reset_mock()
+
+        expected_result = [Transaction.serialize_row(t) for t in transactions]
+        actual_result = Transaction.transactions_before("source", datetime.datetime.now(), 0, 5)
+
+        self.assertEqual(expected_result, actual_result)
+        history_patch.assert_called_once_with("source", 5, model=Transaction)
+        history_patch().limit.assert_called_with(5)
+
+    @patch("models.transaction.Transaction.history")
+    def test__model__transaction__transactions_before__archive(self, history_patch):
+        hot, archive = mock.MagicMock(), mock.MagicMock()
+        history_patch.side_effect = lambda *args, model=None: archive if model is TransactionArchive else hot
+        hot.limit.return_value = [make_row(4), make_row(3)]
+        archive.limit.return_value = [make_row(2)]
+
+        expected_result = [Transaction.serialize_row(make_row(i)) for i in (4, 3, 2)]
+        actual_result = Transaction.transactions_before("source", datetime.datetime.now(), 0, 5)
 
         self.assertEqual(expected_result, actual_result)
-        query_patch.assert_called_with(source)
-        desc_patch.assert_called_with(timestamp_patch)
-        query_patch().order_by.assert_called_with(desc_patch())
-        query_patch().order_by().slice.assert_called_with(offset, offset + count)
+        history_patch.assert_called_with("source", 3, model=TransactionArchive)
+        archive.limit.assert_called_with(3)
+
+    @patch("models.transaction.and_")
+    @patch("models.transaction.or_")
+    @patch("models.transaction.Transaction.history")
+    def test__model__transaction__transactions_before__cursor(self, history_patch, or_patch, and_patch):
+        transactions = [make_row(i) for i in range(5)]
+        history_patch().limit.return_value = transactions
+        history_patch.reset_mock()
+
+        expected_result = [Transaction.serialize_row(t) for t in transactions]
+        actual_result = Transaction.transactions_before("source", datetime.datetime.now(), 1337, 5)
+
+        self.assertEqual(expected_result, actual_result)
+        history_patch.assert_called_once_with("source", 5, or_patch(), model=Transaction)
+        and_patch.assert_called_once()
+
+    def test__model__transaction__stream(self):
+        query_archive, query_transaction = mock.MagicMock(), mock.MagicMock()
+        mock.wrapper.session.query.side_effect = lambda *columns: (
+            query_archive if columns[0] is TransactionArchive.id else query_transaction
+        )
+        stream_archive = query_archive.filter().order_by().execution_options().yield_per
+        stream_transaction = query_transaction.filter().order_by().execution_options().yield_per
+        stream_archive.return_value = [make_row(0), make_row(1)]
+        stream_transaction.return_value = [make_row(2)]
+        query_archive.filter.reset_mock()
+
+        now = datetime.datetime.now()
+        actual_result = list(Transaction.stream(["a", "b"], now, now, (now, 42), 100))
+
+        self.assertEqual([make_row(0), make_row(1), make_row(2)], actual_result)
+        self.assertEqual(4, len(query_archive.filter.call_args[0]))
+        query_archive.filter().order_by().execution_options.assert_called_with(stream_results=True)
+        stream_archive.assert_called_with(100)
+        stream_transaction.assert_called_with(100)
+
+    def test__model__transaction__stream__all_wallets(self):
+        query = mock.MagicMock()
+        mock.wrapper.session.query.side_effect = lambda *columns: query
+        query.filter().order_by().execution_options().yield_per.return_value = []
+        query.filter.reset_mock()
+
+        self.assertEqual([], list(Transaction.stream([], None, None, None, 100)))
+        query.filter.assert_called_with()
@@ -0,0 +1,124 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from mock.mock_loader import mock
+from models.wallet import Wallet
+from schemes import unknown_source_or_destination, not_enough_coins, success_scheme
+from utils import transfer
+
+
+class TestTransfer(TestCase):
+    def setUp(self):
+        mock.reset_mocks()
+
+        self.query_wallet = mock.MagicMock()
+        mock.wrapper.session.query.side_effect = {Wallet: self.query_wallet}.__getitem__
+
+    def make_wallet(self, source_uuid: str, amount: int):
+        wallet = mock.MagicMock()
+        wallet.source_uuid = source_uuid
+        wallet.amount = amount
+        return wallet
+
+    @patch("utils.transfer.Wallet.source_uuid")
+    def test__lock_wallets(self, source_uuid_patch):
+        wallets = [self.make_wallet("b", 0), self.make_wallet("c", 0)]
+        self.query_wallet.filter().order_by().with_for_update().populate_existing.return_value = wallets
+
+        actual_result = transfer.lock_wallets("c", "a", "b", "c")
+
+        self.assertEqual({"b": wallets[0], "c": wallets[1]}, actual_result)
+        source_uuid_patch.in_.assert_called_with(["a", "b", "c"])
+        self.query_wallet.filter.assert_called_with(source_uuid_patch.in_())
+        self.query_wallet.filter().order_by.assert_called_with(source_uuid_patch)
+
+    @patch("utils.transfer.collector")
+    @patch("utils.transfer.lock_wallets")
+    def test__transfer__unknown_source(self, lock_wallets_patch, collector_patch):
+        source_wallet = self.make_wallet("source", 100)
+        lock_wallets_patch.return_value = {"dest": self.make_wallet("dest", 0)}
+
+        self.assertEqual(unknown_source_or_destination, transfer.transfer(source_wallet, "dest", 42, "text"))
+        mock.wrapper.session.rollback.assert_called_with()
+        mock.wrapper.session.commit.assert_not_called()
+
+    @patch("utils.transfer.collector")
+    @patch("utils.transfer.lock_wallets")
+    def test__transfer__unknown_destination(self, lock_wallets_patch, collector_patch):
+        source_wallet = self.make_wallet("source", 100)
+        lock_wallets_patch.return_value = {"source": source_wallet}
+
+        self.assertEqual(unknown_source_or_destination, transfer.transfer(source_wallet, "dest", 42, "text"))
+        lock_wallets_patch.assert_called_with("source", "dest")
+        collector_patch.credit.assert_called_with(source_wallet, collector_patch.fetch())
+        mock.wrapper.session.rollback.assert_not_called()
+        mock.wrapper.session.commit.assert_called_once_with()
+
+    @patch("utils.transfer.collector")
+    @patch("utils.transfer.lock_wallets")
+    def test__transfer__collects_before_locking(self, lock_wallets_patch, collector_patch):
+        calls = mock.MagicMock()
+        calls.attach_mock(collector_patch.fetch, "fetch")
+        calls.attach_mock(lock_wallets_patch, "lock_wallets")
+        calls.attach_mock(collector_patch.credit, "credit")
+        source_wallet = self.make_wallet("source", 31)
+        lock_wallets_patch.return_value = {"source": source_wallet, "dest": self.make_wallet("dest", 0)}
+
+        transfer.transfer(source_wallet, "dest", 42, "text")
+
+        self.assertEqual(["fetch", "lock_wallets", "credit"], [name for name, *_ in calls.mock_calls])
+        collector_patch.fetch.assert_called_once_with("source", batch=False)
+
+    @patch("utils.transfer.collector")
+    @patch("utils.transfer.lock_wallets")
+    def test__transfer__not_enough_coins(self, lock_wallets_patch, collector_patch):
+        source_wallet = self.make_wallet("source", 31)
+        lock_wallets_patch.return_value = {"source": source_wallet, "dest": self.make_wallet("dest", 0)}
+
+        self.assertEqual(not_enough_coins, transfer.transfer(source_wallet, "dest", 42, "text"))
+        collector_patch.credit.assert_called_with(source_wallet, collector_patch.fetch())
+        self.assertEqual(31, source_wallet.amount)
+        mock.wrapper.session.commit.assert_called_once_with()
+
+    @patch("utils.transfer.collector")
+    @patch("utils.transfer.lock_wallets")
+    def test__transfer__negative_amount(self, lock_wallets_patch, collector_patch):
+        source_wallet = self.make_wallet("source", 31)
+        lock_wallets_patch.return_value = {"source": source_wallet, "dest": self.make_wallet("dest", 0)}
+
+        self.assertEqual(not_enough_coins, transfer.transfer(source_wallet, "dest", -1, "text"))
+        self.assertEqual(31, source_wallet.amount)
+
+    @patch("utils.transfer.LedgerEntry")
+    @patch("utils.transfer.Transaction")
+    @patch("utils.transfer.collector")
+    @patch("utils.transfer.lock_wallets")
+    def test__transfer__successful(self, lock_wallets_patch, collector_patch, transaction_patch, ledger_patch):
+        source_wallet = self.make_wallet("source", 100)
+        locked_source_wallet = self.make_wallet("source", 100)
+        dest_wallet = self.make_wallet("dest", 50)
+        lock_wallets_patch.return_value = {"source": locked_source_wallet, "dest": dest_wallet}
+
+        self.assertIsNone(transfer.transfer(source_wallet, "dest", 42, "text"))
+        collector_patch.credit.assert_called_with(locked_source_wallet, collector_patch.fetch())
+        self.assertEqual(100 - 42, locked_source_wallet.amount)
+        self.assertEqual(50 + 42, dest_wallet.amount)
+        ledger_patch.record.assert_any_call("source", -42, "send")
+        ledger_patch.record.assert_any_call("dest", 42, "send")
+        transaction_patch.create.assert_called_with("source", 42, "dest", "text", origin=0, commit=False)
+        mock.wrapper.session.commit.assert_called_once_with()
+
+    @patch("utils.transfer.IdempotencyKey")
+    @patch("utils.transfer.Transaction")
+    @patch("utils.transfer.collector")
+    @patch("utils.transfer.lock_wallets")
+    def test__transfer__idempotency_key(
+        self, lock_wallets_patch, collector_patch, transaction_patch, idempotency_patch
+    ):
+        source_wallet = self.make_wallet("source", 100)
+        lock_wallets_patch.return_value = {"source": source_wallet, "dest": self.make_wallet("dest", 50)}
+        idempotency_patch.record.side_effect = lambda *args: mock.wrapper.session.commit.assert_not_called()
+
+        self.assertIsNone(transfer.transfer(source_wallet, "dest", 42, "text", "retry"))
+        idempotency_patch.record.assert_called_once_with("source", "send", "retry", success_scheme)
+        mock.wrapper.session.commit.assert_called_once_with()
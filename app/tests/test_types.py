@@ -0,0 +1,70 @@
+import uuid
+from unittest import TestCase
+
+from sqlalchemy import BINARY, String, Column, MetaData, Table, create_engine, select
+from sqlalchemy.dialects import mysql
+
+from models.types import UUIDType, HexKey, UNKNOWN_UUID, uuid_bytes, storable_uuid
+
+SOURCE_UUID = "1b4e28ba-2fa1-11d2-883f-0016d3cca427"
+
+
+class TestTypes(TestCase):
+    def test__uuid__text(self):
+        column_type = UUIDType(binary=False)
+
+        self.assertIsInstance(column_type.load_dialect_impl(mysql.dialect()), String)
+        self.assertEqual(SOURCE_UUID, column_type.process_bind_param(SOURCE_UUID, mysql.dialect()))
+        self.assertEqual(SOURCE_UUID, column_type.process_result_value(SOURCE_UUID, mysql.dialect()))
+
+    def test__uuid__binary(self):
+        column_type = UUIDType(binary=True)
+
+        self.assertIsInstance(column_type.load_dialect_impl(mysql.dialect()), BINARY)
+        self.assertEqual(uuid.UUID(SOURCE_UUID).bytes, column_type.process_bind_param(SOURCE_UUID, mysql.dialect()))
+        self.assertEqual(SOURCE_UUID, column_type.process_result_value(uuid.UUID(SOURCE_UUID).bytes, mysql.dialect()))
+        self.assertIsNone(column_type.process_bind_param(None, mysql.dialect()))
+        self.assertIsNone(column_type.process_result_value(None, mysql.dialect()))
+
+    def test__uuid__binary__invalid(self):
+        column_type = UUIDType(binary=True)
+
+        self.assertEqual(UNKNOWN_UUID, column_type.process_bind_param("not a uuid", mysql.dialect()))
+        self.assertEqual(UNKNOWN_UUID, column_type.process_bind_param(SOURCE_UUID.upper(), mysql.dialect()))
+        self.assertEqual(UNKNOWN_UUID, column_type.process_bind_param(42, mysql.dialect()))
+
+    def test__uuid__binary__invalid__matches_no_row(self):
+        table = Table("wallet", MetaData(), Column("source_uuid", UUIDType(binary=True)))
+        engine = create_engine("sqlite://")
+        table.create(engine)
+        engine.execute(table.insert(), [{"source_uuid": SOURCE_UUID}, {"source_uuid": str(uuid.UUID(int=0))}])
+
+        for source_uuid in [SOURCE_UUID, "not a uuid", SOURCE_UUID.upper(), ""]:
+            with self.subTest(source_uuid=source_uuid):
+                rows = engine.execute(select([table.c.source_uuid]).where(table.c.source_uuid == source_uuid))
+                self.assertEqual([SOURCE_UUID] if source_uuid == SOURCE_UUID else [], [row[0] for row in rows])
+
+    def test__uuid_bytes(self):
+        self.assertEqual(uuid.UUID(SOURCE_UUID).bytes, uuid_bytes(SOURCE_UUID))
+        self.assertIsNone(uuid_bytes("not a uuid"))
+        self.assertIsNone(uuid_bytes(SOURCE_UUID.upper()))
+        self.assertIsNone(uuid_bytes(SOURCE_UUID.replace("-", "")))
+        self.assertIsNone(uuid_bytes(None))
+
+    def test__storable_uuid(self):
+        self.assertTrue(storable_uuid("not a uuid", binary=False))
+        self.assertTrue(storable_uuid(SOURCE_UUID, binary=True))
+        self.assertFalse(storable_uuid("not a uuid", binary=True))
+
+    def test__key__text(self):
+        column_type = HexKey(5, binary=False)
+
+        self.assertIsInstance(column_type.load_dialect_impl(mysql.dialect()), String)
+        self.assertEqual("0123456789", column_type.process_bind_param("0123456789", mysql.dialect()))
+
+    def test__key__binary(self):
+        column_type = HexKey(5, binary=True)
+
+        self.assertEqual(5, column_type.load_dialect_impl(mysql.dialect()).length)
+        self.assertEqual(b"\x01\x23\x45\x67\x89", column_type.process_bind_param("0123456789", mysql.dialect()))
+        self.assertEqual("0123456789", column_type.process_result_value(b"\x01\x23\x45\x67\x89", mysql.dialect()))
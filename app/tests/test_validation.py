@@ -0,0 +1,138 @@
+from unittest import TestCase
+
+import scheme
+
+from mock.mock_loader import mock
+from schemes import scheme_default, scheme_send, scheme_transactions, scheme_idempotency, invalid_input_data
+from utils import validation
+from utils.validation import Validator, compile_field
+
+SOURCE_UUID = "1b4e28ba-2fa1-11d2-883f-0016d3cca427"
+
+SEND = {
+    "source_uuid": SOURCE_UUID,
+    "key": "0123456789",
+    "send_amount": 42,
+    "destination_uuid": SOURCE_UUID,
+    "usage": "",
+}
+
+
+def framework_accepts(fields: dict, data: dict) -> bool:
+    # the structure the framework builds for the requirements of a user endpoint
+    structure = scheme.Structure({name: field.clone(required=True) for name, field in fields.items()})
+    try:
+        structure.serialize(data, "json")
+    except Exception:
+        return False
+    return True
+
+
+class TestValidation(TestCase):
+    def setUp(self):
+        mock.reset_mocks()
+
+    def test__compile_field__text(self):
+        self.assertTrue(compile_field(scheme.Text())(""))
+        self.assertFalse(compile_field(scheme.Text())(42))
+        self.assertTrue(compile_field(scheme.Text(pattern=r"^[a-f]+$"))("abc"))
+        self.assertTrue(compile_field(scheme.Text(pattern=r"^[a-f]+$"))(" abc "))
+        self.assertFalse(compile_field(scheme.Text(pattern=r"^[a-f]+$"))("xyz"))
+        self.assertFalse(compile_field(scheme.Text(max_length=2))("abc"))
+        self.assertFalse(compile_field(scheme.Text(nonempty=True))(" "))
+
+    def test__compile_field__uuid(self):
+        self.assertTrue(compile_field(scheme.UUID())(SOURCE_UUID))
+        self.assertFalse(compile_field(scheme.UUID())(SOURCE_UUID.upper()))
+        self.assertFalse(compile_field(scheme.UUID())(SOURCE_UUID[:-1]))
+
+    def test__compile_field__integer(self):
+        self.assertTrue(compile_field(scheme.Integer(minimum=1))(1))
+        self.assertFalse(compile_field(scheme.Integer(minimum=1))(0))
+        self.assertFalse(compile_field(scheme.Integer(maximum=1))(2))
+        self.assertFalse(compile_field(scheme.Integer())("1"))
+        self.assertFalse(compile_field(scheme.Integer())(1.0))
+        self.assertFalse(compile_field(scheme.Integer())(True))
+
+    def test__compile_field__boolean(self):
+        self.assertTrue(compile_field(scheme.Boolean())(False))
+        self.assertFalse(compile_field(scheme.Boolean())(0))
+
+    def test__compile_field__null(self):
+        self.assertTrue(compile_field(scheme.UUID())(None))
+        self.assertFalse(compile_field(scheme.UUID(nonnull=True))(None))
+
+    def test__compile_field__processed_by_field(self):
+        field = scheme.Float(minimum=1.0)
+
+        self.assertTrue(compile_field(field)(1.5))
+        self.assertFalse(compile_field(field)(0.5))
+        self.assertTrue(compile_field(scheme.Text(constant="a"))("a"))
+        self.assertFalse(compile_field(scheme.Text(constant="a"))("b"))
+
+    def test__validator__scheme_default(self):
+        validator = Validator(scheme_default)
+
+        self.assertTrue(validator.valid({"source_uuid": SOURCE_UUID, "key": "0123456789"}))
+        self.assertFalse(validator.valid({"source_uuid": SOURCE_UUID, "key": "0123456789", "other": 1}))
+        self.assertFalse(validator.valid({"source_uuid": SOURCE_UUID, "key": "012345678g"}))
+        self.assertFalse(validator.valid({"source_uuid": SOURCE_UUID}))
+        self.assertFalse(validator.valid([]))
+
+    def test__validator__scheme_send(self):
+        self.assertTrue(Validator(scheme_send).valid(SEND))
+        self.assertFalse(Validator(scheme_send).valid({**SEND, "send_amount": 0}))
+
+    def test__validator__scheme_transactions(self):
+        data = {"source_uuid": SOURCE_UUID, "key": "0123456789", "offset": 0, "count": 1}
+
+        self.assertTrue(Validator(scheme_transactions).valid(data))
+        self.assertFalse(Validator(scheme_transactions).valid({**data, "offset": -1}))
+
+    def test__validator__optional_field(self):
+        validator = Validator(scheme_send, scheme_idempotency)
+
+        self.assertTrue(validator.valid(SEND))
+        self.assertTrue(validator.valid({**SEND, "idempotency_key": "retry"}))
+        self.assertFalse(validator.valid({**SEND, "idempotency_key": 1}))
+        self.assertFalse(validator.valid({**SEND, "other": 1}))
+
+    def test__validator__same_as_framework(self):
+        requests = [
+            {"source_uuid": SOURCE_UUID, "key": "0123456789"},
+            {"source_uuid": None, "key": "0123456789"},
+            {"source_uuid": SOURCE_UUID.upper(), "key": "0123456789"},
+            {"source_uuid": SOURCE_UUID, "key": " 0123456789\n"},
+            {"source_uuid": SOURCE_UUID, "key": 123456789},
+            {"source_uuid": SOURCE_UUID},
+            {"source_uuid": SOURCE_UUID, "key": "0123456789", "other": 1},
+        ]
+        for data in requests:
+            with self.subTest(data=data):
+                self.assertEqual(framework_accepts(scheme_default, data), Validator(scheme_default).valid(data))
+
+        for send_amount in [1, 0, -1, True, 1.0, "1", None, 10**20]:
+            data = {**SEND, "send_amount": send_amount}
+            with self.subTest(data=data):
+                self.assertEqual(framework_accepts(scheme_send, data), Validator(scheme_send).valid(data))
+
+    def test__user_endpoint(self):
+        calls = []
+
+        def handler(data: dict, user: str):
+            calls.append((data, user))
+            return {"ok": True}
+
+        endpoint = validation.user_endpoint(["test"], scheme_default)(handler)
+        self.addCleanup(mock.user_endpoints.remove, (["test"], None))
+        self.addCleanup(validation.validators.pop, ("test",))
+
+        self.assertIn((["test"], None), mock.user_endpoints)
+        self.assertEqual(endpoint, mock.user_endpoint_handlers[("test",)])
+        self.assertEqual(scheme_default, validation.validators[("test",)].fields)
+        self.assertEqual("handler", endpoint.__name__)
+
+        self.assertEqual(invalid_input_data, endpoint({"source_uuid": SOURCE_UUID}, "user"))
+        self.assertEqual([], calls)
+        self.assertEqual({"ok": True}, endpoint({"source_uuid": SOURCE_UUID, "key": "0123456789"}, "user"))
+        self.assertEqual([({"source_uuid": SOURCE_UUID, "key": "0123456789"}, "user")], calls)
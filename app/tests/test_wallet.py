@@ -1,17 +1,29 @@
+import datetime
+import threading
+from inspect import unwrap
 from unittest import TestCase
-from unittest.mock import patch
+from unittest.mock import patch, call
 
 from mock.mock_loader import mock
 from models.wallet import Wallet
 from resources import wallet
+from utils.metrics import metrics
+from utils.ratelimit import limiter
+from utils.wallet_cache import WalletInfo
 from schemes import (
     success_scheme,
     already_own_a_wallet,
     unknown_source_or_destination,
     permission_denied,
     not_enough_coins,
+    invalid_cursor,
+    invalid_time_range,
+    invalid_idempotency_key,
+    rate_limited,
 )
 
+SOURCE_UUID = "1b4e28ba-2fa1-11d2-883f-0016d3cca427"
+
 
 class TestWallet(TestCase):
     def setUp(self):
@@ -20,19 +32,45 @@ class TestWallet(TestCase):
         self.query_wallet = mock.MagicMock()
         mock.wrapper.session.query.side_effect = {Wallet: self.query_wallet}.__getitem__
 
-    def test__update_miner(self):
-        mock.m.contact_microservice.return_value = {"coins": 31}
+        dispatcher_patcher = patch("resources.wallet.dispatcher")
+        self.dispatcher = dispatcher_patcher.start()
+        self.addCleanup(dispatcher_patcher.stop)
+
+        idempotency_patcher = patch("resources.wallet.IdempotencyKey")
+        self.idempotency = idempotency_patcher.start()
+        self.idempotency.lookup.return_value = None
+        self.addCleanup(idempotency_patcher.stop)
 
+    @patch("resources.wallet.collector")
+    @patch("resources.wallet.lock_wallets")
+    def test__update_miner(self, lock_wallets_patch, collector_patch):
         test_wallet = mock.MagicMock()
-        test_wallet.amount = 0
+        locked_wallet = mock.MagicMock()
+        lock_wallets_patch.return_value = {test_wallet.source_uuid: locked_wallet}
+        collector_patch.fetch.return_value = 7
+        calls = mock.MagicMock()
+        calls.attach_mock(collector_patch.fetch, "fetch")
+        calls.attach_mock(lock_wallets_patch, "lock_wallets")
+        calls.attach_mock(collector_patch.credit, "credit")
+
+        self.assertEqual(locked_wallet, wallet.update_miner(test_wallet))
+        self.assertEqual(
+            [
+                call.fetch(test_wallet.source_uuid),
+                call.lock_wallets(test_wallet.source_uuid),
+                call.credit(locked_wallet, 7),
+            ],
+            calls.mock_calls,
+        )
+        mock.wrapper.session.commit.assert_not_called()
 
-        wallet.update_miner(test_wallet)
+    @patch("resources.wallet.collector")
+    @patch("resources.wallet.lock_wallets")
+    def test__update_miner__deleted(self, lock_wallets_patch, collector_patch):
+        lock_wallets_patch.return_value = {}
 
-        self.assertEqual(test_wallet.amount, 31)
-        mock.m.contact_microservice.assert_called_with(
-            "service", ["miner", "collect"], {"wallet_uuid": test_wallet.source_uuid}
-        )
-        mock.wrapper.session.commit.assert_called_with()
+        self.assertIsNone(wallet.update_miner(mock.MagicMock()))
+        collector_patch.credit.assert_not_called()
 
     def test__user_endpoint__create__already_own_a_wallet(self):
         self.query_wallet.filter_by().first.return_value = "something"
@@ -44,8 +82,9 @@ class TestWallet(TestCase):
         self.query_wallet.filter_by.assert_called_with(user_uuid="the-user")
         self.query_wallet.filter_by().first.assert_called_with()
 
+    @patch("resources.wallet.cache_wallet")
     @patch("resources.wallet.Wallet.create")
-    def test__user_endpoint__create__successful(self, wallet_create_patch):
+    def test__user_endpoint__create__successful(self, wallet_create_patch, cache_wallet_patch):
         self.query_wallet.filter_by().first.return_value = None
 
         expected_result = wallet_create_patch().serialize
@@ -55,68 +94,263 @@ class TestWallet(TestCase):
         self.query_wallet.filter_by.assert_called_with(user_uuid="the-user")
         self.query_wallet.filter_by().first.assert_called_with()
         wallet_create_patch.assert_called_with("the-user")
+        cache_wallet_patch.assert_called_with(wallet_create_patch())
 
     @patch("resources.wallet.update_miner")
     @patch("resources.wallet.Transaction")
     def test__user_endpoint__get__successful(self, transaction_patch, update_miner_patch):
         test_wallet = mock.MagicMock()
+        locked_wallet = update_miner_patch.return_value
 
-        expected_result = {**test_wallet.serialize, "transactions": transaction_patch.count_transactions()}
-        actual_result = wallet.get({}, "", test_wallet)
+        expected_result = {**locked_wallet.serialize, "transactions": locked_wallet.transaction_count}
+        actual_result = unwrap(wallet.get)({}, "", test_wallet)
 
         self.assertEqual(expected_result, actual_result)
         update_miner_patch.assert_called_with(test_wallet)
-        transaction_patch.count_transactions.assert_called_with(test_wallet.source_uuid)
+        mock.wrapper.session.commit.assert_called_with()
+        transaction_patch.count_transactions.assert_not_called()
+
+    @patch("resources.wallet.update_miner")
+    def test__user_endpoint__get__deleted(self, update_miner_patch):
+        update_miner_patch.return_value = None
+
+        self.assertEqual(unknown_source_or_destination, unwrap(wallet.get)({}, "", mock.MagicMock()))
+        mock.wrapper.session.commit.assert_called_with()
+
+    @patch("resources.wallet.collector")
+    @patch("resources.wallet.lock_wallets")
+    def test__user_endpoint__get__concurrent_write(self, lock_wallets_patch, collector_patch):
+        # another request holds the wallet lock and changes the balance while get waits for it
+        collector_patch.lazy = False
+        collector_patch.fetch.return_value = 10
+        collector_patch.credit.side_effect = lambda w, coins: setattr(w, "amount", w.amount + coins)
+        loaded_wallet = Wallet(source_uuid=SOURCE_UUID, key="0123456789", amount=100, transaction_count=0)
+        current_wallet = Wallet(source_uuid=SOURCE_UUID, key="0123456789", amount=50, transaction_count=0)
+        self.query_wallet.get.return_value = loaded_wallet
+        lock_wallets_patch.return_value = {SOURCE_UUID: current_wallet}
+        results = []
+
+        with wallet.workers.wallets(SOURCE_UUID):
+            thread = threading.Thread(
+                target=lambda: results.append(wallet.get({"source_uuid": SOURCE_UUID, "key": "0123456789"}, "user")),
+                daemon=True,
+            )
+            thread.start()
+            thread.join(0.1)
+            self.assertEqual([], results)
+            self.query_wallet.get.assert_not_called()
+        thread.join(1)
+
+        self.assertEqual(60, results[0]["amount"])
+        self.assertEqual(60, current_wallet.amount)
+        self.assertEqual(100, loaded_wallet.amount)
+
+    def test__user_endpoint__get__checks_inside_wrappers(self):
+        source_uuid = "9a3f37a5-81e4-4e28-a7a5-4a1d8a3c6bc4"
+        requests = []
+        self.query_wallet.get.side_effect = lambda _: requests.append(metrics.current)
+
+        self.assertEqual(
+            unknown_source_or_destination, wallet.get({"source_uuid": source_uuid, "key": "0123456789"}, "user")
+        )
+        self.assertEqual("get", requests[0].endpoint)
+        mock.wrapper.Session.remove.assert_called_with()
+
+    @patch.object(limiter, "acquire")
+    @patch.object(limiter, "enabled", True)
+    def test__user_endpoint__get__checks_rate_limited(self, acquire_patch):
+        acquire_patch.return_value = False
+
+        self.assertEqual(rate_limited, wallet.get({"source_uuid": SOURCE_UUID, "key": "0123456789"}, "user"))
+        self.query_wallet.get.assert_not_called()
+
+    def test__user_endpoint__get__checks_rolled_back(self):
+        self.query_wallet.get.side_effect = RuntimeError("database gone")
+
+        with self.assertRaises(RuntimeError):
+            wallet.get({"source_uuid": SOURCE_UUID, "key": "0123456789"}, "user")
+
+        mock.wrapper.session.rollback.assert_called_with()
+        mock.wrapper.session.commit.assert_not_called()
+        mock.wrapper.Session.remove.assert_called_with()
+
+    @patch("resources.wallet.update_miner")
+    @patch("resources.wallet.collector")
+    def test__user_endpoint__get__lazy_settlement(self, collector_patch, update_miner_patch):
+        test_wallet = mock.MagicMock()
+        collector_patch.lazy = True
+        collector_patch.balance.return_value = 1337
+
+        expected_result = {**test_wallet.serialize, "amount": 1337, "transactions": test_wallet.transaction_count}
+        actual_result = unwrap(wallet.get)({}, "", test_wallet)
+
+        self.assertEqual(expected_result, actual_result)
+        collector_patch.balance.assert_called_with(test_wallet)
+        update_miner_patch.assert_not_called()
+        mock.m.contact_microservice.assert_not_called()
 
     @patch("resources.wallet.Transaction")
     def test__user_endpoint__transactions__successful(self, transaction_patch):
         test_wallet = mock.MagicMock()
 
-        expected_result = {"transactions": transaction_patch.slice_transactions()}
-        actual_result = wallet.transactions({"count": 42, "offset": 1337}, "", test_wallet)
+        expected_result = {"transactions": transaction_patch.slice_transactions(), "truncated": False}
+        actual_result = unwrap(wallet.transactions)({"count": 42, "offset": 1337}, "", test_wallet)
 
         self.assertEqual(expected_result, actual_result)
         transaction_patch.slice_transactions.assert_called_with(test_wallet.source_uuid, 1337, 42)
 
-    def test__user_endpoint__list(self):
-        wallets = [mock.MagicMock() for _ in range(5)]
+    @patch("resources.wallet.TRANSACTIONS_MAX_PAGE_SIZE", 2)
+    @patch("resources.wallet.Transaction")
+    def test__user_endpoint__transactions__truncated(self, transaction_patch):
+        test_wallet = mock.MagicMock()
+        transactions = [
+            {"id": 2, "time_stamp": "2020-01-01 13:37:02"},
+            {"id": 1, "time_stamp": "2020-01-01 13:37:01"},
+        ]
+        transaction_patch.slice_transactions.return_value = transactions
+
+        expected_result = {
+            "transactions": transactions,
+            "truncated": True,
+            "cursor": {"before_time": "2020-01-01 13:37:01", "before_id": 1},
+        }
+        actual_result = unwrap(wallet.transactions)({"count": 1000000, "offset": 0}, "", test_wallet)
+
+        self.assertEqual(expected_result, actual_result)
+        transaction_patch.slice_transactions.assert_called_with(test_wallet.source_uuid, 0, 2)
+
+    @patch("resources.wallet.TRANSACTIONS_MAX_PAGE_SIZE", 2)
+    @patch("resources.wallet.Transaction")
+    def test__user_endpoint__transactions__capped_but_complete(self, transaction_patch):
+        test_wallet = mock.MagicMock()
+        transactions = [{"id": 1, "time_stamp": "2020-01-01 13:37:01"}]
+        transaction_patch.slice_transactions.return_value = transactions
+
+        expected_result = {"transactions": transactions, "truncated": False}
+        actual_result = unwrap(wallet.transactions)({"count": 1000000, "offset": 0}, "", test_wallet)
+
+        self.assertEqual(expected_result, actual_result)
+
+    @patch("resources.wallet.Transaction")
+    def test__user_endpoint__transactions_before__successful(self, transaction_patch):
+        test_wallet = mock.MagicMock()
+
+        expected_result = {"transactions": transaction_patch.transactions_before(), "truncated": False}
+        actual_result = unwrap(wallet.transactions_before)(
+            {"count": 42, "before_id": 1337, "before_time": "2020-01-01 13:37:00.000042"}, "", test_wallet
+        )
+
+        self.assertEqual(expected_result, actual_result)
+        transaction_patch.transactions_before.assert_called_with(
+            test_wallet.source_uuid, datetime.datetime(2020, 1, 1, 13, 37, 0, 42), 1337, 42
+        )
+
+    @patch("resources.wallet.TRANSACTIONS_MAX_PAGE_SIZE", 1)
+    @patch("resources.wallet.Transaction")
+    def test__user_endpoint__transactions_before__truncated(self, transaction_patch):
+        test_wallet = mock.MagicMock()
+        transactions = [{"id": 7, "time_stamp": "2020-01-01 13:36:59"}]
+        transaction_patch.transactions_before.return_value = transactions
+
+        expected_result = {
+            "transactions": transactions,
+            "truncated": True,
+            "cursor": {"before_time": "2020-01-01 13:36:59", "before_id": 7},
+        }
+        actual_result = unwrap(wallet.transactions_before)(
+            {"count": 42, "before_id": 1337, "before_time": "2020-01-01 13:37:00"}, "", test_wallet
+        )
+
+        self.assertEqual(expected_result, actual_result)
+        transaction_patch.transactions_before.assert_called_with(
+            test_wallet.source_uuid, datetime.datetime(2020, 1, 1, 13, 37), 1337, 1
+        )
+
+    @patch("resources.wallet.Transaction")
+    def test__user_endpoint__transactions_before__invalid_cursor(self, transaction_patch):
+        test_wallet = mock.MagicMock()
+
+        expected_result = invalid_cursor
+        actual_result = unwrap(wallet.transactions_before)(
+            {"count": 42, "before_id": 1337, "before_time": "2020-13-01 13:37:00"}, "", test_wallet
+        )
+
+        self.assertEqual(expected_result, actual_result)
+        transaction_patch.transactions_before.assert_not_called()
+
+    @patch("resources.wallet.Transaction")
+    def test__user_endpoint__stats__successful(self, transaction_patch):
+        test_wallet = mock.MagicMock()
+
+        expected_result = {"stats": transaction_patch.stats()}
+        actual_result = unwrap(wallet.stats)(
+            {"since": "2020-01-01 00:00:00", "until": "2020-01-08 00:00:00", "interval": "day"}, "", test_wallet
+        )
 
-        self.query_wallet.filter_by.return_value = wallets
+        self.assertEqual(expected_result, actual_result)
+        transaction_patch.stats.assert_called_with(
+            test_wallet.source_uuid, datetime.datetime(2020, 1, 1), datetime.datetime(2020, 1, 8), "day"
+        )
+
+    @patch("resources.wallet.Transaction")
+    def test__user_endpoint__stats__invalid_time_range(self, transaction_patch):
+        for since, until in [
+            ("2020-13-01 00:00:00", "2020-01-08 00:00:00"),
+            ("2020-01-08 00:00:00", "2020-01-01 00:00:00"),
+        ]:
+            expected_result = invalid_time_range
+            actual_result = unwrap(wallet.stats)(
+                {"since": since, "until": until, "interval": "hour"}, "", mock.MagicMock()
+            )
+
+            self.assertEqual(expected_result, actual_result)
+        transaction_patch.stats.assert_not_called()
 
-        expected_result = {"wallets": [w.source_uuid for w in wallets]}
+    def test__user_endpoint__list(self):
+        query_columns = mock.MagicMock()
+        mock.wrapper.session.query.side_effect = lambda *columns: query_columns
+        query_columns.filter_by.return_value = [("wallet-1",), ("wallet-2",)]
+
+        expected_result = {"wallets": ["wallet-1", "wallet-2"]}
         actual_result = wallet.list_wallets({}, "user")
 
         self.assertEqual(expected_result, actual_result)
-        self.query_wallet.filter_by.assert_called_with(user_uuid="user")
+        mock.wrapper.session.query.assert_called_with(Wallet.source_uuid)
+        query_columns.filter_by.assert_called_with(user_uuid="user")
 
-    def test__user_endpoint__send__unknown_dest(self):
-        source_wallet = mock.MagicMock()
-        self.query_wallet.filter_by().first.return_value = None
+    def test__user_endpoint__list__details(self):
+        query_columns = mock.MagicMock()
+        mock.wrapper.session.query.side_effect = lambda *columns: query_columns
+        query_columns.filter_by.return_value = [("wallet-1", 42, 7)]
 
-        expected_result = unknown_source_or_destination
-        actual_result = wallet.send({"destination_uuid": "dest"}, "", source_wallet)
+        expected_result = {"wallets": [{"source_uuid": "wallet-1", "amount": 42, "transactions": 7}]}
+        actual_result = wallet.list_wallets({"details": True}, "user")
 
         self.assertEqual(expected_result, actual_result)
+        mock.wrapper.session.query.assert_called_with(Wallet.source_uuid, Wallet.amount, Wallet.transaction_count)
+        query_columns.filter_by.assert_called_with(user_uuid="user")
 
-    @patch("resources.wallet.update_miner")
-    def test__user_endpoint__send__not_enough_coins(self, update_miner_patch):
+    @patch("resources.wallet.transfer")
+    def test__user_endpoint__send__error(self, transfer_patch):
         source_wallet = mock.MagicMock()
-        source_wallet.amount = 31
-        self.query_wallet.filter_by().first.return_value = mock.MagicMock()
+        transfer_patch.return_value = not_enough_coins
 
         expected_result = not_enough_coins
-        actual_result = wallet.send({"send_amount": 42, "destination_uuid": "dest"}, "", source_wallet)
+        actual_result = unwrap(wallet.send)(
+            {"send_amount": 42, "destination_uuid": "dest", "usage": "text"}, "", source_wallet
+        )
 
         self.assertEqual(expected_result, actual_result)
-        update_miner_patch.assert_called_with(source_wallet)
+        transfer_patch.assert_called_with(source_wallet, "dest", 42, "text", None)
+        self.dispatcher.notify.assert_not_called()
 
-    @patch("resources.wallet.Transaction")
-    @patch("resources.wallet.update_miner")
-    def test__user_endpoint__send__successful(self, update_miner_patch, transaction_patch):
+    @patch("resources.wallet.transfer")
+    def test__user_endpoint__send__successful(self, transfer_patch):
         source_wallet = mock.MagicMock()
-        source_wallet.amount = 100
-        dest_wallet = self.query_wallet.filter_by().first.return_value = mock.MagicMock()
-        dest_wallet.amount = 50
+        source_wallet.amount = 100 - 42
+        dest_wallet = self.query_wallet.get.return_value = mock.MagicMock()
+        dest_wallet.amount = 50 + 42
+        transfer_patch.return_value = None
 
         expected_calls = [
             (
@@ -138,34 +372,66 @@ class TestWallet(TestCase):
                 },
             ),
         ]
-        mock.m.contact_user.side_effect = lambda *args: self.assertEqual(expected_calls.pop(0), args)
+        self.dispatcher.notify.side_effect = lambda *args: self.assertEqual(expected_calls.pop(0), args)
 
         expected_result = success_scheme
-        actual_result = wallet.send({"send_amount": 42, "destination_uuid": "dest", "usage": "text"}, "", source_wallet)
+        actual_result = unwrap(wallet.send)(
+            {"send_amount": 42, "destination_uuid": "dest", "usage": "text"}, "", source_wallet
+        )
 
         self.assertEqual(expected_result, actual_result)
-        update_miner_patch.assert_called_with(source_wallet)
-        self.assertEqual(100 - 42, source_wallet.amount)
-        self.assertEqual(50 + 42, dest_wallet.amount)
-        mock.wrapper.session.commit.assert_called_with()
-        transaction_patch.create.assert_called_with(source_wallet.source_uuid, 42, "dest", "text", origin=0)
+        transfer_patch.assert_called_with(source_wallet, "dest", 42, "text", None)
+        self.query_wallet.get.assert_called_with("dest")
         self.assertFalse(expected_calls)
 
+    @patch("resources.wallet.transfer")
+    def test__user_endpoint__send__repeated(self, transfer_patch):
+        source_wallet = mock.MagicMock()
+        self.idempotency.lookup.return_value = success_scheme
+
+        expected_result = success_scheme
+        actual_result = unwrap(wallet.send)(
+            {"send_amount": 42, "destination_uuid": "dest", "usage": "text", "idempotency_key": "retry"},
+            "",
+            source_wallet,
+        )
+
+        self.assertEqual(expected_result, actual_result)
+        self.idempotency.lookup.assert_called_with(source_wallet.source_uuid, "send", "retry")
+        transfer_patch.assert_not_called()
+        self.dispatcher.notify.assert_not_called()
+
+    @patch("resources.wallet.transfer")
+    def test__user_endpoint__send__invalid_idempotency_key(self, transfer_patch):
+        self.idempotency.valid.return_value = False
+
+        expected_result = invalid_idempotency_key
+        actual_result = unwrap(wallet.send)(
+            {"send_amount": 42, "destination_uuid": "dest", "usage": "text", "idempotency_key": 42},
+            "",
+            mock.MagicMock(),
+        )
+
+        self.assertEqual(expected_result, actual_result)
+        self.idempotency.valid.assert_called_with(42)
+        transfer_patch.assert_not_called()
+
     def test__user_endpoint__reset__permission_denied(self):
         test_wallet = mock.MagicMock()
         test_wallet.user_uuid = "the-user"
 
         expected_result = permission_denied
-        actual_result = wallet.reset({}, "wrong-user", test_wallet)
+        actual_result = unwrap(wallet.reset)({}, "wrong-user", test_wallet)
 
         self.assertEqual(expected_result, actual_result)
 
-    def test__user_endpoint__reset__successful(self):
+    @patch("resources.wallet.invalidate_wallet")
+    def test__user_endpoint__reset__successful(self, invalidate_wallet_patch):
         test_wallet = mock.MagicMock()
         test_wallet.user_uuid = "the-user"
 
         expected_result = success_scheme
-        actual_result = wallet.reset({}, "the-user", test_wallet)
+        actual_result = unwrap(wallet.reset)({}, "the-user", test_wallet)
 
         self.assertEqual(expected_result, actual_result)
         mock.m.contact_microservice.assert_called_with(
@@ -173,12 +439,14 @@ class TestWallet(TestCase):
         )
         mock.wrapper.session.delete.assert_called_with(test_wallet)
         mock.wrapper.session.commit.assert_called_with()
+        invalidate_wallet_patch.assert_called_with(test_wallet.source_uuid)
 
-    def test__user_endpoint__delete__successful(self):
+    @patch("resources.wallet.invalidate_wallet")
+    def test__user_endpoint__delete__successful(self, invalidate_wallet_patch):
         test_wallet = mock.MagicMock()
 
         expected_result = success_scheme
-        actual_result = wallet.delete({}, test_wallet.user_uuid, test_wallet)
+        actual_result = unwrap(wallet.delete)({}, test_wallet.user_uuid, test_wallet)
 
         self.assertEqual(expected_result, actual_result)
         mock.m.contact_microservice.assert_called_with(
@@ -186,52 +454,73 @@ class TestWallet(TestCase):
         )
         mock.wrapper.session.delete.assert_called_with(test_wallet)
         mock.wrapper.session.commit.assert_called_with()
+        invalidate_wallet_patch.assert_called_with(test_wallet.source_uuid)
 
-    def test__ms_endpoint__exists__not_found(self):
-        self.query_wallet.filter_by().first.return_value = None
+    @patch("resources.wallet.get_wallet_info")
+    def test__ms_endpoint__exists__not_found(self, get_wallet_info_patch):
+        get_wallet_info_patch.return_value = None
 
         expected_result = {"exists": False}
         actual_result = wallet.exists({"source_uuid": "the-source"}, "")
 
         self.assertEqual(expected_result, actual_result)
-        self.query_wallet.filter_by.assert_called_with(source_uuid="the-source")
-        self.query_wallet.filter_by().first.assert_called_with()
+        get_wallet_info_patch.assert_called_with("the-source")
 
-    def test__ms_endpoint__exists__successful(self):
-        self.query_wallet.filter_by().first.return_value = "wallet"
+    @patch("resources.wallet.get_wallet_info")
+    def test__ms_endpoint__exists__successful(self, get_wallet_info_patch):
+        get_wallet_info_patch.return_value = WalletInfo("the-user", "key")
 
         expected_result = {"exists": True}
         actual_result = wallet.exists({"source_uuid": "the-source"}, "")
 
         self.assertEqual(expected_result, actual_result)
-        self.query_wallet.filter_by.assert_called_with(source_uuid="the-source")
-        self.query_wallet.filter_by().first.assert_called_with()
+        get_wallet_info_patch.assert_called_with("the-source")
 
-    def test__ms_endpoint__owner__does_not_exist(self):
-        self.query_wallet.filter_by().first.return_value = None
+    @patch("resources.wallet.get_wallet_info")
+    def test__ms_endpoint__owner__does_not_exist(self, get_wallet_info_patch):
+        get_wallet_info_patch.return_value = None
 
         expected_result = unknown_source_or_destination
         actual_result = wallet.owner({"source_uuid": "the-source"}, "")
 
         self.assertEqual(expected_result, actual_result)
-        self.query_wallet.filter_by.assert_called_with(source_uuid="the-source")
-        self.query_wallet.filter_by().first.assert_called_with()
+        get_wallet_info_patch.assert_called_with("the-source")
 
-    def test__ms_endpoint__owner__successful(self):
-        mock_wallet = self.query_wallet.filter_by().first.return_value = mock.MagicMock()
+    @patch("resources.wallet.get_wallet_info")
+    def test__ms_endpoint__owner__successful(self, get_wallet_info_patch):
+        get_wallet_info_patch.return_value = WalletInfo("the-user", "key")
 
-        expected_result = {"owner": mock_wallet.user_uuid}
+        expected_result = {"owner": "the-user"}
         actual_result = wallet.owner({"source_uuid": "the-source"}, "")
 
         self.assertEqual(expected_result, actual_result)
-        self.query_wallet.filter_by.assert_called_with(source_uuid="the-source")
-        self.query_wallet.filter_by().first.assert_called_with()
+        get_wallet_info_patch.assert_called_with("the-source")
+
+    @patch("resources.wallet.get_wallet_infos")
+    def test__ms_endpoint__exists_many(self, get_wallet_infos_patch):
+        get_wallet_infos_patch.return_value = {"a": WalletInfo("user-a", "key-a")}
+
+        expected_result = {"exists": {"a": True, "b": False}}
+        actual_result = wallet.exists_many({"source_uuids": ["a", "b"]}, "")
+
+        self.assertEqual(expected_result, actual_result)
+        get_wallet_infos_patch.assert_called_with(["a", "b"])
+
+    @patch("resources.wallet.get_wallet_infos")
+    def test__ms_endpoint__owner_many(self, get_wallet_infos_patch):
+        get_wallet_infos_patch.return_value = {"a": WalletInfo("user-a", "key-a")}
+
+        expected_result = {"owners": {"a": {"owner": "user-a"}, "b": unknown_source_or_destination}}
+        actual_result = wallet.owner_many({"source_uuids": ["a", "b"]}, "")
+
+        self.assertEqual(expected_result, actual_result)
+        get_wallet_infos_patch.assert_called_with(["a", "b"])
 
     def test__ms_endpoint__put__unknown_wallet(self):
         self.query_wallet.filter_by().first.return_value = None
 
         expected_result = unknown_source_or_destination
-        actual_result = wallet.put({"destination_uuid": "destination", "amount": 42}, "")
+        actual_result = wallet.put({"destination_uuid": "destination", "amount": 42, "create_transaction": False}, "")
 
         self.assertEqual(expected_result, actual_result)
         self.query_wallet.filter_by.assert_called_with(source_uuid="destination")
@@ -251,7 +540,7 @@ class TestWallet(TestCase):
         self.query_wallet.filter_by().first.assert_called_with()
         self.assertEqual(1337, test_wallet.amount)
         mock.wrapper.session.commit.assert_called_with()
-        mock.m.contact_user.assert_called_with(
+        self.dispatcher.notify.assert_called_with(
             test_wallet.user_uuid,
             {
                 "notify-id": "incoming-transaction",
@@ -286,7 +575,7 @@ class TestWallet(TestCase):
         self.query_wallet.filter_by().first.assert_called_with()
         self.assertEqual(1337, test_wallet.amount)
         mock.wrapper.session.commit.assert_called_with()
-        mock.m.contact_user.assert_called_with(
+        self.dispatcher.notify.assert_called_with(
             test_wallet.user_uuid,
             {
                 "notify-id": "incoming-transaction",
@@ -295,32 +584,161 @@ class TestWallet(TestCase):
                 "new_amount": 1337,
             },
         )
-        transaction_patch.create.assert_called_with("source", 42, "destination", "the usage", 13)
+        transaction_patch.create.assert_called_with("source", 42, "destination", "the usage", 13, commit=False)
+        self.idempotency.record.assert_called_with("destination", "put", None, expected_result)
+
+    def test__ms_endpoint__put__repeated(self):
+        self.idempotency.lookup.return_value = {"id": 42}
+
+        expected_result = {"id": 42}
+        actual_result = wallet.put(
+            {
+                "source_uuid": SOURCE_UUID,
+                "destination_uuid": "destination",
+                "amount": 42,
+                "create_transaction": True,
+                "idempotency_key": "k",
+            },
+            "",
+        )
+
+        self.assertEqual(expected_result, actual_result)
+        self.idempotency.lookup.assert_called_with("destination", "put", "k")
+        self.query_wallet.filter_by.assert_not_called()
+        self.idempotency.record.assert_not_called()
+        self.dispatcher.notify.assert_not_called()
+
+    @patch("resources.wallet.storable_uuid")
+    def test__ms_endpoint__put__source_not_storable(self, storable_uuid_patch):
+        storable_uuid_patch.return_value = False
+
+        expected_result = unknown_source_or_destination
+        actual_result = wallet.put(
+            {
+                "destination_uuid": "destination",
+                "amount": 42,
+                "create_transaction": True,
+                "source_uuid": "source",
+                "usage": "the usage",
+                "origin": 13,
+            },
+            "",
+        )
+
+        self.assertEqual(expected_result, actual_result)
+        storable_uuid_patch.assert_called_with("source")
+        self.query_wallet.filter_by.assert_not_called()
+        self.idempotency.record.assert_not_called()
+
+    @patch("resources.wallet.Transaction")
+    @patch("resources.wallet.lock_wallets")
+    def test__ms_endpoint__put_batch(self, lock_wallets_patch, transaction_patch):
+        wallet_a = mock.MagicMock()
+        wallet_a.source_uuid = "a"
+        wallet_a.amount = 10
+        lock_wallets_patch.return_value = {"a": wallet_a}
+
+        expected_result = {"results": [success_scheme, unknown_source_or_destination, success_scheme]}
+        actual_result = wallet.put_batch(
+            {
+                "source_uuid": "shop",
+                "create_transaction": True,
+                "items": [
+                    {"destination_uuid": "a", "amount": 5, "usage": "first", "origin": 1},
+                    {"destination_uuid": "b", "amount": 7, "usage": "second", "origin": 1},
+                    {"destination_uuid": "a", "amount": 3, "usage": "third", "origin": 2},
+                ],
+            },
+            "",
+        )
+
+        self.assertEqual(expected_result, actual_result)
+        lock_wallets_patch.assert_called_with("a", "b", "a")
+        self.assertEqual(18, wallet_a.amount)
+        transaction_patch.create_many.assert_called_with(
+            [
+                {"source_uuid": "shop", "send_amount": 5, "destination_uuid": "a", "usage": "first", "origin": 1},
+                {"source_uuid": "shop", "send_amount": 3, "destination_uuid": "a", "usage": "third", "origin": 2},
+            ]
+        )
+        mock.wrapper.session.commit.assert_called_with()
+        self.dispatcher.notify.assert_called_once_with(
+            wallet_a.user_uuid,
+            {"notify-id": "incoming-transaction", "origin": "put", "wallet_uuid": "a", "new_amount": 18},
+        )
+
+    @patch("resources.wallet.Transaction")
+    @patch("resources.wallet.lock_wallets")
+    def test__ms_endpoint__put_batch__without_transaction(self, lock_wallets_patch, transaction_patch):
+        wallet_a = mock.MagicMock()
+        wallet_a.amount = 10
+        lock_wallets_patch.return_value = {"a": wallet_a}
+
+        expected_result = {"results": [success_scheme]}
+        actual_result = wallet.put_batch(
+            {"create_transaction": False, "items": [{"destination_uuid": "a", "amount": 5}]}, ""
+        )
+
+        self.assertEqual(expected_result, actual_result)
+        self.assertEqual(15, wallet_a.amount)
+        transaction_patch.create_many.assert_not_called()
+        mock.wrapper.session.commit.assert_called_with()
+
+    @patch("resources.wallet.storable_uuid")
+    @patch("resources.wallet.lock_wallets")
+    def test__ms_endpoint__put_batch__source_not_storable(self, lock_wallets_patch, storable_uuid_patch):
+        storable_uuid_patch.return_value = False
+
+        expected_result = unknown_source_or_destination
+        actual_result = wallet.put_batch(
+            {
+                "source_uuid": "shop",
+                "create_transaction": True,
+                "items": [{"destination_uuid": "a", "amount": 5, "usage": "first", "origin": 1}],
+            },
+            "",
+        )
+
+        self.assertEqual(expected_result, actual_result)
+        storable_uuid_patch.assert_called_with("shop")
+        lock_wallets_patch.assert_not_called()
 
     @patch("resources.wallet.update_miner")
     def test__ms_endpoint__dump__not_enough_coins(self, update_miner_patch):
         test_wallet = mock.MagicMock()
-        test_wallet.amount = 10
+        test_wallet.amount = 2000
+        update_miner_patch.return_value.amount = 10
 
         expected_result = not_enough_coins
-        actual_result = wallet.dump({"amount": 1337}, "", test_wallet)
+        actual_result = unwrap(wallet.dump)({"amount": 1337, "create_transaction": False}, "", test_wallet)
 
         self.assertEqual(expected_result, actual_result)
         update_miner_patch.assert_called_with(test_wallet)
+        mock.wrapper.session.commit.assert_called_with()
+
+    @patch("resources.wallet.update_miner")
+    def test__ms_endpoint__dump__deleted(self, update_miner_patch):
+        update_miner_patch.return_value = None
+
+        self.assertEqual(
+            unknown_source_or_destination,
+            unwrap(wallet.dump)({"amount": 1337, "create_transaction": False}, "", mock.MagicMock()),
+        )
+        mock.wrapper.session.commit.assert_called_with()
 
     @patch("resources.wallet.update_miner")
     def test__ms_endpoint__dump__without_transaction(self, update_miner_patch):
-        test_wallet = mock.MagicMock()
+        test_wallet = update_miner_patch.return_value = mock.MagicMock()
         test_wallet.amount = 1379
 
         expected_result = success_scheme
-        actual_result = wallet.dump({"amount": 1337, "create_transaction": False}, "", test_wallet)
+        actual_result = unwrap(wallet.dump)({"amount": 1337, "create_transaction": False}, "", test_wallet)
 
         self.assertEqual(expected_result, actual_result)
         update_miner_patch.assert_called_with(test_wallet)
         self.assertEqual(42, test_wallet.amount)
         mock.wrapper.session.commit.assert_called_with()
-        mock.m.contact_user.assert_called_with(
+        self.dispatcher.notify.assert_called_with(
             test_wallet.user_uuid,
             {
                 "notify-id": "outgoing-transaction",
@@ -333,11 +751,11 @@ class TestWallet(TestCase):
     @patch("resources.wallet.Transaction")
     @patch("resources.wallet.update_miner")
     def test__ms_endpoint__dump__with_transaction(self, update_miner_patch, transaction_patch):
-        test_wallet = mock.MagicMock()
+        test_wallet = update_miner_patch.return_value = mock.MagicMock()
         test_wallet.amount = 1379
 
         expected_result = transaction_patch.create().serialize
-        actual_result = wallet.dump(
+        actual_result = unwrap(wallet.dump)(
             {
                 "amount": 1337,
                 "create_transaction": True,
@@ -353,7 +771,7 @@ class TestWallet(TestCase):
         update_miner_patch.assert_called_with(test_wallet)
         self.assertEqual(42, test_wallet.amount)
         mock.wrapper.session.commit.assert_called_with()
-        mock.m.contact_user.assert_called_with(
+        self.dispatcher.notify.assert_called_with(
             test_wallet.user_uuid,
             {
                 "notify-id": "outgoing-transaction",
@@ -362,11 +780,115 @@ class TestWallet(TestCase):
                 "new_amount": 42,
             },
         )
-        transaction_patch.create.assert_called_with(test_wallet.source_uuid, 1337, "dest", "the usage", 11)
+        transaction_patch.create.assert_called_with(
+            test_wallet.source_uuid, 1337, "dest", "the usage", 11, commit=False
+        )
+        self.idempotency.record.assert_called_with(test_wallet.source_uuid, "dump", None, expected_result)
+
+    @patch("resources.wallet.storable_uuid")
+    @patch("resources.wallet.update_miner")
+    def test__ms_endpoint__dump__destination_not_storable(self, update_miner_patch, storable_uuid_patch):
+        test_wallet = mock.MagicMock()
+        test_wallet.amount = 1379
+        storable_uuid_patch.return_value = False
+
+        expected_result = unknown_source_or_destination
+        actual_result = unwrap(wallet.dump)(
+            {
+                "amount": 1337,
+                "create_transaction": True,
+                "destination_uuid": "dest",
+                "usage": "the usage",
+                "origin": 11,
+            },
+            "",
+            test_wallet,
+        )
 
-    def test__ms_endpoint__delete_user(self):
+        self.assertEqual(expected_result, actual_result)
+        storable_uuid_patch.assert_called_with("dest")
+        self.assertEqual(1379, test_wallet.amount)
+        update_miner_patch.assert_not_called()
+
+    @patch("resources.wallet.update_miner")
+    def test__ms_endpoint__dump__repeated(self, update_miner_patch):
+        test_wallet = mock.MagicMock()
+        test_wallet.amount = 1379
+        self.idempotency.lookup.return_value = success_scheme
+
+        expected_result = success_scheme
+        actual_result = unwrap(wallet.dump)(
+            {"amount": 1337, "create_transaction": False, "idempotency_key": "k"}, "", test_wallet
+        )
+
+        self.assertEqual(expected_result, actual_result)
+        self.idempotency.lookup.assert_called_with(test_wallet.source_uuid, "dump", "k")
+        self.assertEqual(1379, test_wallet.amount)
+        update_miner_patch.assert_not_called()
+
+    @patch("resources.wallet.collector")
+    @patch("resources.wallet.lock_wallets")
+    def test__ms_endpoint__miner_rate__unknown_wallet(self, lock_wallets_patch, collector_patch):
+        lock_wallets_patch.return_value = {}
+
+        expected_result = unknown_source_or_destination
+        actual_result = wallet.miner_rate({"wallet_uuid": "wallet", "rate": 0.5}, "service")
+
+        self.assertEqual(expected_result, actual_result)
+        collector_patch.set_rate.assert_not_called()
+
+    @patch("resources.wallet.collector")
+    @patch("resources.wallet.lock_wallets")
+    def test__ms_endpoint__miner_rate__successful(self, lock_wallets_patch, collector_patch):
+        test_wallet = mock.MagicMock()
+        lock_wallets_patch.return_value = {"wallet": test_wallet}
+
+        expected_result = success_scheme
+        actual_result = wallet.miner_rate({"wallet_uuid": "wallet", "rate": 0.5}, "service")
+
+        self.assertEqual(expected_result, actual_result)
+        lock_wallets_patch.assert_called_with("wallet")
+        collector_patch.set_rate.assert_called_with(test_wallet, 0.5)
+        mock.wrapper.session.commit.assert_called_with()
+
+    @patch("resources.wallet.invalidate_user")
+    def test__ms_endpoint__delete_user(self, invalidate_user_patch):
         self.assertEqual(success_scheme, wallet.delete_user({"user_uuid": "the-user"}, "server"))
 
         self.query_wallet.filter_by.assert_called_with(user_uuid="the-user")
         self.query_wallet.filter_by().delete.assert_called_with()
         mock.wrapper.session.commit.assert_called_with()
+        invalidate_user_patch.assert_called_with("the-user")
+
+    @patch("resources.wallet.metrics")
+    @patch("resources.wallet.wallet_locks")
+    @patch("resources.wallet.limiter")
+    @patch("resources.wallet.unknown_wallets")
+    @patch("resources.wallet.wallet_cache")
+    @patch("resources.wallet.collector")
+    def test__ms_endpoint__metrics(
+        self,
+        collector_patch,
+        wallet_cache_patch,
+        unknown_wallets_patch,
+        limiter_patch,
+        wallet_locks_patch,
+        metrics_patch,
+    ):
+        wallet_locks_patch.stats.return_value = {"contended": 2}
+        wallet_locks_patch.hottest.return_value = [("hot", 1.5)]
+
+        expected_result = {"metrics": metrics_patch.export()}
+        actual_result = wallet.export_metrics({}, "server")
+
+        self.assertEqual(expected_result, actual_result)
+        metrics_patch.export.assert_called_with(
+            {
+                "miner": collector_patch.stats(),
+                "wallet_cache": wallet_cache_patch.stats(),
+                "unknown_wallets": unknown_wallets_patch.stats(),
+                "rate_limit": limiter_patch.stats(),
+                "notifications": self.dispatcher.stats(),
+                "wallet_locks": {"contended": 2, "hottest_wait_seconds": {"hot": 1.5}},
+            }
+        )
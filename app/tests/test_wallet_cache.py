@@ -0,0 +1,96 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from mock.mock_loader import mock
+from models.wallet import Wallet
+from utils import wallet_cache
+from utils.wallet_cache import WalletInfo
+
+
+class TestWalletCache(TestCase):
+    def setUp(self):
+        mock.reset_mocks()
+        wallet_cache.wallet_cache.clear()
+        wallet_cache.unknown_wallets.clear()
+
+        self.query_wallet = mock.MagicMock()
+        self.query_wallets = mock.MagicMock()
+        queries = {(Wallet.user_uuid, Wallet.key): self.query_wallet}
+        mock.wrapper.session.query.side_effect = lambda *columns: queries[columns]
+
+    def test__get_wallet_info__unknown(self):
+        self.query_wallet.filter_by().first.return_value = None
+
+        self.assertIsNone(wallet_cache.get_wallet_info("source"))
+        self.query_wallet.filter_by.assert_called_with(source_uuid="source")
+        self.assertEqual(0, len(wallet_cache.wallet_cache))
+        self.assertTrue(wallet_cache.is_unknown("source"))
+
+    def test__get_wallet_info__unknown_cached(self):
+        wallet_cache.remember_unknown("source")
+
+        self.assertIsNone(wallet_cache.get_wallet_info("source"))
+        self.query_wallet.filter_by.assert_not_called()
+
+    def test__get_wallet_info__read_through(self):
+        self.query_wallet.filter_by().first.return_value = ("user", "key")
+        self.query_wallet.filter_by.reset_mock()
+
+        self.assertEqual(WalletInfo("user", "key"), wallet_cache.get_wallet_info("source"))
+        self.assertEqual(WalletInfo("user", "key"), wallet_cache.get_wallet_info("source"))
+        self.query_wallet.filter_by.assert_called_once_with(source_uuid="source")
+
+    @patch("utils.wallet_cache.Wallet.source_uuid")
+    def test__get_wallet_infos(self, source_uuid_patch):
+        mock.wrapper.session.query.side_effect = lambda *columns: self.query_wallets
+        wallet_cache.wallet_cache.put("cached", WalletInfo("cached-user", "cached-key"))
+        self.query_wallets.filter.return_value = [("a", "user-a", "key-a")]
+
+        expected_result = {"cached": WalletInfo("cached-user", "cached-key"), "a": WalletInfo("user-a", "key-a")}
+        actual_result = wallet_cache.get_wallet_infos(["a", "cached", "unknown", "a"])
+
+        self.assertEqual(expected_result, actual_result)
+        source_uuid_patch.in_.assert_called_once_with(["a", "unknown"])
+        self.query_wallets.filter.assert_called_once_with(source_uuid_patch.in_())
+        self.assertEqual(WalletInfo("user-a", "key-a"), wallet_cache.wallet_cache.get("a"))
+        self.assertTrue(wallet_cache.is_unknown("unknown"))
+        self.assertFalse(wallet_cache.is_unknown("a"))
+
+    def test__get_wallet_infos__unknown_cached(self):
+        wallet_cache.remember_unknown("unknown")
+
+        self.assertEqual({}, wallet_cache.get_wallet_infos(["unknown"]))
+        self.query_wallets.filter.assert_not_called()
+
+    def test__get_wallet_infos__all_cached(self):
+        wallet_cache.wallet_cache.put("cached", WalletInfo("cached-user", "cached-key"))
+
+        self.assertEqual({"cached": WalletInfo("cached-user", "cached-key")}, wallet_cache.get_wallet_infos(["cached"]))
+        self.query_wallets.filter.assert_not_called()
+
+    def test__cache_wallet(self):
+        test_wallet = mock.MagicMock()
+        wallet_cache.remember_unknown(test_wallet.source_uuid)
+
+        wallet_cache.cache_wallet(test_wallet)
+
+        self.assertEqual(
+            WalletInfo(test_wallet.user_uuid, test_wallet.key), wallet_cache.get_wallet_info(test_wallet.source_uuid)
+        )
+        self.query_wallet.filter_by.assert_not_called()
+
+    def test__invalidate_wallet(self):
+        wallet_cache.wallet_cache.put("source", WalletInfo("user", "key"))
+
+        wallet_cache.invalidate_wallet("source")
+
+        self.assertIsNone(wallet_cache.wallet_cache.get("source"))
+
+    def test__invalidate_user(self):
+        wallet_cache.wallet_cache.put("a", WalletInfo("user", "key"))
+        wallet_cache.wallet_cache.put("b", WalletInfo("other", "key"))
+
+        wallet_cache.invalidate_user("user")
+
+        self.assertIsNone(wallet_cache.wallet_cache.get("a"))
+        self.assertEqual(WalletInfo("other", "key"), wallet_cache.wallet_cache.get("b"))
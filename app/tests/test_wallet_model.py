@@ -13,13 +13,18 @@ class TestWalletModel(TestCase):
     def test__model__wallet__structure(self):
         self.assertEqual("currency_wallet", Wallet.__tablename__)
         self.assertTrue(issubclass(Wallet, mock.wrapper.Base))
-        for col in ["time_stamp", "source_uuid", "key", "amount", "user_uuid"]:
+        for col in ["time_stamp", "source_uuid", "key", "amount", "user_uuid", "transaction_count"]:
             self.assertIn(col, dir(Wallet))
 
     def test__model__wallet__serialize(self):
         time_stamp = datetime.datetime.fromtimestamp(12345678)
         wallet = Wallet(
-            time_stamp=time_stamp, source_uuid="source uuid", key="the key!", amount=99999, user_uuid="foobar"
+            time_stamp=time_stamp,
+            source_uuid="source uuid",
+            key="the key!",
+            amount=99999,
+            user_uuid="foobar",
+            transaction_count=42,
         )
 
         expected_result = {
@@ -36,12 +41,23 @@ class TestWalletModel(TestCase):
         serialized["key"] = "not the real key"
         self.assertEqual(expected_result, wallet.serialize)
 
+    def test__model__wallet__pending_coins(self):
+        settled = datetime.datetime(2020, 1, 1, 12)
+        now = settled + datetime.timedelta(seconds=10)
+
+        self.assertEqual(5, Wallet(mining_rate=0.5, mining_settled=settled).pending_coins(now))
+        self.assertEqual(4, Wallet(mining_rate=0.49, mining_settled=settled).pending_coins(now))
+        self.assertEqual(0, Wallet(mining_rate=0, mining_settled=settled).pending_coins(now))
+        self.assertEqual(0, Wallet(mining_rate=0.5, mining_settled=None).pending_coins(now))
+        self.assertEqual(0, Wallet(mining_rate=0.5, mining_settled=now).pending_coins(settled))
+
     def test__model__wallet__create(self):
         now = datetime.datetime.now()
         actual_result = Wallet.create("the-user-uuid")
 
         self.assertEqual("the-user-uuid", actual_result.user_uuid)
         self.assertEqual(0, actual_result.amount)
+        self.assertEqual(0, actual_result.transaction_count)
         self.assertRegex(actual_result.source_uuid, r"[0-9a-f]{8}(-[0-9a-f]{4}){3}-[0-9a-f]{12}")
         self.assertRegex(actual_result.key, r"[0-9a-f]{10}")
         self.assertLess(abs((actual_result.time_stamp - now).total_seconds()), 0.01)
@@ -53,21 +69,27 @@ class TestWalletModel(TestCase):
         second_element = Wallet.create("user-uuid").source_uuid
         self.assertNotEqual(first_element, second_element)
 
+    def test__model__wallet__check_key(self):
+        self.assertTrue(Wallet.check_key("0123456789", "0123456789"))
+        self.assertFalse(Wallet.check_key("0123456789", "012345678a"))
+        self.assertFalse(Wallet.check_key("0123456789", "01234"))
+        self.assertFalse(Wallet.check_key(None, "0123456789"))
+        self.assertFalse(Wallet.check_key("0123456789", None))
+
+    @patch("models.wallet.Wallet.key")
+    def test__model__wallet__auth_user(self, key_patch):
+        query_wallet = mock.MagicMock()
+        mock.wrapper.session.query.side_effect = {key_patch: query_wallet}.__getitem__
+        query_wallet.filter_by().first.return_value = ("s3cr3t",)
+
+        self.assertTrue(Wallet.auth_user("source", "s3cr3t"))
+        self.assertFalse(Wallet.auth_user("source", "wrong"))
+        query_wallet.filter_by.assert_called_with(source_uuid="source")
+
     @patch("models.wallet.Wallet.key")
-    @patch("models.wallet.Wallet.source_uuid")
-    def test__model__wallet__auth_user(self, source_uuid_patch, key_patch):
+    def test__model__wallet__auth_user__unknown(self, key_patch):
         query_wallet = mock.MagicMock()
-        default = mock.MagicMock()
-        mock.wrapper.session.query.side_effect = lambda a: {Wallet: query_wallet}.get(a, default)
-        query_wallet.filter().exists.return_value = "exists?"
-        source_uuid_patch.__eq__.return_value = "source-eq"
-        key_patch.__eq__.return_value = "key-eq"
-
-        expected_result = default.scalar()
-        actual_result = Wallet.auth_user("source", "key")
-
-        self.assertEqual(expected_result, actual_result)
-        source_uuid_patch.__eq__.assert_called_with("source")
-        key_patch.__eq__.assert_called_with("key")
-        query_wallet.filter.assert_called_with("source-eq", "key-eq")
-        mock.wrapper.session.query.assert_called_with("exists?")
+        mock.wrapper.session.query.side_effect = {key_patch: query_wallet}.__getitem__
+        query_wallet.filter_by().first.return_value = None
+
+        self.assertFalse(Wallet.auth_user("source", "s3cr3t"))
@@ -0,0 +1,110 @@
+import threading
+from unittest import TestCase
+from unittest.mock import patch
+
+from utils.locks import StripedLockManager
+from utils.workers import WorkerPool
+
+
+class TestWorkers(TestCase):
+    def setUp(self):
+        self.locks = StripedLockManager(16)
+        self.pool = WorkerPool(2, self.locks)
+
+    def run_thread(self, target, *args) -> threading.Thread:
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        return thread
+
+    def test__wallets(self):
+        with self.pool.wallets("a", "b"):
+            pass
+
+        self.assertEqual(2 if self.locks.stripe("a") != self.locks.stripe("b") else 1, self.locks.acquisitions)
+
+    def test__endpoint(self):
+        @self.pool.endpoint("source_uuid", "destination_uuid")
+        def endpoint(data: dict, user: str) -> dict:
+            return {"data": data, "user": user}
+
+        with patch.object(self.pool, "wallets", wraps=self.pool.wallets) as wallets_patch:
+            actual_result = endpoint({"source_uuid": "b"}, "user")
+
+        self.assertEqual({"data": {"source_uuid": "b"}, "user": "user"}, actual_result)
+        self.assertEqual("endpoint", endpoint.__name__)
+        wallets_patch.assert_called_with("b", None)
+
+    def test__endpoint__wallets_of_data(self):
+        @self.pool.endpoint("source_uuid", wallets=lambda data: data["items"])
+        def endpoint(data: dict, user: str):
+            pass
+
+        with patch.object(self.pool, "wallets", wraps=self.pool.wallets) as wallets_patch:
+            endpoint({"source_uuid": "a", "items": ["b", "c"]}, "user")
+
+        wallets_patch.assert_called_with("a", "b", "c")
+
+    def test__endpoint__wallets_of_data_before_slot(self):
+        # a request that holds a wallet lock and waits for the only slot must not block a batch on the same wallet
+        pool = WorkerPool(1, self.locks)
+        calls = []
+
+        @pool.endpoint(wallets=lambda data: data["items"])
+        def batch(data: dict, user: str):
+            calls.append("batch")
+
+        @pool.endpoint()
+        def other(data: dict, user: str):
+            calls.append("other")
+
+        def hold_wallet():
+            with pool.wallets("x"):
+                batch_thread = self.run_thread(batch, {"items": ["x"]}, "microservice")
+                batch_thread.join(0.1)
+                other({}, "user")
+            batch_thread.join(1)
+
+        self.run_thread(hold_wallet).join(2)
+
+        self.assertEqual(["other", "batch"], calls)
+
+    def test__endpoint__limits_workers(self):
+        release = threading.Event()
+        running = threading.Semaphore(0)
+
+        @self.pool.endpoint()
+        def endpoint(data: dict, user: str):
+            running.release()
+            release.wait(1)
+
+        threads = [self.run_thread(endpoint, {}, "user") for _ in range(3)]
+        self.assertTrue(running.acquire(timeout=1))
+        self.assertTrue(running.acquire(timeout=1))
+        self.assertFalse(running.acquire(timeout=0.1))
+
+        release.set()
+        self.assertTrue(running.acquire(timeout=1))
+        for thread in threads:
+            thread.join(1)
+
+    def test__endpoint__busy_wallet_does_not_take_slots(self):
+        release = threading.Event()
+        running = threading.Semaphore(0)
+        other = next(str(i) for i in range(100) if self.locks.stripe(str(i)) != self.locks.stripe("hot"))
+
+        @self.pool.endpoint("source_uuid")
+        def endpoint(data: dict, user: str):
+            running.release()
+            if data["source_uuid"] == "hot":
+                release.wait(1)
+
+        threads = [self.run_thread(endpoint, {"source_uuid": "hot"}, "user") for _ in range(3)]
+        self.assertTrue(running.acquire(timeout=1))
+
+        threads.append(self.run_thread(endpoint, {"source_uuid": other}, "user"))
+        self.assertTrue(running.acquire(timeout=0.5))
+        self.assertFalse(running.acquire(timeout=0.1))
+
+        release.set()
+        for thread in threads:
+            thread.join(1)
@@ -0,0 +1,21 @@
+import datetime
+from argparse import ArgumentParser
+
+from app import wrapper
+from models.transaction import Transaction, TransactionArchive
+
+
+def main():
+    parser: ArgumentParser = ArgumentParser(description="Move old transactions to the archive table.")
+    parser.add_argument("--keep-days", type=int, default=90, help="days of transactions to keep (default: 90)")
+    parser.add_argument("--batch-size", type=int, default=10000, help="transactions per commit (default: 10000)")
+    args = parser.parse_args()
+
+    wrapper.Base.metadata.create_all(bind=wrapper.engine, tables=[TransactionArchive.__table__])
+
+    before: datetime.datetime = datetime.datetime.now() - datetime.timedelta(days=args.keep_days)
+    print(f"archived {Transaction.archive(before, args.batch_size)} transactions older than {before}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+import datetime
+from argparse import ArgumentParser
+
+from app import wrapper
+from models.ledger import LedgerEntry, BalanceSnapshot
+
+
+def main():
+    parser: ArgumentParser = ArgumentParser(description="Fold old ledger entries into balance snapshots.")
+    parser.add_argument("--keep-days", type=int, default=7, help="days of ledger entries to keep (default: 7)")
+    args = parser.parse_args()
+
+    wrapper.Base.metadata.create_all(bind=wrapper.engine, tables=[LedgerEntry.__table__, BalanceSnapshot.__table__])
+
+    before: datetime.datetime = datetime.datetime.now() - datetime.timedelta(days=args.keep_days)
+    print(f"folded {BalanceSnapshot.compact(before)} ledger entries older than {before}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+from typing import List, Tuple
+
+from sqlalchemy import Column, inspect
+from sqlalchemy.engine.reflection import Inspector
+
+from app import wrapper
+from models.types import UUIDType, HexKey
+
+UUID_PATTERN: str = "^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$"
+KEY_PATTERN: str = "^([0-9a-fA-F]{2})+$"
+
+
+def text_columns(inspector: Inspector) -> List[Tuple[Column, str, int]]:
+    """
+    :return: the uuid and key columns that are still stored as text with their value pattern and binary size
+    """
+
+    import resources.wallet  # noqa: F401
+
+    columns: List[Tuple[Column, str, int]] = []
+    for table in wrapper.Base.metadata.sorted_tables:
+        existing: dict = {column["name"]: column["type"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing or "CHAR" not in str(existing[column.name]).upper():
+                continue
+            if isinstance(column.type, UUIDType):
+                columns.append((column, UUID_PATTERN, 16))
+            elif isinstance(column.type, HexKey):
+                columns.append((column, KEY_PATTERN, column.type.size))
+
+    return columns
+
+
+def convert() -> List[str]:
+    """
+    Converts all uuid and key columns of a MySQL database from text to binary storage.
+    Every column is first changed to VARBINARY, which keeps its text bytes, then the text is unhexed in place
+    and the column is changed to BINARY, so that the indexes on the column stay intact.
+    :return: description of the applied changes
+    """
+
+    if wrapper.engine.dialect.name != "mysql":
+        raise SystemExit("the conversion is only implemented for MySQL")
+
+    quote = wrapper.engine.dialect.identifier_preparer.quote
+    columns: List[Tuple[Column, str, int]] = text_columns(inspect(wrapper.engine))
+    for column, pattern, _ in columns:
+        table, name = quote(column.table.name), quote(column.name)
+        invalid: int = wrapper.engine.execute(
+            f"SELECT COUNT(*) FROM {table} WHERE {name} NOT REGEXP '{pattern}'"
+        ).scalar()
+        if invalid:
+            raise SystemExit(f"{column.table.name}.{column.name} contains {invalid} values that cannot be converted")
+
+    changes: List[str] = []
+    for column, _, size in columns:
+        table, name = quote(column.table.name), quote(column.name)
+        null: str = "NULL" if column.nullable and not column.primary_key else "NOT NULL"
+        wrapper.engine.execute(f"ALTER TABLE {table} MODIFY {name} VARBINARY(36) {null}")
+        wrapper.engine.execute(f"UPDATE {table} SET {name} = UNHEX(REPLACE({name}, '-', ''))")
+        wrapper.engine.execute(f"ALTER TABLE {table} MODIFY {name} BINARY({size}) {null}")
+        changes.append(f"converted {column.table.name}.{column.name} to BINARY({size})")
+
+    return changes
+
+
+def main():
+    for change in convert() or ["all uuid columns are stored as binary"]:
+        print(change)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import csv
+import datetime
+import json
+import sys
+from argparse import ArgumentParser
+from typing import List, Optional, Tuple, TextIO, Iterator
+
+from app import wrapper
+from models.transaction import Transaction
+from models.wallet import Wallet
+
+
+def encode_cursor(row: tuple) -> str:
+    return f"{row[1].isoformat()}/{row[0]}"
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, int]:
+    time_stamp, transaction_id = cursor.rsplit("/", 1)
+    return datetime.datetime.fromisoformat(time_stamp), int(transaction_id)
+
+
+def export(
+    output: TextIO,
+    output_format: str,
+    source_uuids: List[str],
+    since: Optional[datetime.datetime],
+    until: Optional[datetime.datetime],
+    cursor: Optional[str],
+    batch_size: int,
+) -> Iterator[str]:
+    """
+    Writes the transactions to `output` as newline delimited json or csv
+    and yields the cursor of every written transaction.
+    """
+
+    writer = csv.writer(output) if output_format == "csv" else None
+    if writer is not None and cursor is None:
+        writer.writerow(Transaction.serialized_columns)
+
+    after: Optional[Tuple[datetime.datetime, int]] = decode_cursor(cursor) if cursor else None
+    for row in Transaction.stream(source_uuids, since, until, after, batch_size):
+        if writer is not None:
+            writer.writerow(Transaction.serialize_row(row).values())
+        else:
+            output.write(json.dumps(Transaction.serialize_row(row)) + "\n")
+        yield encode_cursor(row)
+
+
+def main():
+    parser: ArgumentParser = ArgumentParser(description="Export transactions as newline delimited json or csv.")
+    parser.add_argument("--wallet", action="append", default=[], help="source_uuid of a wallet (repeatable)")
+    parser.add_argument("--user", help="export all wallets of this user_uuid")
+    parser.add_argument("--since", type=datetime.datetime.fromisoformat, help="first time stamp (inclusive)")
+    parser.add_argument("--until", type=datetime.datetime.fromisoformat, help="last time stamp (exclusive)")
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--cursor", help="resume behind the transaction of this cursor")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows fetched at once (default: 1000)")
+    args = parser.parse_args()
+
+    source_uuids: List[str] = list(args.wallet)
+    if args.user is not None:
+        source_uuids += [
+            source_uuid for source_uuid, in wrapper.session.query(Wallet.source_uuid).filter_by(user_uuid=args.user)
+        ]
+        if not source_uuids:
+            parser.error("the user has no wallet")
+
+    cursor: Optional[str] = args.cursor
+    try:
+        for cursor in export(
+            sys.stdout, args.format, source_uuids, args.since, args.until, args.cursor, args.batch_size
+        ):
+            pass
+    finally:
+        if cursor is not None:
+            print(f"cursor: {cursor}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
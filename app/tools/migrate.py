@@ -0,0 +1,56 @@
+from typing import List, Set
+
+from sqlalchemy import inspect, Table, Column
+from sqlalchemy.engine.reflection import Inspector
+from sqlalchemy.schema import CreateColumn
+
+from app import wrapper
+
+
+def missing_columns(inspector: Inspector, table: Table) -> List[Column]:
+    existing: Set[str] = {column["name"] for column in inspector.get_columns(table.name)}
+    return [column for column in table.columns if column.name not in existing]
+
+
+def missing_indexes(inspector: Inspector, table: Table) -> List:
+    existing: Set[str] = {index["name"] for index in inspector.get_indexes(table.name)}
+    return [index for index in table.indexes if index.name not in existing]
+
+
+def migrate() -> List[str]:
+    """
+    Brings an existing database up to date with the models: creates missing tables, columns and indexes.
+    :return: description of the applied changes
+    """
+
+    import resources.wallet  # noqa: F401
+
+    changes: List[str] = []
+    inspector: Inspector = inspect(wrapper.engine)
+    tables: Set[str] = set(inspector.get_table_names())
+
+    for table in wrapper.Base.metadata.sorted_tables:
+        if table.name not in tables:
+            table.create(bind=wrapper.engine)
+            changes.append(f"created table {table.name}")
+            continue
+
+        for column in missing_columns(inspector, table):
+            ddl: str = str(CreateColumn(column).compile(dialect=wrapper.engine.dialect))
+            wrapper.engine.execute(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+            changes.append(f"added column {column.name} to {table.name}")
+
+        for index in missing_indexes(inspector, table):
+            index.create(bind=wrapper.engine)
+            changes.append(f"created index {index.name} on {table.name}")
+
+    return changes
+
+
+def main():
+    for change in migrate() or ["database is up to date"]:
+        print(change)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+from models.transaction import Transaction
+
+
+def main():
+    print(f"rebuilt {Transaction.rebuild_rollups()} hourly rollups")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+from models.transaction import Transaction
+
+
+def main():
+    print(f"rebuilt the transaction counters of {Transaction.reconcile_transaction_counts()} wallets")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import threading
+import time
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from typing import List, Dict, Iterator, Optional, Tuple
+
+from config import WALLET_LOCK_STRIPES
+
+HOTTEST_WALLETS_TRACKED: int = 1000
+
+
+class StripedLockManager:
+    """
+    A fixed table of locks; every wallet is mapped to one of them by its source_uuid.
+    The table does not grow with the number of wallets, wallets that share a stripe are serialized together.
+    """
+
+    def __init__(self, stripes: int):
+        self._stripes: List[threading.RLock] = [threading.RLock() for _ in range(stripes)]
+        self._lock: threading.Lock = threading.Lock()
+        self.acquisitions: int = 0
+        self.contended: int = 0
+        self.wait_time: float = 0
+        self._wallet_wait_time: Counter = Counter()
+        self._local: threading.local = threading.local()
+
+    def stripe(self, source_uuid: str) -> int:
+        return zlib.crc32(source_uuid.encode()) % len(self._stripes)
+
+    @contextmanager
+    def hold(self, *source_uuids: Optional[str]) -> Iterator[None]:
+        """
+        Holds the stripes of the given wallets. Stripes are always acquired in ascending order,
+        so two callers that lock the same wallets in a different order cannot deadlock.
+        """
+
+        wallets_by_stripe: Dict[int, List[str]] = {}
+        for source_uuid in sorted({source_uuid for source_uuid in source_uuids if source_uuid is not None}):
+            wallets_by_stripe.setdefault(self.stripe(source_uuid), []).append(source_uuid)
+
+        acquired: List[threading.RLock] = []
+        outermost: bool = getattr(self._local, "extra", None) is None
+        if outermost:
+            self._local.extra = []
+        try:
+            for stripe, wallets in sorted(wallets_by_stripe.items()):
+                lock: threading.RLock = self._stripes[stripe]
+                waited: float = 0
+                if not lock.acquire(blocking=False):
+                    start: float = time.perf_counter()
+                    lock.acquire()
+                    waited = time.perf_counter() - start
+                acquired.append(lock)
+                self._record(wallets, waited)
+            yield
+        finally:
+            if outermost:
+                acquired += self._local.extra
+                self._local.extra = None
+            for lock in reversed(acquired):
+                lock.release()
+
+    def try_hold(self, source_uuid: str) -> bool:
+        """
+        Acquires the stripe of another wallet without waiting, so it cannot deadlock with the stripes already held.
+        The stripe is held until the outermost hold of the current thread ends.
+        :return: True if the stripe was acquired, False if it is busy or the thread does not hold any stripes
+        """
+
+        extra: Optional[List[threading.RLock]] = getattr(self._local, "extra", None)
+        if extra is None:
+            return False
+
+        lock: threading.RLock = self._stripes[self.stripe(source_uuid)]
+        if not lock.acquire(blocking=False):
+            return False
+
+        extra.append(lock)
+        return True
+
+    def stats(self) -> dict:
+        return {"acquisitions": self.acquisitions, "contended": self.contended, "wait_seconds": self.wait_time}
+
+    def hottest(self, count: int = 10) -> List[Tuple[str, float]]:
+        """
+        :return: the wallets with the longest total lock wait time and their wait time in seconds
+        """
+
+        with self._lock:
+            return self._wallet_wait_time.most_common(count)
+
+    def _record(self, wallets: List[str], waited: float):
+        with self._lock:
+            self.acquisitions += 1
+            if not waited:
+                return
+
+            self.contended += 1
+            self.wait_time += waited
+            for source_uuid in wallets:
+                self._wallet_wait_time[source_uuid] += waited
+            if len(self._wallet_wait_time) > HOTTEST_WALLETS_TRACKED:
+                self._wallet_wait_time = Counter(dict(self._wallet_wait_time.most_common(HOTTEST_WALLETS_TRACKED // 2)))
+
+
+wallet_locks: StripedLockManager = StripedLockManager(WALLET_LOCK_STRIPES)
@@ -0,0 +1,180 @@
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple, Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import SLOW_REQUEST_THRESHOLD
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+SECONDS_BUCKETS: Tuple[float, ...] = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+STATEMENTS_BUCKETS: Tuple[float, ...] = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets: Tuple[float, ...] = buckets
+        self.counts: List[int] = [0] * len(buckets)
+        self.sum: float = 0
+        self.count: int = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RequestStats:
+    def __init__(self, endpoint: str):
+        self.endpoint: str = endpoint
+        self.statements: List[str] = []
+        self.db_time: float = 0
+        self.external_time: float = 0
+
+
+class Metrics:
+    """
+    Collects the number of sql statements, the database time, the time spent in other microservices
+    and the total time of every endpoint call.
+    Requests that take longer than `slow_threshold` seconds are logged with their sql statements.
+    """
+
+    histograms: Tuple[Tuple[str, str, Tuple[float, ...]], ...] = (
+        ("request_seconds", "total time of a request", SECONDS_BUCKETS),
+        ("request_db_seconds", "time a request waited for the database", SECONDS_BUCKETS),
+        ("request_external_seconds", "time a request waited for other microservices", SECONDS_BUCKETS),
+        ("request_statements", "sql statements of a request", STATEMENTS_BUCKETS),
+    )
+
+    def __init__(self, slow_threshold: float):
+        self.slow_threshold: float = slow_threshold
+        self.slow_requests: int = 0
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._lock: threading.Lock = threading.Lock()
+        self._local: threading.local = threading.local()
+
+    @property
+    def current(self) -> Optional[RequestStats]:
+        return getattr(self._local, "request", None)
+
+    def instrument(self, f: Callable) -> Callable:
+        """
+        Measures every call of the given endpoint.
+        """
+
+        @functools.wraps(f)
+        def instrumented(*args, **kwargs):
+            if self.current is not None:
+                return f(*args, **kwargs)
+
+            request: RequestStats = RequestStats(f.__name__)
+            self._local.request = request
+            start: float = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                self._local.request = None
+                self.record(request, time.perf_counter() - start)
+
+        return instrumented
+
+    @contextmanager
+    def external_call(self) -> Iterator[None]:
+        """
+        Counts the time of the block as time spent in another microservice.
+        """
+
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            request: Optional[RequestStats] = self.current
+            if request is not None:
+                request.external_time += time.perf_counter() - start
+
+    def record(self, request: RequestStats, total_time: float):
+        values: Tuple[float, ...] = (total_time, request.db_time, request.external_time, len(request.statements))
+        with self._lock:
+            for (name, _, buckets), value in zip(self.histograms, values):
+                key: Tuple[str, str] = (name, request.endpoint)
+                if key not in self._histograms:
+                    self._histograms[key] = Histogram(buckets)
+                self._histograms[key].observe(value)
+
+            if total_time < self.slow_threshold:
+                return
+            self.slow_requests += 1
+
+        logger.warning(
+            "slow request %s: %.3fs total, %.3fs database, %.3fs external, %d statements:\n%s",
+            request.endpoint,
+            total_time,
+            request.db_time,
+            request.external_time,
+            len(request.statements),
+            "\n".join(request.statements),
+        )
+
+    def export(self, gauges: Dict[str, dict]) -> str:
+        """
+        Formats the histograms and the given gauges in the prometheus text format.
+        A gauge whose value is a dict is exported as one series per key.
+        :return: the exposition text
+        """
+
+        lines: List[str] = []
+        with self._lock:
+            for name, description, buckets in self.histograms:
+                lines.append(f"# HELP currency_{name} {description}")
+                lines.append(f"# TYPE currency_{name} histogram")
+                for (histogram_name, endpoint), histogram in sorted(self._histograms.items()):
+                    if histogram_name != name:
+                        continue
+                    for bound, count in zip(buckets, histogram.counts):
+                        lines.append(f'currency_{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+                    lines.append(f'currency_{name}_bucket{{endpoint="{endpoint}",le="+Inf"}} {histogram.count}')
+                    lines.append(f'currency_{name}_sum{{endpoint="{endpoint}"}} {histogram.sum}')
+                    lines.append(f'currency_{name}_count{{endpoint="{endpoint}"}} {histogram.count}')
+
+            lines.append("# TYPE currency_slow_requests counter")
+            lines.append(f"currency_slow_requests {self.slow_requests}")
+
+        for group, values in sorted(gauges.items()):
+            for key, value in sorted(values.items()):
+                lines.append(f"# TYPE currency_{group}_{key} gauge")
+                if isinstance(value, dict):
+                    lines.extend(f'currency_{group}_{key}{{key="{label}"}} {v}' for label, v in value.items())
+                else:
+                    lines.append(f"currency_{group}_{key} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics: Metrics = Metrics(SLOW_REQUEST_THRESHOLD)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    connection.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    duration: float = time.perf_counter() - connection.info["query_start"].pop()
+    request: Optional[RequestStats] = metrics.current
+    if request is not None:
+        request.db_time += duration
+        request.statements.append(statement)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    if context.connection is not None and context.connection.info.get("query_start"):
+        context.connection.info["query_start"].pop()
@@ -0,0 +1,186 @@
+import datetime
+import threading
+import time
+from typing import Dict, List, Optional
+
+from app import m, wrapper
+from config import MINER_COLLECT_WINDOW, MINER_COLLECT_BATCH_SIZE, MINER_COLLECT_MANY, LAZY_MINER_SETTLEMENT
+from models.ledger import LedgerEntry
+from models.wallet import Wallet
+from utils.locks import StripedLockManager, wallet_locks
+from utils.metrics import metrics
+
+
+class MinerCollector:
+    """
+    Collects mined coins from the service microservice.
+
+    A wallet that has been collected less than `window` seconds ago is not collected again. With a `batch_size`
+    larger than 1 it is marked as pending instead and collected together with the next wallet that needs a real rpc,
+    so one miner/collect_many call settles many wallets. Otherwise its coins stay with the miner until its next
+    collection after the window.
+    A pending wallet is only added to a bulk call if the stripe of its wallet lock can be taken without waiting.
+    Other requests load wallets without row locks and write their balance back, so the stripe is held until the
+    request that settled the wallet has committed.
+
+    With `lazy` settlement the miner pushes the mining rate of a wallet whenever it changes and the coins mined since
+    the last settlement are computed locally, so no rpc is needed at all.
+    """
+
+    def __init__(self, window: float, batch_size: int, locks: StripedLockManager, lazy: bool = False):
+        self.window: float = window
+        self.batch_size: int = batch_size
+        self.locks: StripedLockManager = locks
+        self.lazy: bool = lazy
+        self.last_collected: Dict[str, float] = {}
+        self.pending: Dict[str, None] = {}
+        self.rpcs: int = 0
+        self.rpcs_saved: int = 0
+        # the framework handles every request in its own thread, all state above is guarded by this lock
+        self._lock: threading.Lock = threading.Lock()
+
+    def collect(self, wallet: Wallet):
+        """
+        Adds the coins mined since the last collection to the wallet.
+        The caller is responsible for committing the session.
+        """
+
+        self.credit(wallet, self.fetch(wallet.source_uuid))
+
+    def fetch(self, source_uuid: str, batch: bool = True) -> int:
+        """
+        Requests the coins mined since the last collection of the wallet from the miner, unless it has been
+        collected inside the window. With `batch` the pending wallets are collected in the same rpc and credited
+        directly, the coins of the wallet itself have to be passed to credit by the caller.
+        The caller is responsible for committing the session.
+        :return: number of coins of the wallet
+        """
+
+        if self.lazy:
+            with self._lock:
+                self.rpcs_saved += 1
+            return 0
+
+        now: float = time.monotonic()
+        with self._lock:
+            last: Optional[float] = self.last_collected.get(source_uuid)
+            if last is not None and now - last < self.window:
+                if self.batch_size > 1:
+                    self.pending[source_uuid] = None
+                self.rpcs_saved += 1
+                return 0
+
+            self.pending.pop(source_uuid, None)
+            wallets: List[str] = [source_uuid] + (self._take_pending(now) if batch else [])
+
+        try:
+            coins: Dict[str, int] = self._request(wallets)
+        except Exception:
+            # the miner has not paid out anything, the wallets are collected with a later request
+            with self._lock:
+                self.pending.update(dict.fromkeys(wallets[1:]))
+            raise
+
+        for pending_uuid in sorted(wallets[1:]):
+            if coins.get(pending_uuid):
+                LedgerEntry.record(pending_uuid, coins[pending_uuid], "miner")
+                wrapper.session.query(Wallet).filter_by(source_uuid=pending_uuid).update(
+                    {Wallet.amount: Wallet.amount + coins[pending_uuid]}, synchronize_session="evaluate"
+                )
+
+        with self._lock:
+            self.rpcs += 1
+            for collected_uuid in wallets:
+                self.last_collected[collected_uuid] = now
+            self._prune(now)
+
+        return coins.get(source_uuid, 0)
+
+    def credit(self, wallet: Wallet, coins: int):
+        """
+        Adds coins returned by fetch to the wallet, with lazy settlement the mined coins are settled instead.
+        The caller is responsible for committing the session.
+        """
+
+        if self.lazy:
+            self.settle(wallet, datetime.datetime.now())
+            return
+
+        wallet.amount += coins
+        LedgerEntry.record(wallet.source_uuid, coins, "miner")
+
+    def balance(self, wallet: Wallet) -> int:
+        """
+        Returns the balance of the wallet including the coins that have not been settled yet.
+        Only meaningful with lazy settlement, the wallet is not changed.
+        :return: number of coins
+        """
+
+        return wallet.amount + wallet.pending_coins(datetime.datetime.now())
+
+    @staticmethod
+    def settle(wallet: Wallet, now: datetime.datetime):
+        """
+        Adds the coins mined until `now` to the wallet. The settlement time only advances by the time needed
+        to mine these coins, so fractions of a coin are kept for the next settlement.
+        The caller is responsible for committing the session.
+        """
+
+        coins: int = wallet.pending_coins(now)
+        if not coins:
+            return
+
+        wallet.amount += coins
+        wallet.mining_settled += datetime.timedelta(seconds=coins / wallet.mining_rate)
+        LedgerEntry.record(wallet.source_uuid, coins, "miner")
+
+    def set_rate(self, wallet: Wallet, rate: float):
+        """
+        Settles the wallet at its old mining rate and continues with the new one.
+        The caller is responsible for committing the session.
+        """
+
+        now: datetime.datetime = datetime.datetime.now()
+        self.settle(wallet, now)
+        wallet.mining_rate = rate
+        wallet.mining_settled = now
+
+    def forget(self, source_uuid: str):
+        with self._lock:
+            self.last_collected.pop(source_uuid, None)
+            self.pending.pop(source_uuid, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"rpcs": self.rpcs, "rpcs_saved": self.rpcs_saved, "pending": len(self.pending)}
+
+    def _take_pending(self, now: float) -> List[str]:
+        # called with the lock held
+        batch: List[str] = []
+        for source_uuid in list(self.pending):
+            if len(batch) + 1 >= self.batch_size:
+                break
+            if now - self.last_collected.get(source_uuid, 0) >= self.window and self.locks.try_hold(source_uuid):
+                self.pending.pop(source_uuid, None)
+                batch.append(source_uuid)
+        return batch
+
+    @staticmethod
+    def _request(batch: List[str]) -> Dict[str, int]:
+        with metrics.external_call():
+            if len(batch) == 1:
+                response: dict = m.contact_microservice("service", ["miner", "collect"], {"wallet_uuid": batch[0]})
+                return {batch[0]: response["coins"]}
+
+            return m.contact_microservice("service", ["miner", "collect_many"], {"wallet_uuids": batch})["coins"]
+
+    def _prune(self, now: float):
+        # called with the lock held
+        for source_uuid, last in list(self.last_collected.items()):
+            if now - last >= self.window and source_uuid not in self.pending:
+                self.last_collected.pop(source_uuid, None)
+
+
+collector: MinerCollector = MinerCollector(
+    MINER_COLLECT_WINDOW, MINER_COLLECT_BATCH_SIZE if MINER_COLLECT_MANY else 1, wallet_locks, LAZY_MINER_SETTLEMENT
+)
@@ -0,0 +1,93 @@
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple, List
+
+from app import m
+from config import NOTIFICATION_WINDOW, NOTIFICATION_QUEUE_SIZE
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+class NotificationDispatcher:
+    """
+    Sends user notifications from a background thread instead of the request path.
+
+    A notification waits up to `window` seconds in the queue. Further notifications for the same wallet replace its
+    data in the meantime, incoming and outgoing alike, so the user only receives the latest balance. If the queue holds
+    `max_size` notifications, new ones are dropped.
+    """
+
+    def __init__(self, window: float, max_size: int):
+        self.window: float = window
+        self.max_size: int = max_size
+        self.sent: int = 0
+        self.coalesced: int = 0
+        self.dropped: int = 0
+        self._pending: "OrderedDict[tuple, Tuple[float, str, dict]]" = OrderedDict()
+        self._condition: threading.Condition = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+
+    def notify(self, user_uuid: str, data: dict):
+        key: tuple = (user_uuid, data["wallet_uuid"])
+        with self._condition:
+            if key in self._pending:
+                self._pending[key] = (self._pending[key][0], user_uuid, data)
+                self.coalesced += 1
+                return
+
+            if len(self._pending) >= self.max_size:
+                self.dropped += 1
+                return
+
+            self._pending[key] = (time.monotonic() + self.window, user_uuid, data)
+            self._condition.notify()
+
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="notifications", daemon=True)
+                self._worker.start()
+                atexit.register(self.flush)
+
+    def flush(self, now: Optional[float] = None) -> int:
+        """
+        Sends all notifications that are due at `now` or all queued notifications if `now` is None.
+        :return: number of sent notifications
+        """
+
+        due: List[Tuple[str, dict]] = []
+        with self._condition:
+            while self._pending:
+                key, (deadline, user_uuid, data) = next(iter(self._pending.items()))
+                if now is not None and deadline > now:
+                    break
+                del self._pending[key]
+                due.append((user_uuid, data))
+
+        for user_uuid, data in due:
+            try:
+                m.contact_user(user_uuid, data)
+            except Exception:  # noqa: B902
+                logger.exception("could not notify user %s", user_uuid)
+        self.sent += len(due)
+
+        return len(due)
+
+    def stats(self) -> dict:
+        return {"depth": len(self._pending), "sent": self.sent, "coalesced": self.coalesced, "dropped": self.dropped}
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                timeout: float = next(iter(self._pending.values()))[0] - time.monotonic()
+                if timeout > 0:
+                    self._condition.wait(timeout)
+                    continue
+
+            self.flush(time.monotonic())
+
+
+dispatcher: NotificationDispatcher = NotificationDispatcher(NOTIFICATION_WINDOW, NOTIFICATION_QUEUE_SIZE)
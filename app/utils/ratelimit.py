@@ -0,0 +1,98 @@
+import functools
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Callable, Hashable, List, Optional, Tuple, Union
+
+from config import RATE_LIMIT_ENABLED, RATE_LIMIT_RATE, RATE_LIMIT_BURST, RATE_LIMIT_BUCKETS
+from schemes import rate_limited
+
+Cost = Union[float, Callable[[dict], float]]
+
+# transaction rows a request may read for one token
+ROWS_PER_TOKEN: int = 100
+
+
+def rows_cost(rows: int) -> float:
+    return 1 + rows / ROWS_PER_TOKEN
+
+
+class RateLimiter:
+    """
+    Token buckets for users and wallets. Every bucket holds up to `burst` tokens and is refilled with `rate` tokens
+    per second. A request is only admitted if the bucket of its user and the bucket of its wallet both hold
+    enough tokens for its cost. At most `max_buckets` buckets are kept, the least recently used one is dropped
+    and starts full again.
+    """
+
+    def __init__(self, enabled: bool, rate: float, burst: float, max_buckets: int):
+        self.enabled: bool = enabled
+        self.rate: float = rate
+        self.burst: float = burst
+        self.max_buckets: int = max_buckets
+        self.admitted: int = 0
+        self.rejected: Counter = Counter()
+        self._buckets: "OrderedDict[Hashable, Tuple[float, float]]" = OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+
+    def acquire(self, keys: List[Hashable], cost: float) -> bool:
+        """
+        Takes `cost` tokens from the buckets of all given keys or from none of them.
+        Costs above `burst` are capped, so an expensive request is slowed down but never rejected forever.
+        :return: True if the request is admitted
+        """
+
+        cost = min(cost, self.burst)
+        now: float = time.monotonic()
+        with self._lock:
+            tokens: List[float] = []
+            for key in keys:
+                available, updated = self._buckets.get(key, (self.burst, now))
+                tokens.append(min(self.burst, available + (now - updated) * self.rate))
+            if any(available < cost for available in tokens):
+                return False
+
+            for key, available in zip(keys, tokens):
+                self._buckets[key] = (available - cost, now)
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+
+            return True
+
+    def endpoint(self, cost: Cost = 1) -> Callable:
+        """
+        Rejects calls of the user endpoint with rate_limited if the user or the wallet named by the source_uuid
+        of its data has used up its tokens. The cost is a number or a function of the request data.
+        """
+
+        def decorator(f: Callable) -> Callable:
+            @functools.wraps(f)
+            def limited(data: dict, user: str, *args):
+                if not self.enabled:
+                    return f(data, user, *args)
+
+                keys: List[Hashable] = [("user", user)]
+                source_uuid: Optional[str] = data.get("source_uuid")
+                if source_uuid is not None:
+                    keys.append(("wallet", source_uuid))
+
+                if not self.acquire(keys, cost(data) if callable(cost) else cost):
+                    with self._lock:
+                        self.rejected[f.__name__] += 1
+                    return rate_limited
+
+                with self._lock:
+                    self.admitted += 1
+                return f(data, user, *args)
+
+            return limited
+
+        return decorator
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"buckets": len(self._buckets), "admitted": self.admitted, "rejected": dict(self.rejected)}
+
+
+limiter: RateLimiter = RateLimiter(RATE_LIMIT_ENABLED, RATE_LIMIT_RATE, RATE_LIMIT_BURST, RATE_LIMIT_BUCKETS)
@@ -0,0 +1,45 @@
+import functools
+from typing import Callable
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+
+from app import wrapper
+from config import DATABASE_POOL_SIZE, DATABASE_MAX_OVERFLOW, DATABASE_POOL_PRE_PING, DATABASE_POOL_RECYCLE
+
+
+def configure_session():
+    """
+    Replaces the engine of the database wrapper with a configured connection pool.
+    """
+
+    engine: Engine = wrapper.engine
+    options: dict = {"pool_pre_ping": DATABASE_POOL_PRE_PING, "pool_recycle": DATABASE_POOL_RECYCLE}
+    if engine.dialect.name != "sqlite":
+        options.update(pool_size=DATABASE_POOL_SIZE, max_overflow=DATABASE_MAX_OVERFLOW)
+
+    wrapper.Session.remove()
+    engine.dispose()
+    wrapper.engine = create_engine(engine.url, **options)
+    wrapper.Session.configure(bind=wrapper.engine)
+
+
+def session_scope(f: Callable) -> Callable:
+    """
+    Commits the session after the endpoint returned or rolls it back if it raised an exception.
+    The session is removed afterwards, so the next request starts with a new transaction and an empty identity map.
+    """
+
+    @functools.wraps(f)
+    def scoped(*args, **kwargs):
+        try:
+            result = f(*args, **kwargs)
+            wrapper.session.commit()
+            return result
+        except Exception:
+            wrapper.session.rollback()
+            raise
+        finally:
+            wrapper.Session.remove()
+
+    return scoped
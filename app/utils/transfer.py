@@ -0,0 +1,67 @@
+from typing import Dict, Optional
+
+from app import wrapper
+from models.idempotency import IdempotencyKey
+from models.ledger import LedgerEntry
+from models.transaction import Transaction
+from models.wallet import Wallet
+from schemes import unknown_source_or_destination, not_enough_coins, success_scheme
+from utils.miner import collector
+
+
+def lock_wallets(*source_uuids: str) -> Dict[str, Wallet]:
+    """
+    Locks the given wallets with one SELECT ... FOR UPDATE until the session is committed or rolled back.
+    The rows are always locked in primary key order, so two transfers in opposite directions cannot deadlock.
+    :return: the locked wallets by source_uuid
+    """
+
+    wallets = (
+        wrapper.session.query(Wallet)
+        .filter(Wallet.source_uuid.in_(sorted(set(source_uuids))))
+        .order_by(Wallet.source_uuid)
+        .with_for_update()
+        .populate_existing()
+    )
+
+    return {wallet.source_uuid: wallet for wallet in wallets}
+
+
+def transfer(
+    source_wallet: Wallet, destination_uuid: str, amount: int, usage: str, idempotency_key: Optional[str] = None
+) -> Optional[dict]:
+    """
+    Moves coins between two wallets and records the transaction and the idempotency key with exactly one commit.
+    :return: an error scheme or None if the transfer was successful
+    """
+
+    # the miner rpc runs before the rows are locked and does not settle other wallets while they are locked
+    coins: int = collector.fetch(source_wallet.source_uuid, batch=False)
+
+    wallets: Dict[str, Wallet] = lock_wallets(source_wallet.source_uuid, destination_uuid)
+    if source_wallet.source_uuid not in wallets:
+        wrapper.session.rollback()
+        return unknown_source_or_destination
+
+    source_wallet: Wallet = wallets[source_wallet.source_uuid]
+    collector.credit(source_wallet, coins)
+    if destination_uuid not in wallets:
+        # keep the coins the miner has already paid out
+        wrapper.session.commit()
+        return unknown_source_or_destination
+
+    destination_wallet: Wallet = wallets[destination_uuid]
+
+    if source_wallet.amount - amount < 0 or amount < 0:
+        wrapper.session.commit()
+        return not_enough_coins
+
+    source_wallet.amount -= amount
+    destination_wallet.amount += amount
+    LedgerEntry.record(source_wallet.source_uuid, -amount, "send")
+    LedgerEntry.record(destination_wallet.source_uuid, amount, "send")
+    Transaction.create(source_wallet.source_uuid, amount, destination_uuid, usage, origin=0, commit=False)
+    IdempotencyKey.record(source_wallet.source_uuid, "send", idempotency_key, success_scheme)
+    wrapper.session.commit()
+
+    return None
@@ -0,0 +1,129 @@
+import functools
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import scheme
+
+from app import m
+from schemes import invalid_input_data
+
+
+def compile_field(field: scheme.Field) -> Callable[[Any], bool]:
+    """
+    Compiles a field of a request scheme into a function that accepts the same values as the field does when
+    the framework serializes a request with it. Fields without a compiled check are processed by the field itself.
+    :return: the check of the field
+    """
+
+    check: Callable[[Any], bool] = _compile_value_check(field)
+    if field.ignore_null or not field.nonnull:
+        return lambda value: value is None or check(value)
+
+    return check
+
+
+def _compile_value_check(field: scheme.Field) -> Callable[[Any], bool]:
+    if field.preprocessor is not None or field.constant is not None:
+        return functools.partial(_process, field)
+
+    if type(field) is scheme.UUID:
+        uuid_pattern = field.pattern
+        return lambda value: isinstance(value, str) and uuid_pattern.match(value) is not None
+
+    if type(field) is scheme.Text:
+        pattern, strip, min_length, max_length = field.pattern, field.strip, field.min_length, field.max_length
+
+        def check_text(value: Any) -> bool:
+            if not isinstance(value, str):
+                return False
+            if strip:
+                value = value.strip()
+
+            return (
+                (min_length is None or len(value) >= min_length)
+                and (max_length is None or len(value) <= max_length)
+                and (not pattern or pattern.match(value) is not None)
+            )
+
+        return check_text
+
+    if type(field) is scheme.Integer:
+        minimum, maximum = field.minimum, field.maximum
+        return lambda value: (
+            isinstance(value, int)
+            and not isinstance(value, bool)
+            and (minimum is None or value >= minimum)
+            and (maximum is None or value <= maximum)
+        )
+
+    if type(field) is scheme.Boolean:
+        return lambda value: isinstance(value, bool)
+
+    return functools.partial(_process, field)
+
+
+def _process(field: scheme.Field, value: Any) -> bool:
+    # noinspection PyBroadException
+    try:
+        field.process(value, scheme.OUTBOUND, True)
+    except Exception:
+        return False
+
+    return True
+
+
+class Validator:
+    """
+    A request scheme compiled into one check per field when the endpoint is registered.
+    It accepts the same requests as the scheme structure the framework builds for `requires`, in which every field
+    is required and unknown fields are rejected. Fields in `optional` may be missing.
+    """
+
+    def __init__(self, fields: Dict[str, scheme.Field], optional: Optional[Dict[str, scheme.Field]] = None):
+        self.fields: Dict[str, scheme.Field] = fields
+        self.optional: Dict[str, scheme.Field] = optional or {}
+        self._checks: Tuple[Tuple[str, bool, Callable[[Any], bool]], ...] = tuple(
+            (name, True, compile_field(field)) for name, field in self.fields.items()
+        ) + tuple((name, False, compile_field(field)) for name, field in self.optional.items())
+
+    def valid(self, data: Any) -> bool:
+        if not isinstance(data, dict):
+            return False
+
+        known: int = 0
+        for name, required, check in self._checks:
+            if name in data:
+                if not check(data[name]):
+                    return False
+                known += 1
+            elif required:
+                return False
+
+        return known == len(data)
+
+
+validators: Dict[Tuple[str, ...], Validator] = {}
+
+
+def user_endpoint(
+    path: List[str], requires: Dict[str, scheme.Field], optional: Optional[Dict[str, scheme.Field]] = None
+) -> Callable:
+    """
+    Registers a user endpoint whose requests are checked by a Validator compiled from `requires` and `optional`.
+    The endpoint is registered without requirements, so the framework does not build and walk a scheme structure
+    for every request, and answers invalid requests itself with the framework's invalid_input_data error.
+    """
+
+    validator: Validator = Validator(requires, optional)
+
+    def decorator(f: Callable) -> Callable:
+        @functools.wraps(f)
+        def validated(data: dict, user: str, *args):
+            if not validator.valid(data):
+                return invalid_input_data
+
+            return f(data, user, *args)
+
+        validators[tuple(path)] = validator
+        return m.user_endpoint(path=path, requires=None)(validated)
+
+    return decorator
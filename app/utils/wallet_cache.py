@@ -0,0 +1,91 @@
+from typing import NamedTuple, Optional, Dict, List
+
+from app import wrapper
+from config import WALLET_CACHE_SIZE, WALLET_CACHE_TTL, UNKNOWN_WALLET_CACHE_SIZE, UNKNOWN_WALLET_CACHE_TTL
+from models.wallet import Wallet
+from utils.cache import LRUCache
+
+
+class WalletInfo(NamedTuple):
+    user_uuid: str
+    key: str
+
+
+wallet_cache: LRUCache = LRUCache(WALLET_CACHE_SIZE, WALLET_CACHE_TTL)
+# kept apart from the wallet cache, so a flood of unknown source_uuids cannot evict existing wallets
+unknown_wallets: LRUCache = LRUCache(UNKNOWN_WALLET_CACHE_SIZE, UNKNOWN_WALLET_CACHE_TTL)
+
+
+def is_unknown(source_uuid: str) -> bool:
+    return unknown_wallets.get(source_uuid, False)
+
+
+def remember_unknown(source_uuid: str):
+    unknown_wallets.put(source_uuid, True)
+
+
+def get_wallet_info(source_uuid: str) -> Optional[WalletInfo]:
+    """
+    Returns owner and key of a wallet and only queries the database if they are not cached yet.
+    :return: the wallet info or None if the wallet does not exist
+    """
+
+    info: Optional[WalletInfo] = wallet_cache.get(source_uuid)
+    if info is not None:
+        return info
+    if is_unknown(source_uuid):
+        return None
+
+    row: Optional[tuple] = (
+        wrapper.session.query(Wallet.user_uuid, Wallet.key).filter_by(source_uuid=source_uuid).first()
+    )
+    if row is None:
+        remember_unknown(source_uuid)
+        return None
+
+    info = WalletInfo(*row)
+    wallet_cache.put(source_uuid, info)
+
+    return info
+
+
+def get_wallet_infos(source_uuids: List[str]) -> Dict[str, WalletInfo]:
+    """
+    Returns owner and key of many wallets. All wallets that are not cached are loaded with one IN query.
+    :return: the wallet infos of all existing wallets by source_uuid
+    """
+
+    infos: Dict[str, WalletInfo] = {}
+    missing: List[str] = []
+    for source_uuid in dict.fromkeys(source_uuids):
+        info: Optional[WalletInfo] = wallet_cache.get(source_uuid)
+        if info is not None:
+            infos[source_uuid] = info
+        elif not is_unknown(source_uuid):
+            missing.append(source_uuid)
+
+    if missing:
+        rows = wrapper.session.query(Wallet.source_uuid, Wallet.user_uuid, Wallet.key).filter(
+            Wallet.source_uuid.in_(missing)
+        )
+        for source_uuid, user_uuid, key in rows:
+            infos[source_uuid] = WalletInfo(user_uuid, key)
+            wallet_cache.put(source_uuid, infos[source_uuid])
+        for source_uuid in missing:
+            if source_uuid not in infos:
+                remember_unknown(source_uuid)
+
+    return infos
+
+
+def cache_wallet(wallet: Wallet):
+    unknown_wallets.invalidate(wallet.source_uuid)
+    wallet_cache.put(wallet.source_uuid, WalletInfo(wallet.user_uuid, wallet.key))
+
+
+def invalidate_wallet(source_uuid: str):
+    wallet_cache.invalidate(source_uuid)
+
+
+def invalidate_user(user_uuid: str):
+    wallet_cache.invalidate_where(lambda info: info.user_uuid == user_uuid)
@@ -0,0 +1,52 @@
+import functools
+import threading
+from typing import Callable, Optional, ContextManager, List
+
+from config import WORKERS
+from utils.locks import StripedLockManager, wallet_locks
+
+
+class WorkerPool:
+    """
+    The cryptic framework handles every request in a new thread. The pool limits how many of these threads
+    execute an endpoint at the same time and serializes endpoints that touch the same wallet,
+    while endpoints for different wallets run in parallel.
+    """
+
+    def __init__(self, workers: int, locks: StripedLockManager):
+        self.workers: int = workers
+        self.locks: StripedLockManager = locks
+        self._slots: threading.BoundedSemaphore = threading.BoundedSemaphore(workers)
+
+    def wallets(self, *source_uuids: Optional[str]) -> ContextManager[None]:
+        """
+        Holds the locks of the given wallets, see StripedLockManager.hold.
+        """
+
+        return self.locks.hold(*source_uuids)
+
+    def endpoint(self, *keys: str, wallets: Optional[Callable[[dict], List[str]]] = None) -> Callable:
+        """
+        Runs the endpoint in a worker slot while holding the locks of the wallets named by the given keys of its data
+        and of the wallets returned by the optional `wallets` function of its data.
+        The wallet locks are taken before the slot, so requests queued on a busy wallet do not occupy slots
+        that requests for other wallets could use. An endpoint must not take wallet locks while holding its slot,
+        otherwise requests that hold a wallet lock and wait for a slot deadlock with it.
+        """
+
+        def decorator(f: Callable) -> Callable:
+            @functools.wraps(f)
+            def run(data: dict, *args):
+                source_uuids: List[Optional[str]] = [data.get(key) for key in keys]
+                if wallets is not None:
+                    source_uuids += wallets(data)
+
+                with self.wallets(*source_uuids), self._slots:
+                    return f(data, *args)
+
+            return run
+
+        return decorator
+
+
+workers: WorkerPool = WorkerPool(WORKERS, wallet_locks)